@@ -1,10 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 import os
 
-from backend.models.database import create_tables
+from backend.models.database import async_engine
+from backend.models.migrations import migrate
 from backend.routes import hackathon, burnout, teacher, tools, voice, chat
 from backend.routes.auth import router as auth_router, seed_badges
 from backend.routes.tournament import router as tournament_router
@@ -21,6 +22,13 @@ from backend.routes.codespace import router as codespace_router
 from backend.routes.notes import router as notes_router
 from backend.routes.media import router as media_router
 from backend.routes.teams import router as teams_router
+from backend.routes.llm_admin import router as llm_admin_router
+from backend.routes.jobs import router as jobs_router
+from backend.services.openrouter_service import open_client, close_client
+from backend.services.llm_metrics import RouteLabelMiddleware, render_metrics
+from backend.services.model_router import ServedModelMiddleware
+from backend.services.job_service import start_job_workers, stop_job_workers
+from backend.services.loop_monitor import start_loop_monitor, stop_loop_monitor
 
 app = FastAPI(
     title="AkylTeam - AI Hackathon Platform",
@@ -38,6 +46,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Reports the model that answered in X-LLM-Model
+app.add_middleware(ServedModelMiddleware)
+# Labels LLM metrics with the route that triggered each call
+app.add_middleware(RouteLabelMiddleware)
 
 # Include routers
 app.include_router(hackathon.router)
@@ -61,6 +73,8 @@ app.include_router(codespace_router)
 app.include_router(notes_router)
 app.include_router(media_router)
 app.include_router(teams_router)
+app.include_router(llm_admin_router)
+app.include_router(jobs_router)
 
 # Serve static frontend
 FRONTEND_DIR = os.path.join(os.path.dirname(__file__), "..", "frontend")
@@ -71,35 +85,10 @@ if os.path.exists(FRONTEND_DIR):
 
 @app.on_event("startup")
 async def startup():
-    create_tables()
-    # Comprehensive migrations for columns added after initial DB creation
-    from sqlalchemy import text
-    from backend.models.database import engine
-    migrations = [
-        # teams
-        "ALTER TABLE teams ADD COLUMN invite_code VARCHAR UNIQUE",
-        # chat_messages
-        "ALTER TABLE chat_messages ADD COLUMN is_pinned BOOLEAN DEFAULT 0",
-        # kanban_tasks
-        "ALTER TABLE kanban_tasks ADD COLUMN due_date DATETIME",
-        # users (safety net)
-        "ALTER TABLE users ADD COLUMN is_looking_for_team BOOLEAN DEFAULT 0",
-        "ALTER TABLE users ADD COLUMN preferred_roles JSON",
-        "ALTER TABLE users ADD COLUMN xp INTEGER DEFAULT 0",
-        "ALTER TABLE users ADD COLUMN level INTEGER DEFAULT 1",
-        "ALTER TABLE users ADD COLUMN rank_title VARCHAR DEFAULT 'Новичок'",
-        "ALTER TABLE users ADD COLUMN streak_days INTEGER DEFAULT 0",
-        "ALTER TABLE users ADD COLUMN last_active DATETIME",
-        # project_roadmaps
-        "ALTER TABLE project_roadmaps ADD COLUMN share_token VARCHAR",
-    ]
-    with engine.connect() as conn:
-        for sql in migrations:
-            try:
-                conn.execute(text(sql))
-                conn.commit()
-            except Exception:
-                pass  # column/constraint already exists — safe to ignore
+    # Schema to the latest version (one query when it already is)
+    result = migrate()
+    print(f"[OK] Schema version {result['version']} (applied: {result['applied'] or 'none'}, {result['ms']} ms)")
+    await open_client()
     # Seed default badges
     from backend.models.database import SessionLocal
     db = SessionLocal()
@@ -107,9 +96,20 @@ async def startup():
         seed_badges(db)
     finally:
         db.close()
+    # Background AI jobs (re-enqueues jobs a previous run left unfinished)
+    await start_job_workers()
+    start_loop_monitor()
     print("[OK] AkylTeam started! Docs: http://localhost:8000/api/docs")
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_loop_monitor()
+    await stop_job_workers()
+    await close_client()
+    await async_engine.dispose()
+
+
 @app.get("/", include_in_schema=False)
 async def serve_frontend():
     index_path = os.path.join(FRONTEND_DIR, "index.html")
@@ -129,6 +129,12 @@ async def serve_sw():
     )
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint: LLM latency, TTFT, tokens/s, fallbacks, errors."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/health")
 async def health():
     return {"status": "ok", "service": "AkylTeam AI Platform", "version": "1.0.0"}
@@ -0,0 +1,205 @@
+"""
+Mock OpenRouter — a local stand-in for load testing without burning quota.
+Speaks the OpenAI-style API that openrouter_service uses:
+  POST /api/v1/chat/completions   — JSON or SSE (stream=true), with usage
+  GET  /api/v1/models             — the FREE_MODELS_FALLBACK list
+  GET  /mock/config, PUT /mock/config — read / change behaviour at runtime
+  GET  /mock/stats, DELETE /mock/stats — request counters per model/status
+
+Behaviour (env at startup, or PUT /mock/config while running):
+  MOCK_TTFT              seconds before the first token (default 0.4)
+  MOCK_TOKENS_PER_SEC    generation speed (default 40)
+  MOCK_COMPLETION_TOKENS reply length cap, also bounded by max_tokens (default 120)
+  MOCK_JITTER            ± fraction applied to TTFT and token rate (default 0.2)
+  MOCK_P429 / MOCK_P503  probability of a rate-limit / overload error (default 0)
+  MOCK_RETRY_AFTER       Retry-After seconds sent with 429s (default: none)
+  MOCK_CACHE_TTFT        TTFT multiplier when the system prompt was seen before, i.e. a
+                         provider prefix-cache hit reported as usage.prompt_tokens_details
+                         .cached_tokens (default 0.5)
+  MOCK_MODEL_PROFILES    JSON {model: {ttft, tokens_per_sec, p429, p503, ...}}
+
+Run:
+  python -m uvicorn backend.mock_openrouter:app --port 8001
+  OPENROUTER_BASE_URL=http://localhost:8001/api/v1 python -m uvicorn backend.main:app
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from backend.services.openrouter_service import FREE_MODELS_FALLBACK
+from backend.services.token_budget import estimate_tokens, message_tokens
+
+app = FastAPI(title="Mock OpenRouter", version="1.0.0")
+
+DEFAULTS = {
+    "ttft": float(os.getenv("MOCK_TTFT", "0.4")),
+    "tokens_per_sec": float(os.getenv("MOCK_TOKENS_PER_SEC", "40")),
+    "completion_tokens": int(os.getenv("MOCK_COMPLETION_TOKENS", "120")),
+    "jitter": float(os.getenv("MOCK_JITTER", "0.2")),
+    "p429": float(os.getenv("MOCK_P429", "0")),
+    "p503": float(os.getenv("MOCK_P503", "0")),
+    "retry_after": float(os.getenv("MOCK_RETRY_AFTER")) if os.getenv("MOCK_RETRY_AFTER") else None,
+    "cache_ttft": float(os.getenv("MOCK_CACHE_TTFT", "0.5")),
+}
+PROFILES: Dict[str, dict] = json.loads(os.getenv("MOCK_MODEL_PROFILES", "{}") or "{}")
+
+WORDS = ("hackathon team idea roadmap kanban sprint deploy backend frontend api "
+         "model prompt token stream latency cache queue mentor olympiad graph").split()
+
+stats = Counter()
+_prefix_cache: "OrderedDict[str, None]" = OrderedDict()   # (model, system prompt) hashes seen recently
+PREFIX_CACHE_SIZE = 1000
+
+
+def _profile(model: str) -> dict:
+    return {**DEFAULTS, **PROFILES.get(model, {})}
+
+
+def _jittered(value: float, jitter: float) -> float:
+    return max(value * (1 + random.uniform(-jitter, jitter)), 0.0)
+
+
+def _injected_error(model: str, profile: dict) -> Optional[JSONResponse]:
+    roll = random.random()
+    if roll < profile["p429"]:
+        headers = {"Retry-After": str(profile["retry_after"])} if profile["retry_after"] is not None else {}
+        return JSONResponse({"error": {"code": 429, "message": f"{model} is rate-limited (mock)"}},
+                            status_code=429, headers=headers)
+    if roll < profile["p429"] + profile["p503"]:
+        return JSONResponse({"error": {"code": 503, "message": f"{model} is overloaded (mock)"}}, status_code=503)
+    return None
+
+
+def _reply_tokens(model: str, n: int):
+    """Deterministic-ish filler, one word ≈ one token."""
+    yield f"[mock {model}]"
+    for i in range(max(n - 1, 0)):
+        yield " " + WORDS[i % len(WORDS)]
+
+
+def _text(content) -> str:
+    """Message content as text (content may also be a list of parts)."""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def _cached_prefix_tokens(model: str, messages: list) -> int:
+    """Tokens of the system prompt if this model saw the same one recently, else 0 (and remember it)."""
+    if not messages or messages[0].get("role") != "system":
+        return 0
+    system = _text(messages[0].get("content"))
+    key = hashlib.sha1(f"{model}\n{system}".encode()).hexdigest()
+    if key in _prefix_cache:
+        _prefix_cache.move_to_end(key)
+        return estimate_tokens(system)
+    _prefix_cache[key] = None
+    while len(_prefix_cache) > PREFIX_CACHE_SIZE:
+        _prefix_cache.popitem(last=False)
+    return 0
+
+
+def _usage(prompt_tokens: int, completion_tokens: int, cached: int = 0) -> dict:
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached}}
+
+
+def _chunk(cid: str, model: str, delta: dict, finish_reason=None, usage=None) -> str:
+    body = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+    if usage is not None:
+        body["choices"] = []
+        body["usage"] = usage
+    return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock")
+    profile = _profile(model)
+    stats[f"{model} requests"] += 1
+
+    error = _injected_error(model, profile)
+    if error is not None:
+        stats[f"{model} {error.status_code}"] += 1
+        return error
+
+    n_tokens = max(min(profile["completion_tokens"], int(body.get("max_tokens") or 2048)), 1)
+    messages = [{**m, "content": _text(m.get("content"))} for m in body.get("messages", [])]
+    prompt_tokens = message_tokens(messages)
+    cached = _cached_prefix_tokens(model, messages)
+    ttft = _jittered(profile["ttft"], profile["jitter"]) * (profile["cache_ttft"] if cached else 1)
+    if cached:
+        stats[f"{model} prefix_cache_hits"] += 1
+    rate = max(_jittered(profile["tokens_per_sec"], profile["jitter"]), 0.1)
+    cid = f"gen-mock-{uuid.uuid4().hex[:12]}"
+    stats[f"{model} 200"] += 1
+
+    if not body.get("stream"):
+        await asyncio.sleep(ttft + n_tokens / rate)
+        text = "".join(_reply_tokens(model, n_tokens))
+        return {
+            "id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": _usage(prompt_tokens, estimate_tokens(text), cached),
+        }
+
+    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+    async def sse():
+        await asyncio.sleep(ttft)
+        yield _chunk(cid, model, {"role": "assistant", "content": ""})
+        for token in _reply_tokens(model, n_tokens):
+            yield _chunk(cid, model, {"content": token})
+            await asyncio.sleep(1 / rate)
+        yield _chunk(cid, model, {}, finish_reason="stop")
+        if include_usage:
+            yield _chunk(cid, model, {}, usage=_usage(prompt_tokens, n_tokens, cached))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(sse(), media_type="text/event-stream")
+
+
+@app.get("/api/v1/models")
+async def list_models():
+    return {"data": [{"id": m, "name": m, "context_length": 131072,
+                      "pricing": {"prompt": "0", "completion": "0"}} for m in FREE_MODELS_FALLBACK]}
+
+
+@app.get("/mock/config")
+async def get_config():
+    return {"defaults": DEFAULTS, "profiles": PROFILES}
+
+
+@app.put("/mock/config")
+async def update_config(config: dict):
+    """Body: {"defaults": {...}, "profiles": {model: {...}}} — merged into the current config."""
+    DEFAULTS.update({k: v for k, v in (config.get("defaults") or {}).items() if k in DEFAULTS})
+    for model, profile in (config.get("profiles") or {}).items():
+        if profile is None:
+            PROFILES.pop(model, None)
+        else:
+            PROFILES.setdefault(model, {}).update(profile)
+    return {"defaults": DEFAULTS, "profiles": PROFILES}
+
+
+@app.get("/mock/stats")
+async def get_stats():
+    return dict(sorted(stats.items()))
+
+
+@app.delete("/mock/stats")
+async def reset_stats():
+    stats.clear()
+    return {"reset": True}
@@ -1,14 +1,69 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, DateTime, Boolean, ForeignKey, JSON, Enum
+from sqlalchemy import create_engine, Column, Integer, String, Text, Float, DateTime, Boolean, ForeignKey, JSON, Enum, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 import secrets
-from backend.config import DATABASE_URL
+from backend.config import (
+    DATABASE_URL, SQLITE_PROFILE, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+)
+from backend.models.sqlite_profile import apply_profile, SerializedWriteSession
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+_PG_SCHEMES = ("postgresql", "postgres", "postgresql+psycopg2", "postgresql+psycopg")
+
+
+def sync_url(url: str) -> str:
+    """Pin the sync PostgreSQL driver (psycopg2) and accept the postgres:// alias."""
+    scheme, _, rest = url.partition("://")
+    if scheme in ("postgresql", "postgres"):
+        return f"postgresql+psycopg2://{rest}"
+    return url
+
+
+def async_url(url: str) -> str:
+    """Same database through an async driver: sqlite → aiosqlite, postgresql → asyncpg."""
+    scheme, _, rest = url.partition("://")
+    if scheme == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if scheme in _PG_SCHEMES:
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
+
+_IS_SQLITE = DATABASE_URL.startswith("sqlite")
+_SQLITE_PROFILE = _IS_SQLITE and SQLITE_PROFILE
+
+# Pool settings only apply to server databases; pre_ping drops connections the server closed
+_POOL = {} if _IS_SQLITE else {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": True,
+}
+
+# JSON columns are JSONB on PostgreSQL (binary, indexable), plain JSON text elsewhere
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+engine = create_engine(sync_url(DATABASE_URL), connect_args={"check_same_thread": False} if _IS_SQLITE else {}, **_POOL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async twin for routes: queries await the driver instead of blocking the event loop.
+# Objects stay loaded after commit (no implicit IO on attribute access), and
+# relationships must be eager-loaded (selectinload) — lazy loads raise here.
+async_engine = create_async_engine(async_url(DATABASE_URL), **_POOL)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False,
+    class_=SerializedWriteSession if _SQLITE_PROFILE else AsyncSession,
+)
+
+if _SQLITE_PROFILE:
+    apply_profile(engine, DATABASE_URL)
+    apply_profile(async_engine.sync_engine, DATABASE_URL)
+
 
 def get_db():
     db = SessionLocal()
@@ -18,6 +73,11 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 class Team(Base):
     __tablename__ = "teams"
     id = Column(Integer, primary_key=True, index=True)
@@ -35,7 +95,7 @@ class Member(Base):
     id = Column(Integer, primary_key=True, index=True)
     team_id = Column(Integer, ForeignKey("teams.id"))
     name = Column(String)
-    skills = Column(JSON, default=list)
+    skills = Column(JSONType, default=list)
     role = Column(String, nullable=True)
     language = Column(String, default="ru")
     experience_level = Column(String, default="beginner")  # beginner, mid, senior
@@ -66,6 +126,7 @@ class Task(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (Index("ix_chat_messages_team_id_created_at", "team_id", "created_at"),)
     id = Column(Integer, primary_key=True, index=True)
     team_id = Column(Integer, ForeignKey("teams.id"))
     sender = Column(String)
@@ -94,7 +155,7 @@ class BurnoutLog(Base):
     id = Column(Integer, primary_key=True, index=True)
     member_id = Column(Integer, ForeignKey("members.id"))
     score = Column(Float)
-    factors = Column(JSON, default=dict)
+    factors = Column(JSONType, default=dict)
     recommendations = Column(Text)
     logged_at = Column(DateTime, default=datetime.utcnow)
     member = relationship("Member", back_populates="burnout_logs")
@@ -107,7 +168,7 @@ class LearningSession(Base):
     topic = Column(String)
     level = Column(String)
     content = Column(Text)
-    quiz_data = Column(JSON, default=dict)
+    quiz_data = Column(JSONType, default=dict)
     score = Column(Float, nullable=True)
     completed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -118,7 +179,7 @@ class IdeaLog(Base):
     id = Column(Integer, primary_key=True, index=True)
     team_id = Column(Integer, ForeignKey("teams.id"))
     theme = Column(String)
-    ideas = Column(JSON, default=list)
+    ideas = Column(JSONType, default=list)
     selected_idea = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -131,6 +192,10 @@ def create_tables():
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_is_active_xp", "is_active", "xp"),                     # leaderboard, user search
+        Index("ix_users_is_active_last_active", "is_active", "last_active"),   # who is online
+    )
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
@@ -138,13 +203,13 @@ class User(Base):
     full_name = Column(String, nullable=True)
     avatar_url = Column(String, nullable=True)
     bio = Column(Text, nullable=True)
-    skills = Column(JSON, default=list)           # ["Python", "React", ...]
+    skills = Column(JSONType, default=list)           # ["Python", "React", ...]
     github_url = Column(String, nullable=True)
     role = Column(String, default="participant")  # participant, organizer, admin
     language = Column(String, default="ru")
     is_active = Column(Boolean, default=True)
     is_looking_for_team = Column(Boolean, default=False)
-    preferred_roles = Column(JSON, default=list)  # ["backend", "ml", ...]
+    preferred_roles = Column(JSONType, default=list)  # ["backend", "ml", ...]
     # Gamification
     xp = Column(Integer, default=0)
     level = Column(Integer, default=1)
@@ -176,7 +241,7 @@ class Tournament(Base):
     end_date = Column(DateTime, nullable=True)
     voting_end_date = Column(DateTime, nullable=True)
     rules = Column(Text, nullable=True)
-    tags = Column(JSON, default=list)             # ["AI", "Web", "Mobile"]
+    tags = Column(JSONType, default=list)             # ["AI", "Web", "Mobile"]
     banner_url = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     # Relationships
@@ -194,11 +259,11 @@ class Project(Base):
     description = Column(Text, nullable=True)
     problem = Column(Text, nullable=True)
     solution = Column(Text, nullable=True)
-    tech_stack = Column(JSON, default=list)
+    tech_stack = Column(JSONType, default=list)
     demo_url = Column(String, nullable=True)
     github_url = Column(String, nullable=True)
     video_url = Column(String, nullable=True)
-    screenshots = Column(JSON, default=list)
+    screenshots = Column(JSONType, default=list)
     status = Column(String, default="draft")      # draft, submitted, winner
     ai_score = Column(Float, nullable=True)
     ai_feedback = Column(Text, nullable=True)
@@ -224,6 +289,7 @@ class ProjectMember(Base):
 
 class Vote(Base):
     __tablename__ = "votes"
+    __table_args__ = (Index("ix_votes_project_id_user_id_category", "project_id", "user_id", "category"),)
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -261,6 +327,7 @@ class UserBadge(Base):
 
 class XPLog(Base):
     __tablename__ = "xp_logs"
+    __table_args__ = (Index("ix_xp_logs_user_id_created_at", "user_id", "created_at"),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     amount = Column(Integer)
@@ -271,6 +338,7 @@ class XPLog(Base):
 
 class PersonalChatMessage(Base):
     __tablename__ = "personal_chat_messages"
+    __table_args__ = (Index("ix_personal_chat_messages_user_id_id", "user_id", "id"),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     role = Column(String, default="user")    # user | assistant
@@ -279,6 +347,17 @@ class PersonalChatMessage(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class ConversationSummary(Base):
+    """Rolling summary of a user's personal chat in one mode (see services/chat_memory.py)."""
+    __tablename__ = "conversation_summaries"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    mode = Column(String, default="assistant")
+    summary = Column(Text, default="")
+    last_message_id = Column(Integer, default=0)   # PersonalChatMessage.id folded in so far
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class Channel(Base):
     """Team channels — like Slack channels within a team."""
     __tablename__ = "channels"
@@ -293,6 +372,7 @@ class Channel(Base):
 
 class ChannelMessage(Base):
     __tablename__ = "channel_messages"
+    __table_args__ = (Index("ix_channel_messages_channel_id_created_at", "channel_id", "created_at"),)
     id = Column(Integer, primary_key=True, index=True)
     channel_id = Column(Integer, ForeignKey("channels.id"))
     sender = Column(String)
@@ -305,6 +385,10 @@ class ChannelMessage(Base):
 
 class KanbanTask(Base):
     __tablename__ = "kanban_tasks"
+    __table_args__ = (
+        Index("ix_kanban_tasks_team_id_status_created_at", "team_id", "status", "created_at"),   # board
+        Index("ix_kanban_tasks_user_id_updated_at", "user_id", "updated_at"),                    # user context
+    )
     id = Column(Integer, primary_key=True, index=True)
     team_id = Column(Integer, ForeignKey("teams.id"), nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)   # auth user
@@ -329,10 +413,10 @@ class ProjectRoadmap(Base):
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     project_type = Column(String, default="personal")  # hackathon | olympiad | personal | work
-    tech_stack = Column(JSON, default=list)             # ["Python", "React", ...]
+    tech_stack = Column(JSONType, default=list)             # ["Python", "React", ...]
     # steps stored as JSON list of objects:
     # [{id, title, description, estimated_hours, status, ai_hint, resources}]
-    steps = Column(JSON, default=list)
+    steps = Column(JSONType, default=list)
     total_steps = Column(Integer, default=0)
     done_steps = Column(Integer, default=0)
     language = Column(String, default="ru")
@@ -350,14 +434,14 @@ class SmartNote(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     team_id = Column(Integer, ForeignKey("teams.id"), nullable=True)
     content = Column(Text, nullable=False)
-    tags = Column(JSON, default=list)  # ["design", "marketing", "urgent"]
+    tags = Column(JSONType, default=list)  # ["design", "marketing", "urgent"]
     has_photo = Column(Boolean, default=False)
     photo_data = Column(Text, nullable=True)  # base64 encoded image
     photo_analysis = Column(Text, nullable=True)  # AI analysis: "whiteboard photo", "mood board", etc
     ai_summary = Column(Text, nullable=True)
-    mentioned_people = Column(JSON, default=list)
+    mentioned_people = Column(JSONType, default=list)
     linked_kanban_task_id = Column(Integer, ForeignKey("kanban_tasks.id"), nullable=True)
-    extracted_tasks = Column(JSON, default=list)  # AI extracted actionable items
+    extracted_tasks = Column(JSONType, default=list)  # AI extracted actionable items
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -373,9 +457,9 @@ class MoodBoard(Base):
     project_id = Column(Integer, ForeignKey("project_roadmaps.id"), nullable=True)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
-    images = Column(JSON, default=list)  # [{id, data (base64), uploaded_at}, ...]
-    color_palette = Column(JSON, nullable=True)  # AI suggested: ["#7c3aed", "#ec4899", ...]
-    style_tags = Column(JSON, default=list)  # ["modern", "minimalist", "colorful"]
+    images = Column(JSONType, default=list)  # [{id, data (base64), uploaded_at}, ...]
+    color_palette = Column(JSONType, nullable=True)  # AI suggested: ["#7c3aed", "#ec4899", ...]
+    style_tags = Column(JSONType, default=list)  # ["modern", "minimalist", "colorful"]
     mood_description = Column(Text, nullable=True)  # AI description of mood
     canvas_data = Column(Text, nullable=True)  # SVG or canvas drawing data
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -423,3 +507,28 @@ class TeamInvitation(Base):
     inviter = relationship("User", foreign_keys=[inviter_id])
     invitee = relationship("User", foreign_keys=[invitee_id])
 
+
+
+class AIJob(Base):
+    """Long AI generation run in the background; polled or streamed by job id."""
+    __tablename__ = "ai_jobs"
+    id = Column(String, primary_key=True, index=True)   # uuid hex
+    kind = Column(String, index=True)                   # e.g. project.generate
+    input_hash = Column(String, index=True)             # dedupes identical inputs
+    payload = Column(JSONType, default=dict)
+    status = Column(String, default="queued")           # queued | running | done | failed
+    result = Column(JSONType, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class SchemaVersion(Base):
+    """One row per applied migration (see models/migrations.py)."""
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
+    name = Column(String)
+    applied_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,226 @@
+"""
+Migrations — versioned schema changes, applied once, in order.
+Each migration is a function registered with @migration(version, name); the
+schema_version table records what has run. Startup calls migrate(): a single
+`SELECT max(version)` finds the database at head and nothing else happens.
+Otherwise missing tables are created from the models and pending migrations
+run in order, each recorded as it completes — a failure stops startup
+instead of being swallowed. A brand-new database gets the whole schema from
+the models and is stamped at head without running anything.
+Changes to existing tables go in the next migration, written with
+add_column() / create_index() (both skip what is already there). Indexes on
+big tables go in a transactional=False migration: PostgreSQL then builds
+them CONCURRENTLY and writes continue meanwhile.
+One process migrates at a time: PostgreSQL takes an advisory lock, SQLite a
+lock file next to the database; the others wait, then find the work done.
+Run by hand (e.g. before deploying a slow index): python -m backend.models.migrations
+"""
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func, inspect, literal, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from backend.models.database import Base, engine as default_engine, SchemaVersion, Team, ChatMessage, KanbanTask, User, ProjectRoadmap
+
+PG_LOCK_ID = 7_347_201   # pg_advisory_lock key: one migrating process at a time
+
+_last_run: Dict = {}
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+    transactional: bool = True
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str, transactional: bool = True):
+    def register(fn: Callable[[Connection], None]):
+        assert not MIGRATIONS or version == MIGRATIONS[-1].version + 1, "migration versions must be consecutive"
+        MIGRATIONS.append(Migration(version, name, fn, transactional))
+        return fn
+    return register
+
+
+# ── Helpers for migrations ────────────────────────────────────────────────────
+
+def add_column(conn: Connection, column, default=None):
+    """ALTER TABLE … ADD COLUMN for a model column, unless it exists (type rendered for the dialect)."""
+    table = column.table.name
+    if column.name in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+    if default is not None:
+        ddl += " DEFAULT " + str(literal(default).compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    conn.execute(text(ddl))
+
+
+def create_index(conn: Connection, name: str, table: str, *columns: str, unique: bool = False):
+    """
+    CREATE INDEX IF NOT EXISTS. In a transactional=False migration on
+    PostgreSQL it is built CONCURRENTLY (no lock on writes), after dropping an
+    invalid index an interrupted build left behind. SQLite holds the write
+    lock while it builds; under WAL readers carry on.
+    """
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    cols = ", ".join(columns)
+    autocommit = conn.get_execution_options().get("isolation_level") == "AUTOCOMMIT"
+    if conn.dialect.name == "postgresql" and autocommit:
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"), {"name": name}).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({cols})"))
+    else:
+        conn.execute(text(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({cols})"))
+
+
+# ── Migrations (append only — never edit one that has shipped) ────────────────
+
+@migration(1, "columns added before versioned migrations")
+def _legacy_columns(conn: Connection):
+    add_column(conn, Team.__table__.c.invite_code)
+    create_index(conn, "ix_teams_invite_code", "teams", "invite_code", unique=True)
+    add_column(conn, ChatMessage.__table__.c.is_pinned, default=False)
+    add_column(conn, KanbanTask.__table__.c.due_date)
+    users = User.__table__.c
+    add_column(conn, users.is_looking_for_team, default=False)
+    add_column(conn, users.preferred_roles)
+    add_column(conn, users.xp, default=0)
+    add_column(conn, users.level, default=1)
+    add_column(conn, users.rank_title, default="Новичок")
+    add_column(conn, users.streak_days, default=0)
+    add_column(conn, users.last_active)
+    add_column(conn, ProjectRoadmap.__table__.c.share_token)
+    create_index(conn, "ix_project_roadmaps_share_token", "project_roadmaps", "share_token", unique=True)
+
+
+@migration(2, "composite indexes for hot queries", transactional=False)
+def _hot_query_indexes(conn: Connection):
+    create_index(conn, "ix_chat_messages_team_id_created_at", "chat_messages", "team_id", "created_at")
+    create_index(conn, "ix_channel_messages_channel_id_created_at", "channel_messages", "channel_id", "created_at")
+    create_index(conn, "ix_kanban_tasks_team_id_status_created_at", "kanban_tasks", "team_id", "status", "created_at")
+    create_index(conn, "ix_kanban_tasks_user_id_updated_at", "kanban_tasks", "user_id", "updated_at")
+    create_index(conn, "ix_xp_logs_user_id_created_at", "xp_logs", "user_id", "created_at")
+    create_index(conn, "ix_personal_chat_messages_user_id_id", "personal_chat_messages", "user_id", "id")
+    create_index(conn, "ix_votes_project_id_user_id_category", "votes", "project_id", "user_id", "category")
+    create_index(conn, "ix_users_is_active_xp", "users", "is_active", "xp")
+    create_index(conn, "ix_users_is_active_last_active", "users", "is_active", "last_active")
+
+
+HEAD = MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+# ── Runner ────────────────────────────────────────────────────────────────────
+
+def current_version(bind: Engine) -> Optional[int]:
+    """Highest applied version; None when the database has no schema_version table yet."""
+    if not inspect(bind).has_table(SchemaVersion.__tablename__):
+        return None
+    with bind.connect() as conn:   # a locked or unreachable database raises — never mistaken for "no schema"
+        return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def _record(conn: Connection, m: Migration):
+    conn.execute(SchemaVersion.__table__.insert().values(version=m.version, name=m.name))
+
+
+def _upgrade(bind: Engine) -> List[int]:
+    fresh = not inspect(bind).get_table_names()
+    Base.metadata.create_all(bind=bind)   # new tables (and schema_version itself)
+    if fresh:
+        with bind.begin() as conn:
+            for m in MIGRATIONS:
+                _record(conn, m)          # the models already are the latest schema
+        return []
+    done = current_version(bind) or 0
+    applied = []
+    for m in MIGRATIONS:
+        if m.version <= done:
+            continue
+        if m.transactional:
+            with bind.begin() as conn:
+                m.apply(conn)
+                _record(conn, m)
+        else:
+            with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                m.apply(conn)
+                _record(conn, m)
+        applied.append(m.version)
+    return applied
+
+
+def migrate(bind: Engine = default_engine) -> Dict:
+    """Bring the schema to HEAD. Costs a table lookup and one query when it is already there."""
+    start = time.perf_counter()
+    version = current_version(bind)
+    if version == HEAD:
+        return _finish(HEAD, [], start)
+    if version is not None and version > HEAD:
+        raise RuntimeError(f"database schema is at version {version}, newer than this code ({HEAD})")
+    if bind.dialect.name == "postgresql":
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as lock:
+            lock.execute(text("SELECT pg_advisory_lock(:id)"), {"id": PG_LOCK_ID})
+            try:
+                applied = _upgrade(bind)   # re-reads the version: another process may have finished meanwhile
+            finally:
+                lock.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": PG_LOCK_ID})
+    else:
+        with _sqlite_lock(bind):
+            applied = _upgrade(bind)
+    return _finish(HEAD, applied, start)
+
+
+@contextmanager
+def _sqlite_lock(bind: Engine):
+    """Exclusive lock on <database>.migrate.lock across processes (in-memory databases need none)."""
+    path = bind.url.database
+    if not path or path == ":memory:" or path.startswith("file::memory:"):
+        yield
+        return
+    with open(path + ".migrate.lock", "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:   # LK_LOCK gives up after ~10 s; a slow index build takes longer
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _finish(version: int, applied: List[int], start: float) -> Dict:
+    _last_run.update(version=version, applied=applied, ms=round((time.perf_counter() - start) * 1000, 1))
+    return dict(_last_run)
+
+
+def migration_status() -> Dict:
+    """Code head and the outcome of the last migrate() in this process."""
+    return {"head": HEAD, "last_run": dict(_last_run) or None}
+
+
+if __name__ == "__main__":
+    before = current_version(default_engine)
+    result = migrate()
+    print(f"schema: {before} → {result['version']} (applied {result['applied'] or 'nothing'}, {result['ms']} ms)")
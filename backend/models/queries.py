@@ -0,0 +1,88 @@
+"""
+Hot queries — the statements behind the busiest endpoints, built in one place.
+Routes and services run them (db.scalars(...) works on sync and async
+sessions alike); test_import.py runs EXPLAIN QUERY PLAN on the same
+builders, so a query edited away from its composite index (see migration 2)
+fails the check instead of quietly turning into a full table scan.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Select, func, select
+
+from backend.models.database import (
+    ChatMessage, ChannelMessage, KanbanTask, XPLog, PersonalChatMessage, Vote, User,
+)
+
+
+def chat_history(team_id: int, limit: int) -> Select:
+    """Latest team chat messages, newest first."""
+    return (select(ChatMessage).where(ChatMessage.team_id == team_id)
+            .order_by(ChatMessage.created_at.desc()).limit(limit))
+
+
+def chat_pins(team_id: int) -> Select:
+    return (select(ChatMessage).where(ChatMessage.team_id == team_id, ChatMessage.is_pinned == True)
+            .order_by(ChatMessage.created_at.desc()))
+
+
+def chat_count(team_id: int) -> Select:
+    return select(func.count()).select_from(ChatMessage).where(ChatMessage.team_id == team_id)
+
+
+def channel_history(channel_id: int, limit: int) -> Select:
+    """Latest channel messages, newest first."""
+    return (select(ChannelMessage).where(ChannelMessage.channel_id == channel_id)
+            .order_by(ChannelMessage.created_at.desc()).limit(limit))
+
+
+def kanban_tasks(team_id: Optional[int] = None, user_id: Optional[int] = None, status: Optional[str] = None) -> Select:
+    """Board tasks, newest first, filtered by whichever of team / user / status is given."""
+    q = select(KanbanTask)
+    if team_id:
+        q = q.where(KanbanTask.team_id == team_id)
+    if user_id:
+        q = q.where(KanbanTask.user_id == user_id)
+    if status:
+        q = q.where(KanbanTask.status == status)
+    return q.order_by(KanbanTask.created_at.desc())
+
+
+def recent_user_tasks(user_id: int, limit: int) -> Select:
+    """A user's most recently updated tasks (AI context)."""
+    return (select(KanbanTask).where(KanbanTask.user_id == user_id)
+            .order_by(KanbanTask.updated_at.desc()).limit(limit))
+
+
+def recent_xp(user_id: int, limit: int) -> Select:
+    return (select(XPLog).where(XPLog.user_id == user_id)
+            .order_by(XPLog.created_at.desc()).limit(limit))
+
+
+def personal_history(user_id: int, limit: int, mode: Optional[str] = None) -> Select:
+    """Latest personal chat messages (of one mode, if given), newest first."""
+    q = select(PersonalChatMessage).where(PersonalChatMessage.user_id == user_id)
+    if mode is not None:
+        q = q.where(PersonalChatMessage.mode == mode)
+    return q.order_by(PersonalChatMessage.id.desc()).limit(limit)
+
+
+def user_vote(project_id: int, user_id: int, category: str) -> Select:
+    return select(Vote).where(Vote.project_id == project_id, Vote.user_id == user_id, Vote.category == category).limit(1)
+
+
+def project_votes(project_id: int) -> Select:
+    return select(Vote).where(Vote.project_id == project_id)
+
+
+def project_vote_count(project_id: int) -> Select:
+    return select(func.count()).select_from(Vote).where(Vote.project_id == project_id)
+
+
+def leaderboard(limit: int) -> Select:
+    return select(User).where(User.is_active == True).order_by(User.xp.desc()).limit(limit)
+
+
+def online_users(since: datetime) -> Select:
+    return (select(User).where(User.is_active == True, User.last_active >= since)
+            .order_by(User.last_active.desc()))
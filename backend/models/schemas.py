@@ -157,6 +157,20 @@ class AIResponse(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 
+# --- Background Job Schemas ---
+class JobResponse(BaseModel):
+    """Answer of every ?async_job=true endpoint; poll /api/jobs/{job_id} for the result."""
+    job_id: str
+    kind: str
+    status: str
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    deduplicated: bool = False
+
+
 # --- Smart Notes Schemas ---
 class SmartNoteCreate(BaseModel):
     content: str
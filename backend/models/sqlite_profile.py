@@ -0,0 +1,135 @@
+"""
+SQLite Profile — production settings for the file database.
+Every new connection (sync and async engine) gets:
+  journal_mode=WAL      readers see the last commit while a write is in progress
+  synchronous=NORMAL    fsync at checkpoints, not every commit (safe under WAL)
+  mmap_size, cache_size page reads from memory instead of read() syscalls
+  busy_timeout          a writer waits for the lock instead of failing with
+                        "database is locked"
+  temp_store=MEMORY     sorts / temp indexes don't touch disk
+SQLite allows one writer at a time, so write transactions of AsyncSessions
+also go through a single FIFO writer queue: a session takes the writer slot
+before its first write (a flush with changes, an ORM insert / update /
+delete statement, also inside run_sync) and gives it back when the
+transaction commits, rolls back or closes. They take turns in the process
+instead of grabbing the file lock and sleeping in busy handlers, and a
+session never waits for the slot while it already holds the lock. Readers
+never wait for it. Writers in other processes and plain sync sessions
+(SessionLocal) still meet at busy_timeout.
+"""
+import asyncio
+import time
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from backend.config import (
+    SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB, SQLITE_BUSY_TIMEOUT_MS, SQLITE_WRITE_QUEUE,
+)
+
+_stats = {"commits": 0, "queued": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "max_depth": 0}
+_lock = None   # created on first use, inside the running loop
+_depth = 0
+_applied = False
+
+
+def pragmas() -> Dict[str, str]:
+    return {
+        "journal_mode": "WAL",
+        "synchronous": SQLITE_SYNCHRONOUS,
+        "mmap_size": str(SQLITE_MMAP_SIZE),
+        "cache_size": str(-SQLITE_CACHE_SIZE_KB),   # negative = KiB, not pages
+        "busy_timeout": str(SQLITE_BUSY_TIMEOUT_MS),
+        "temp_store": "MEMORY",
+    }
+
+
+def apply_profile(engine, url: str):
+    """Set the pragmas on every connection of engine (in-memory databases keep their journal mode)."""
+    global _applied
+    _applied = True
+    in_memory = ":memory:" in url or url.rstrip("/").endswith("sqlite:")
+    settings = {k: v for k, v in pragmas().items() if not (in_memory and k == "journal_mode")}
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in settings.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+class _WriterSession(Session):
+    """Sync session behind a SerializedWriteSession; holds the writer slot from first write to transaction end."""
+
+
+def _acquire_writer(session: Session):
+    """Take the writer slot for session's transaction (runs in the async session's greenlet)."""
+    global _lock, _depth
+    if not SQLITE_WRITE_QUEUE or session.info.get("writer"):
+        return
+    if _lock is None:
+        _lock = asyncio.Lock()   # FIFO: waiters are woken in arrival order
+    start = time.perf_counter()
+    _depth += 1
+    _stats["max_depth"] = max(_stats["max_depth"], _depth)
+    try:
+        await_only(_lock.acquire())
+    finally:
+        _depth -= 1
+    waited = time.perf_counter() - start
+    if waited > 0.001:
+        _stats["queued"] += 1
+    _stats["wait_seconds"] += waited
+    _stats["max_wait_seconds"] = max(_stats["max_wait_seconds"], waited)
+    session.info["writer"] = _lock
+
+
+@event.listens_for(_WriterSession, "before_flush")
+def _writer_before_flush(session, flush_context, instances):
+    _acquire_writer(session)
+
+
+@event.listens_for(_WriterSession, "do_orm_execute")
+def _writer_before_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _acquire_writer(orm_execute_state.session)
+
+
+@event.listens_for(_WriterSession, "after_commit")
+def _writer_committed(session):
+    if session.info.get("writer") is not None:
+        _stats["commits"] += 1
+
+
+@event.listens_for(_WriterSession, "after_transaction_end")
+def _writer_release(session, transaction):
+    if transaction.parent is None:   # the outermost transaction: committed, rolled back or closed
+        lock = session.info.pop("writer", None)
+        if lock is not None:
+            lock.release()
+
+
+class SerializedWriteSession(AsyncSession):
+    """AsyncSession whose write transactions queue for the single writer slot."""
+
+    sync_session_class = _WriterSession
+
+
+def write_queue_stats() -> Dict:
+    commits = _stats["commits"]
+    return {
+        "enabled": _applied and SQLITE_WRITE_QUEUE,
+        "commits": commits,
+        "queued": _stats["queued"],
+        "depth": _depth,
+        "max_depth": _stats["max_depth"],
+        "avg_wait_ms": round(_stats["wait_seconds"] / commits * 1000, 2) if commits else None,
+        "max_wait_ms": round(_stats["max_wait_seconds"] * 1000, 2),
+        "pragmas": pragmas() if _applied else None,
+    }
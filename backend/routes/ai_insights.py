@@ -8,8 +8,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from pydantic import BaseModel
-from backend.models.database import get_db, Team, Member, Task, BurnoutLog, ChatMessage
+from backend.models.database import get_db, Team, Member, Task, BurnoutLog
+from backend.models import queries
 from backend.services.openrouter_service import chat_completion, DEFAULT_MODEL, FAST_MODEL
+from backend.services.llm_scheduler import team_tenant
 
 router = APIRouter(prefix="/api/insights", tags=["AI Insights"])
 
@@ -149,7 +151,7 @@ async def post_hackathon_report(team_id: int, project_summary: str = "", languag
 
     members = db.query(Member).filter(Member.team_id == team_id).all()
     tasks = db.query(Task).filter(Task.team_id == team_id).all()
-    messages = db.query(ChatMessage).filter(ChatMessage.team_id == team_id).count()
+    messages = db.scalar(queries.chat_count(team_id))
 
     done = len([t for t in tasks if t.status == 'done'])
     total = len(tasks)
@@ -189,6 +191,8 @@ async def post_hackathon_report(team_id: int, project_summary: str = "", languag
         ],
         model=DEFAULT_MODEL,
         max_tokens=2500,
+        priority="background",
+        tenant=team_tenant(team_id),
     )
     return {
         "success": True,
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -8,7 +10,8 @@ import bcrypt as _bcrypt
 from pydantic import BaseModel
 import os
 
-from backend.models.database import get_db, User, Badge, UserBadge, XPLog
+from backend.models.database import get_db, get_async_db, User, Badge, UserBadge, XPLog
+from backend.models import queries
 
 # ── Config ────────────────────────────────────────────────────────────────────
 SECRET_KEY = os.getenv("SECRET_KEY", "akylteam-super-secret-key-change-this")
@@ -104,17 +107,30 @@ def user_to_dict(user: User) -> dict:
         "badge_count": len(user.badges) if user.badges else 0,
     }
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Optional[User]:
+def _token_user_id(token: Optional[str]) -> Optional[int]:
     if not token:
         return None
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            return None
-    except JWTError:
+        user_id = payload.get("sub")
+        return int(user_id) if user_id is not None else None
+    except (JWTError, ValueError):
+        return None
+
+async def load_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    """User with badges loaded (user_to_dict needs them; an AsyncSession can't lazy-load)."""
+    return (await db.scalars(
+        select(User)
+        .options(selectinload(User.badges).selectinload(UserBadge.badge))
+        .where(User.id == user_id)
+        .execution_options(populate_existing=True)
+    )).first()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Optional[User]:
+    user_id = _token_user_id(token)
+    if user_id is None:
         return None
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = db.query(User).filter(User.id == user_id).first()
     # Update last_active timestamp
     if user:
         user.last_active = datetime.utcnow()
@@ -126,6 +142,28 @@ async def require_user(current_user: Optional[User] = Depends(get_current_user))
         raise HTTPException(status_code=401, detail="Not authenticated")
     return current_user
 
+# Same for routes on get_async_db (the user must belong to the session the route writes with)
+async def get_current_user_async(token: str = Depends(oauth2_scheme),
+                                 db: AsyncSession = Depends(get_async_db)) -> Optional[User]:
+    user_id = _token_user_id(token)
+    if user_id is None:
+        return None
+    user = await load_user(db, user_id)
+    if user:
+        user.last_active = datetime.utcnow()
+        await db.commit()
+    return user
+
+async def require_user_async(current_user: Optional[User] = Depends(get_current_user_async)) -> User:
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return current_user
+
+async def require_admin(current_user: User = Depends(require_user_async)) -> User:
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Нет доступа")
+    return current_user
+
 def award_xp(db: Session, user: User, amount: int, reason: str):
     user.xp += amount
     user.rank_title, _ = get_rank(user.xp)
@@ -169,10 +207,10 @@ def seed_badges(db: Session):
 # ── Routes ────────────────────────────────────────────────────────────────────
 
 @router.post("/register", response_model=LoginResponse)
-async def register(req: RegisterRequest, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.username == req.username).first():
+async def register(req: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
+    if (await db.scalars(select(User.id).where(User.username == req.username))).first():
         raise HTTPException(400, "Имя пользователя уже занято")
-    if db.query(User).filter(User.email == req.email).first():
+    if (await db.scalars(select(User.id).where(User.email == req.email))).first():
         raise HTTPException(400, "Email уже зарегистрирован")
 
     user = User(
@@ -188,25 +226,24 @@ async def register(req: RegisterRequest, db: Session = Depends(get_db)):
         is_looking_for_team=req.is_looking_for_team,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
 
     # Award first login badge
-    seed_badges(db)
-    award_badge(db, user, "first_login")
-    award_xp(db, user, 100, "registration")
-    db.commit()
-    db.refresh(user)
+    await db.run_sync(seed_badges)
+    await db.run_sync(award_badge, user, "first_login")
+    await db.run_sync(award_xp, user, 100, "registration")
+    await db.commit()
+    user = await load_user(db, user.id)
 
     token = create_token({"sub": str(user.id)}, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     return LoginResponse(access_token=token, user=user_to_dict(user))
 
 
 @router.post("/login", response_model=LoginResponse)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = (await db.scalars(select(User).where(
         (User.username == form_data.username) | (User.email == form_data.username)
-    ).first()
+    ))).first()
     if not user or not verify_password(form_data.password, user.hashed_password):
         raise HTTPException(401, "Неверный логин или пароль")
 
@@ -223,18 +260,17 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     user.last_active = now
 
     if user.streak_days == 7:
-        seed_badges(db)
-        award_badge(db, user, "streaker_7")
-    db.commit()
-    db.refresh(user)
+        await db.run_sync(seed_badges)
+        await db.run_sync(award_badge, user, "streaker_7")
+    await db.commit()
+    user = await load_user(db, user.id)
 
     token = create_token({"sub": str(user.id)}, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     return LoginResponse(access_token=token, user=user_to_dict(user))
 
 
 @router.get("/me")
-async def get_me(current_user: User = Depends(require_user), db: Session = Depends(get_db)):
-    db.refresh(current_user)
+async def get_me(current_user: User = Depends(require_user_async), db: AsyncSession = Depends(get_async_db)):
     data = user_to_dict(current_user)
     # add badges detail
     badges = []
@@ -243,17 +279,17 @@ async def get_me(current_user: User = Depends(require_user), db: Session = Depen
         badges.append({"key": b.key, "name": b.name, "icon": b.icon, "rarity": b.rarity, "earned_at": ub.earned_at.isoformat()})
     data["badges"] = badges
     # add recent XP
-    xp_logs = db.query(XPLog).filter(XPLog.user_id == current_user.id).order_by(XPLog.created_at.desc()).limit(10).all()
+    xp_logs = (await db.scalars(queries.recent_xp(current_user.id, 10))).all()
     data["xp_logs"] = [{"amount": x.amount, "reason": x.reason, "at": x.created_at.isoformat()} for x in xp_logs]
     return data
 
 
 @router.put("/me")
-async def update_me(req: ProfileUpdateRequest, current_user: User = Depends(require_user), db: Session = Depends(get_db)):
+async def update_me(req: ProfileUpdateRequest, current_user: User = Depends(require_user_async),
+                    db: AsyncSession = Depends(get_async_db)):
     for field, value in req.dict(exclude_none=True).items():
         setattr(current_user, field, value)
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
     return user_to_dict(current_user)
 
 
@@ -263,19 +299,19 @@ async def search_users(
     role: str = "",
     looking: str = "false",
     q: str = "",
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Search users / find teammates."""
     only_looking = looking.lower() in ("true", "1", "yes")
-    query = db.query(User).filter(User.is_active == True)
+    query = select(User).options(selectinload(User.badges)).where(User.is_active == True)
     if only_looking:
-        query = query.filter(User.is_looking_for_team == True)
+        query = query.where(User.is_looking_for_team == True)
     if q:
         like = f"%{q.lower()}%"
-        query = query.filter(
+        query = query.where(
             (User.username.ilike(like)) | (User.full_name.ilike(like))
         )
-    users = query.order_by(User.xp.desc()).all()
+    users = (await db.scalars(query.order_by(User.xp.desc()))).all()
     result = []
     for u in users:
         u_skills = [s.lower() for s in (u.skills or [])]
@@ -293,8 +329,10 @@ async def search_users(
 
 
 @router.get("/leaderboard")
-async def leaderboard(limit: int = 20, db: Session = Depends(get_db)):
-    users = db.query(User).filter(User.is_active == True).order_by(User.xp.desc()).limit(limit).all()
+async def leaderboard(limit: int = 20, db: AsyncSession = Depends(get_async_db)):
+    users = (await db.scalars(
+        queries.leaderboard(limit).options(selectinload(User.badges))
+    )).all()
     result = []
     for i, u in enumerate(users, 1):
         d = user_to_dict(u)
@@ -306,20 +344,19 @@ async def leaderboard(limit: int = 20, db: Session = Depends(get_db)):
 # ─── ONLINE STATUS ────────────────────────────────────────────────────────────
 
 @router.post("/heartbeat")
-async def heartbeat(current_user: Optional[User] = Depends(get_current_user), db: Session = Depends(get_db)):
+async def heartbeat(current_user: Optional[User] = Depends(get_current_user_async)):
     """Update last_active timestamp (called every 30s from frontend)."""
     if not current_user:
         return {"ok": False}
-    current_user.last_active = datetime.utcnow()
-    db.commit()
+    # get_current_user_async already stored the new last_active
     return {"ok": True, "last_active": current_user.last_active.isoformat()}
 
 
 @router.post("/award-xp")
 async def award_xp_endpoint(
     payload: dict,
-    current_user: Optional[User] = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Optional[User] = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Award XP to the authenticated user for a given reason."""
     if not current_user:
@@ -329,9 +366,8 @@ async def award_xp_endpoint(
     if amount <= 0 or amount > 1000:
         raise HTTPException(status_code=400, detail="Invalid XP amount")
     old_xp = current_user.xp
-    award_xp(db, current_user, amount, reason)
-    db.commit()
-    db.refresh(current_user)
+    await db.run_sync(award_xp, current_user, amount, reason)
+    await db.commit()
     rank_title, rank_icon = get_rank(current_user.xp)
     leveled_up = (old_xp // 200) < (current_user.xp // 200)
     return {
@@ -346,20 +382,17 @@ async def award_xp_endpoint(
 
 
 @router.get("/users/online")
-async def get_online_users(db: Session = Depends(get_db)):
+async def get_online_users(db: AsyncSession = Depends(get_async_db)):
     """Get list of users active in the last 5 minutes."""
     threshold = datetime.utcnow() - timedelta(minutes=5)
-    users = db.query(User).filter(
-        User.is_active == True,
-        User.last_active >= threshold
-    ).order_by(User.last_active.desc()).all()
+    users = (await db.scalars(queries.online_users(threshold))).all()
     return [{"id": u.id, "username": u.username, "last_active": u.last_active.isoformat()} for u in users]
 
 
 # ─── GUEST ACCOUNT ───────────────────────────────────────────────────────────
 
 @router.post("/guest")
-async def create_guest(db: Session = Depends(get_db)):
+async def create_guest(db: AsyncSession = Depends(get_async_db)):
     """Create a temporary guest account. Guest password is auto-generated."""
     import secrets as _secrets
     suffix = _secrets.token_hex(4).upper()
@@ -375,7 +408,7 @@ async def create_guest(db: Session = Depends(get_db)):
         last_active=datetime.utcnow(),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    user = await load_user(db, user.id)
     token = create_token({"sub": str(user.id)}, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     return {"access_token": token, "token_type": "bearer", "user": user_to_dict(user), "is_guest": True}
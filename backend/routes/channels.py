@@ -1,13 +1,18 @@
 """Team Channels — Task 6 (channels), Task 7 (AI toggle), Task 8 (AI summary)."""
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from pydantic import BaseModel
 from datetime import datetime
 
-from backend.models.database import get_db, Channel, ChannelMessage
+from backend.models.database import get_async_db, Channel, ChannelMessage
+from backend.models import queries
 from backend.services.openrouter_service import chat_completion, get_system_prompt
+from backend.services.llm_scheduler import team_tenant
+from backend.services.token_budget import fit_messages
+from backend.config import DEFAULT_MODEL, LLM_CHAT_PROMPT_BUDGET
 
 router = APIRouter(prefix="/api/channels", tags=["Channels"])
 
@@ -29,7 +34,7 @@ class ChannelMsgCreate(BaseModel):
 # ── Channels CRUD ──────────────────────────────────────────────────
 
 @router.post("", status_code=201)
-async def create_channel(data: ChannelCreate, db: Session = Depends(get_db)):
+async def create_channel(data: ChannelCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new channel inside a team."""
     # Make sure name starts with #
     name = data.name if data.name.startswith("#") else f"#{data.name}"
@@ -40,15 +45,17 @@ async def create_channel(data: ChannelCreate, db: Session = Depends(get_db)):
         is_ai_enabled=data.is_ai_enabled,
     )
     db.add(ch)
-    db.commit()
-    db.refresh(ch)
+    await db.commit()
+    await db.refresh(ch)
     return _ch_dict(ch)
 
 
 @router.get("/team/{team_id}")
-async def list_channels(team_id: int, db: Session = Depends(get_db)):
+async def list_channels(team_id: int, db: AsyncSession = Depends(get_async_db)):
     """List all channels for a team."""
-    channels = db.query(Channel).filter(Channel.team_id == team_id).order_by(Channel.created_at).all()
+    channels = (await db.scalars(
+        select(Channel).where(Channel.team_id == team_id).order_by(Channel.created_at)
+    )).all()
     if not channels:
         # Auto-create default channels
         defaults = [
@@ -56,50 +63,43 @@ async def list_channels(team_id: int, db: Session = Depends(get_db)):
             Channel(team_id=team_id, name="#dev",     description="Разработка",       is_ai_enabled=True),
             Channel(team_id=team_id, name="#random",  description="Всё подряд",       is_ai_enabled=False),
         ]
-        for ch in defaults:
-            db.add(ch)
-        db.commit()
+        db.add_all(defaults)
+        await db.commit()
         channels = defaults
     return [_ch_dict(ch) for ch in channels]
 
 
 @router.patch("/{channel_id}/toggle-ai")
-async def toggle_ai(channel_id: int, db: Session = Depends(get_db)):
+async def toggle_ai(channel_id: int, db: AsyncSession = Depends(get_async_db)):
     """Toggle AI on/off in a channel."""
-    ch = db.query(Channel).filter(Channel.id == channel_id).first()
+    ch = await db.get(Channel, channel_id)
     if not ch:
         return {"error": "Channel not found"}
     ch.is_ai_enabled = not ch.is_ai_enabled
-    db.commit()
+    await db.commit()
     return {"channel_id": ch.id, "is_ai_enabled": ch.is_ai_enabled}
 
 
 @router.delete("/{channel_id}")
-async def delete_channel(channel_id: int, db: Session = Depends(get_db)):
-    ch = db.query(Channel).filter(Channel.id == channel_id).first()
+async def delete_channel(channel_id: int, db: AsyncSession = Depends(get_async_db)):
+    ch = await db.get(Channel, channel_id)
     if not ch:
         return {"error": "Not found"}
-    db.delete(ch)
-    db.commit()
+    await db.delete(ch)
+    await db.commit()
     return {"deleted": True}
 
 
 # ── Channel Messages ───────────────────────────────────────────────
 
 @router.get("/{channel_id}/messages")
-async def get_channel_messages(channel_id: int, limit: int = 50, db: Session = Depends(get_db)):
-    msgs = (
-        db.query(ChannelMessage)
-        .filter(ChannelMessage.channel_id == channel_id)
-        .order_by(ChannelMessage.created_at.desc())
-        .limit(limit)
-        .all()
-    )
+async def get_channel_messages(channel_id: int, limit: int = 50, db: AsyncSession = Depends(get_async_db)):
+    msgs = (await db.scalars(queries.channel_history(channel_id, limit))).all()
     return [_msg_dict(m) for m in reversed(msgs)]
 
 
 @router.post("/{channel_id}/messages", status_code=201)
-async def send_channel_message(channel_id: int, data: ChannelMsgCreate, db: Session = Depends(get_db)):
+async def send_channel_message(channel_id: int, data: ChannelMsgCreate, db: AsyncSession = Depends(get_async_db)):
     msg = ChannelMessage(
         channel_id=channel_id,
         sender=data.sender,
@@ -107,8 +107,8 @@ async def send_channel_message(channel_id: int, data: ChannelMsgCreate, db: Sess
         content=data.content,
     )
     db.add(msg)
-    db.commit()
-    db.refresh(msg)
+    await db.commit()
+    await db.refresh(msg)
     return _msg_dict(msg)
 
 
@@ -117,32 +117,27 @@ async def ai_reply_in_channel(
     channel_id: int,
     message: str,
     language: str = "ru",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get AI reply for a message in channel (only if AI is enabled)."""
-    ch = db.query(Channel).filter(Channel.id == channel_id).first()
+    ch = await db.get(Channel, channel_id)
     if not ch:
         return {"error": "Channel not found"}
     if not ch.is_ai_enabled:
         return {"error": "AI is disabled in this channel"}
 
     # Get last 8 messages for context
-    recent = (
-        db.query(ChannelMessage)
-        .filter(ChannelMessage.channel_id == channel_id)
-        .order_by(ChannelMessage.created_at.desc())
-        .limit(8)
-        .all()
-    )
+    recent = (await db.scalars(queries.channel_history(channel_id, 8))).all()
     history = [
         {"role": "user" if m.sender_type == "human" else "assistant", "content": m.content}
         for m in reversed(recent)
     ]
-    system = f"{get_system_prompt('hackathon_helper', language)}\n\nТы ассистент в канале «{ch.name}» команды. Отвечай кратко и по делу."
+    system = f"{get_system_prompt('hackathon_helper', language)}\n\nТы ассистент в канале команды. Отвечай кратко и по делу.\nКанал: «{ch.name}»"
     messages = [{"role": "system", "content": system}] + history
     messages.append({"role": "user", "content": message})
+    messages = fit_messages(messages, DEFAULT_MODEL, 2048, cap=LLM_CHAT_PROMPT_BUDGET)
 
-    reply = await chat_completion(messages)
+    reply = await chat_completion(messages, priority="interactive", tenant=team_tenant(ch.team_id))
 
     # Save AI reply
     ai_msg = ChannelMessage(
@@ -152,7 +147,7 @@ async def ai_reply_in_channel(
         content=reply,
     )
     db.add(ai_msg)
-    db.commit()
+    await db.commit()
 
     return {"reply": reply, "channel_id": channel_id}
 
@@ -160,19 +155,13 @@ async def ai_reply_in_channel(
 # ── AI Summary ─────────────────────────────────────────────────────
 
 @router.post("/{channel_id}/ai-summary")
-async def ai_channel_summary(channel_id: int, language: str = "ru", db: Session = Depends(get_db)):
+async def ai_channel_summary(channel_id: int, language: str = "ru", db: AsyncSession = Depends(get_async_db)):
     """Generate AI summary of the last N messages in a channel."""
-    ch = db.query(Channel).filter(Channel.id == channel_id).first()
+    ch = await db.get(Channel, channel_id)
     if not ch:
         return {"error": "Channel not found"}
 
-    msgs = (
-        db.query(ChannelMessage)
-        .filter(ChannelMessage.channel_id == channel_id)
-        .order_by(ChannelMessage.created_at.desc())
-        .limit(30)
-        .all()
-    )
+    msgs = (await db.scalars(queries.channel_history(channel_id, 30))).all()
     if not msgs:
         return {"summary": "Нет сообщений для анализа."}
 
@@ -185,7 +174,7 @@ async def ai_channel_summary(channel_id: int, language: str = "ru", db: Session
     summary = await chat_completion([
         {"role": "system", "content": "Ты помощник, который кратко суммирует чаты команды."},
         {"role": "user", "content": prompt},
-    ])
+    ], priority="background", tenant=team_tenant(ch.team_id))
     return {"summary": summary, "channel_id": channel_id, "channel_name": ch.name, "messages_analyzed": len(msgs)}
 
 
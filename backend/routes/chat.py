@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Optional
 from pydantic import BaseModel
-from backend.models.database import get_db, ChatMessage, Team, MessageReaction
+from backend.models.database import get_async_db, AsyncSessionLocal, ChatMessage, Team, MessageReaction
+from backend.models import queries
 from backend.models.schemas import ChatMessageCreate, ChatMessageResponse, AIResponse
 from backend.services.openrouter_service import chat_completion, get_system_prompt
+from backend.services.llm_scheduler import team_tenant
+from backend.services.token_budget import fit_messages
+from backend.config import DEFAULT_MODEL, LLM_CHAT_PROMPT_BUDGET
 import json
 import asyncio
 
@@ -37,6 +42,21 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 
+async def post_agent_message(team_id: int, sender: str, content: str, message_type: str = "text"):
+    """Save an AI agent's message to the team chat and push it to connected members."""
+    async with AsyncSessionLocal() as db:
+        db.add(ChatMessage(team_id=team_id, sender=sender, sender_type="agent",
+                           content=content, message_type=message_type))
+        await db.commit()
+    await manager.broadcast_to_team({
+        "type": "message",
+        "sender": sender,
+        "content": content,
+        "sender_type": "agent",
+        "message_type": message_type,
+    }, team_id)
+
+
 @router.websocket("/ws/{team_id}")
 async def websocket_endpoint(websocket: WebSocket, team_id: int):
     """WebSocket for real-time group chat."""
@@ -63,25 +83,19 @@ async def websocket_endpoint(websocket: WebSocket, team_id: int):
 
 
 @router.post("/messages", response_model=ChatMessageResponse)
-async def send_message(data: ChatMessageCreate, db: Session = Depends(get_db)):
+async def send_message(data: ChatMessageCreate, db: AsyncSession = Depends(get_async_db)):
     """Save chat message."""
     msg = ChatMessage(**data.model_dump(), sender_type="human")
     db.add(msg)
-    db.commit()
-    db.refresh(msg)
+    await db.commit()
+    await db.refresh(msg)
     return msg
 
 
 @router.get("/messages/{team_id}", response_model=List[ChatMessageResponse])
-async def get_messages(team_id: int, limit: int = 50, db: Session = Depends(get_db)):
+async def get_messages(team_id: int, limit: int = 50, db: AsyncSession = Depends(get_async_db)):
     """Get chat history for a team."""
-    messages = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.team_id == team_id)
-        .order_by(ChatMessage.created_at.desc())
-        .limit(limit)
-        .all()
-    )
+    messages = (await db.scalars(queries.chat_history(team_id, limit))).all()
     return list(reversed(messages))
 
 
@@ -90,29 +104,24 @@ async def ai_chat_message(
     team_id: int,
     message: str,
     language: str = "ru",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Send message to AI and get response in group chat."""
     # Get last 10 messages for context
-    recent = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.team_id == team_id)
-        .order_by(ChatMessage.created_at.desc())
-        .limit(10)
-        .all()
-    )
+    recent = (await db.scalars(queries.chat_history(team_id, 10))).all()
     history = [{"role": "user" if m.sender_type == "human" else "assistant", "content": m.content} for m in reversed(recent)]
 
     system = get_system_prompt("hackathon_helper", language)
     messages = [{"role": "system", "content": system}] + history
     messages.append({"role": "user", "content": message})
+    messages = fit_messages(messages, DEFAULT_MODEL, 2048, cap=LLM_CHAT_PROMPT_BUDGET)
 
-    response = await chat_completion(messages)
+    response = await chat_completion(messages, priority="interactive", tenant=team_tenant(team_id))
 
     # Save AI message
     ai_msg = ChatMessage(team_id=team_id, sender="Акыл AI", sender_type="agent", content=response)
     db.add(ai_msg)
-    db.commit()
+    await db.commit()
 
     # Broadcast to WebSocket
     await manager.broadcast_to_team({
@@ -134,20 +143,20 @@ class ReactionRequest(BaseModel):
 
 
 @router.post("/messages/{message_id}/react")
-async def react_to_message(message_id: int, data: ReactionRequest, db: Session = Depends(get_db)):
+async def react_to_message(message_id: int, data: ReactionRequest, db: AsyncSession = Depends(get_async_db)):
     """Toggle emoji reaction on a message."""
-    msg = db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
+    msg = await db.get(ChatMessage, message_id)
     if not msg:
         return {"error": "Message not found"}
     # Check if already reacted (by user_id or username+emoji combo)
-    existing = db.query(MessageReaction).filter(
+    existing = (await db.scalars(select(MessageReaction).where(
         MessageReaction.message_id == message_id,
         MessageReaction.emoji == data.emoji,
         MessageReaction.username == data.username,
-    ).first()
+    ))).first()
     if existing:
-        db.delete(existing)
-        db.commit()
+        await db.delete(existing)
+        await db.commit()
         action = "removed"
     else:
         reaction = MessageReaction(
@@ -157,10 +166,10 @@ async def react_to_message(message_id: int, data: ReactionRequest, db: Session =
             user_id=data.user_id,
         )
         db.add(reaction)
-        db.commit()
+        await db.commit()
         action = "added"
     # Return updated reactions summary
-    all_reactions = db.query(MessageReaction).filter(MessageReaction.message_id == message_id).all()
+    all_reactions = (await db.scalars(select(MessageReaction).where(MessageReaction.message_id == message_id))).all()
     summary: dict = {}
     for r in all_reactions:
         summary[r.emoji] = summary.get(r.emoji, 0) + 1
@@ -168,8 +177,8 @@ async def react_to_message(message_id: int, data: ReactionRequest, db: Session =
 
 
 @router.get("/messages/{message_id}/reactions")
-async def get_reactions(message_id: int, db: Session = Depends(get_db)):
-    all_reactions = db.query(MessageReaction).filter(MessageReaction.message_id == message_id).all()
+async def get_reactions(message_id: int, db: AsyncSession = Depends(get_async_db)):
+    all_reactions = (await db.scalars(select(MessageReaction).where(MessageReaction.message_id == message_id))).all()
     summary: dict = {}
     for r in all_reactions:
         summary[r.emoji] = summary.get(r.emoji, 0) + 1
@@ -179,21 +188,18 @@ async def get_reactions(message_id: int, db: Session = Depends(get_db)):
 # ── PIN MESSAGES ──────────────────────────────────────────────────────────────
 
 @router.patch("/messages/{message_id}/pin")
-async def toggle_pin(message_id: int, db: Session = Depends(get_db)):
+async def toggle_pin(message_id: int, db: AsyncSession = Depends(get_async_db)):
     """Toggle pinned state of a message."""
-    msg = db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
+    msg = await db.get(ChatMessage, message_id)
     if not msg:
         return {"error": "Message not found"}
     msg.is_pinned = not msg.is_pinned
-    db.commit()
+    await db.commit()
     return {"pinned": msg.is_pinned, "message_id": message_id}
 
 
 @router.get("/messages/{team_id}/pinned")
-async def get_pinned_messages(team_id: int, db: Session = Depends(get_db)):
+async def get_pinned_messages(team_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get all pinned messages for a team."""
-    pins = db.query(ChatMessage).filter(
-        ChatMessage.team_id == team_id,
-        ChatMessage.is_pinned == True
-    ).order_by(ChatMessage.created_at.desc()).all()
+    pins = (await db.scalars(queries.chat_pins(team_id))).all()
     return [{"id": m.id, "sender": m.sender, "content": m.content[:200], "created_at": m.created_at.isoformat()} for m in pins]
@@ -1,10 +1,11 @@
 """
 CodeSpace Route — Monaco Editor backend: AI autocomplete + code execution via Piston API
 Endpoints:
-  POST /api/codespace/complete  — AI code completion / improvement
-  POST /api/codespace/run       — Execute code via Piston API (free, no key)
-  POST /api/codespace/explain   — AI explains selected code
-  POST /api/codespace/fix       — AI fixes bugs + error message
+  POST /api/codespace/complete         — AI code completion / improvement
+  POST /api/codespace/complete/stream  — same, as Server-Sent Events
+  POST /api/codespace/run              — Execute code via Piston API (free, no key)
+  POST /api/codespace/explain          — AI explains selected code
+  POST /api/codespace/fix              — AI fixes bugs + error message
 """
 import httpx
 from fastapi import APIRouter
@@ -12,6 +13,7 @@ from pydantic import BaseModel
 from typing import Optional
 from backend.services.openrouter_service import chat_completion, SMART_MODEL, DEFAULT_MODEL
 from backend.services.search_service import web_search, format_search_for_ai
+from backend.services.sse_service import stream_llm
 
 router = APIRouter(prefix="/api/codespace", tags=["CodeSpace"])
 
@@ -86,9 +88,7 @@ async def _get_runtime(lang: str) -> Optional[dict]:
     return None
 
 
-@router.post("/complete")
-async def ai_complete(req: CompleteRequest):
-    """AI completes or improves code based on user prompt."""
+def _complete_messages(req: CompleteRequest) -> list:
     lang_note = LANG_RESP.get(req.ui_language, LANG_RESP["en"])
     user_req  = req.prompt if req.prompt else "Complete or improve this code."
 
@@ -105,11 +105,23 @@ Provide improved/completed code. Output the code in a fenced code block, then a
 {lang_note}"""
 
     system = f"You are an expert {req.language} developer and coding assistant."
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=2000)
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+@router.post("/complete")
+async def ai_complete(req: CompleteRequest):
+    """AI completes or improves code based on user prompt."""
+    content = await chat_completion(_complete_messages(req), model=SMART_MODEL, max_tokens=2000)
     return {"result": content, "language": req.language}
 
 
+@router.post("/complete/stream")
+async def ai_complete_stream(req: CompleteRequest):
+    """Same as /complete, streamed as Server-Sent Events."""
+    return stream_llm(_complete_messages(req), meta={"language": req.language},
+                      model=SMART_MODEL, max_tokens=2000)
+
+
 @router.post("/run")
 async def run_code(req: RunRequest):
     """Execute code via Piston API (free, no API key needed)."""
@@ -8,7 +8,10 @@ from backend.models.schemas import (
     MemberCreate, MemberResponse, TaskCreate, TaskResponse, AIResponse
 )
 from backend.services.openrouter_service import chat_completion, get_system_prompt, DEFAULT_MODEL
-from backend.services.agent_service import multi_agent_discussion, get_team_feedback
+from backend.services.agent_service import AGENTS, multi_agent_discussion, iter_agent_discussion, get_team_feedback
+from backend.services.sse_service import stream_events
+from backend.routes.chat import post_agent_message
+from backend.config import QUICK_FEEDBACK_DEADLINE
 
 router = APIRouter(prefix="/api/hackathon", tags=["Hackathon Helper"])
 
@@ -147,18 +150,48 @@ async def hackathon_chat(request: HackathonHelperRequest, db: Session = Depends(
 async def agent_discussion(topic: str, language: str = "ru"):
     """Run multi-agent discussion on a hackathon topic."""
     agents_responses = await multi_agent_discussion(topic, language)
-    formatted = "\n\n".join([
+    return AIResponse(success=True, content=_format_discussion(agents_responses),
+                      metadata={"agents": agents_responses})
+
+
+@router.post("/agent-discussion/stream")
+async def agent_discussion_stream(topic: str, language: str = "ru"):
+    """SSE: one event per agent as soon as it has spoken; "done" carries the formatted discussion."""
+    def on_complete(agents_responses: list) -> dict:
+        ordered = sorted(agents_responses, key=lambda r: list(AGENTS).index(r["agent"]))
+        return {"content": _format_discussion(ordered), "agents": ordered}
+
+    return stream_events(iter_agent_discussion(topic, language), on_complete)
+
+
+def _format_discussion(agents_responses: list) -> str:
+    return "\n\n".join([
         f"{r['emoji']} **{r['agent']}** ({r['role']})\n{r['content']}"
         for r in agents_responses
     ])
-    return AIResponse(success=True, content=formatted, metadata={"agents": agents_responses})
 
 
 @router.post("/quick-feedback", response_model=AIResponse)
-async def quick_feedback(situation: str, language: str = "ru"):
-    """Get quick feedback from AI agents."""
-    feedback = await get_team_feedback(situation, language)
-    formatted = "\n\n".join([f"{f['emoji']} **{f['agent']}**: {f['content']}" for f in feedback])
+async def quick_feedback(
+    situation: str,
+    language: str = "ru",
+    team_id: Optional[int] = None,
+    deadline: Optional[float] = None,
+):
+    """
+    Get quick feedback from AI agents.
+    With a team_id the answer comes back after `deadline` seconds
+    (QUICK_FEEDBACK_DEADLINE by default) with the slower agents marked
+    pending; their feedback is posted to the team chat when it arrives.
+    """
+    if team_id is None:
+        feedback = await get_team_feedback(situation, language)
+    else:
+        async def post_late(entry: dict):
+            await post_agent_message(team_id, f"{entry['emoji']} {entry['agent']}", entry["content"], "feedback")
+
+        feedback = await get_team_feedback(situation, language, deadline or QUICK_FEEDBACK_DEADLINE, post_late)
+    formatted = "\n\n".join([f"{f['emoji']} **{f['agent']}**: {f['content'] or '⏳'}" for f in feedback])
     return AIResponse(success=True, content=formatted, metadata={"feedback": feedback})
 
 
@@ -2,12 +2,13 @@
 Hackathon Catalog — browse, search and match hackathons to user/team skills.
 AI generates contextual ideas and full project plans for a chosen hackathon.
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from pydantic import BaseModel
 from backend.models.database import get_db, Member
 from backend.services.openrouter_service import chat_completion, SMART_MODEL, DEFAULT_MODEL
+from backend.services.job_service import register_job, submit_job
 
 router = APIRouter(prefix="/api/catalog", tags=["Hackathon Catalog"])
 
@@ -391,13 +392,27 @@ async def match_hackathons(req: MatchRequest):
 **Сложность для вас:** [оценка с учётом навыков]"""
 
     messages = [{"role": "user", "content": prompt_ru}]
-    content = await chat_completion(messages, model=DEFAULT_MODEL, max_tokens=2000)
+    content = await chat_completion(messages, model=DEFAULT_MODEL, max_tokens=2000, cache=True)
     return {"success": True, "content": content, "top_matches": HACKATHON_CATALOG[:4]}
 
 
 @router.post("/ideas")
-async def generate_hackathon_ideas(req: IdeasRequest):
-    """Generate project ideas specifically for a chosen hackathon, enriched with AI knowledge of trends."""
+async def generate_hackathon_ideas(req: IdeasRequest, async_job: bool = Query(False)):
+    """
+    Generate project ideas specifically for a chosen hackathon, enriched with AI knowledge of trends.
+    async_job=true answers with a job id at once (poll /api/jobs/{job_id}).
+    """
+    if async_job:
+        return await submit_job("catalog.ideas", req.model_dump())
+    return await _generate_hackathon_ideas(req)
+
+
+@register_job("catalog.ideas")
+async def _generate_hackathon_ideas_job(payload: dict) -> dict:
+    return await _generate_hackathon_ideas(IdeasRequest(**payload))
+
+
+async def _generate_hackathon_ideas(req: IdeasRequest) -> dict:
     skills_text = ", ".join(req.team_skills) if req.team_skills else "универсальные"
     constraints_text = f"\nОграничения: {req.constraints}" if req.constraints else ""
     
@@ -442,5 +457,5 @@ async def generate_hackathon_ideas(req: IdeasRequest):
 [Какую идею взять и почему именно с этими навыками команды]"""
 
     messages = [{"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=4000)
+    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=4000, cache=True)
     return {"success": True, "content": content, "hackathon": req.hackathon_name}
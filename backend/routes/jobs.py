@@ -0,0 +1,58 @@
+"""
+Jobs Route — results of long AI generations run in the background
+Endpoints:
+  GET /api/jobs/{job_id}         — poll job status / result
+  GET /api/jobs/{job_id}/events  — Server-Sent Events: status changes until done
+  GET /api/jobs                  — worker pool state
+Jobs are created by AI endpoints called with ?async_job=true, which all answer
+the job itself (JobResponse: {"job_id": ..., "status": "queued", ...}) immediately.
+"""
+import json
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from backend.services.job_service import get_job, watch_job, unwatch_job, wait_for_update, job_stats
+from backend.config import SSE_HEARTBEAT_SECONDS
+
+router = APIRouter(prefix="/api/jobs", tags=["Background Jobs"])
+
+
+@router.get("")
+async def jobs_overview():
+    """Worker pool size, queue length and registered job kinds."""
+    return job_stats()
+
+
+@router.get("/{job_id}")
+async def poll_job(job_id: str):
+    """Current status of a job; result is filled once status is 'done'."""
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    """Stream job status as SSE; the last event carries the result (or error)."""
+    if not await get_job(job_id):
+        raise HTTPException(404, "Job not found")
+
+    async def sse_generator():
+        last_status = None
+        while True:
+            update = watch_job(job_id)   # before the read, so a change right after it is not missed
+            job = await get_job(job_id)
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield f"event: status\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+            if job["status"] in ("done", "failed"):
+                unwatch_job(job_id)
+                return
+            if not await wait_for_update(update, SSE_HEARTBEAT_SECONDS):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        sse_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
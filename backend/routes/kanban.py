@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List, Dict, Set
 from pydantic import BaseModel
 from datetime import datetime
 import json
-from backend.models.database import get_db, KanbanTask, User
+from backend.models.database import get_async_db, KanbanTask, User
+from backend.models import queries
 from backend.routes.auth import award_xp
 
 router = APIRouter(prefix="/api/kanban", tags=["Kanban Board"])
@@ -86,7 +87,7 @@ def task_dict(t: KanbanTask) -> dict:
 
 
 @router.post("/tasks")
-async def create_task(data: KanbanTaskCreate, db: Session = Depends(get_db)):
+async def create_task(data: KanbanTaskCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new kanban task."""
     task_data = data.model_dump()
     due_str = task_data.pop('due_date', None)
@@ -97,8 +98,8 @@ async def create_task(data: KanbanTaskCreate, db: Session = Depends(get_db)):
         except ValueError:
             pass
     db.add(task)
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     result = task_dict(task)
     room = str(task.team_id or f"u{task.user_id}")
     await _kanban_mgr.broadcast(room, {"type": "task_created", "task": result})
@@ -110,24 +111,17 @@ async def list_tasks(
     team_id: Optional[int] = None,
     user_id: Optional[int] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """List kanban tasks filtered by team or user."""
-    q = db.query(KanbanTask)
-    if team_id:
-        q = q.filter(KanbanTask.team_id == team_id)
-    if user_id:
-        q = q.filter(KanbanTask.user_id == user_id)
-    if status:
-        q = q.filter(KanbanTask.status == status)
-    tasks = q.order_by(KanbanTask.created_at.desc()).all()
+    tasks = (await db.scalars(queries.kanban_tasks(team_id, user_id, status))).all()
     return [task_dict(t) for t in tasks]
 
 
 @router.patch("/tasks/{task_id}")
-async def update_task(task_id: int, data: KanbanTaskUpdate, db: Session = Depends(get_db)):
+async def update_task(task_id: int, data: KanbanTaskUpdate, db: AsyncSession = Depends(get_async_db)):
     """Update a kanban task (title, description, status, priority)."""
-    task = db.query(KanbanTask).filter(KanbanTask.id == task_id).first()
+    task = await db.get(KanbanTask, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     update_data = data.model_dump(exclude_none=True)
@@ -139,8 +133,8 @@ async def update_task(task_id: int, data: KanbanTaskUpdate, db: Session = Depend
             task.due_date = datetime.fromisoformat(due_str) if due_str else None
         except ValueError:
             pass
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     result = task_dict(task)
     room = str(task.team_id or f"u{task.user_id}")
     await _kanban_mgr.broadcast(room, {"type": "task_updated", "task": result})
@@ -148,35 +142,35 @@ async def update_task(task_id: int, data: KanbanTaskUpdate, db: Session = Depend
 
 
 @router.patch("/tasks/{task_id}/status")
-async def move_task(task_id: int, status: str, db: Session = Depends(get_db)):
+async def move_task(task_id: int, status: str, db: AsyncSession = Depends(get_async_db)):
     """Move a task to a different status column. Awards 15 XP on completion."""
     if status not in VALID_STATUSES:
         raise HTTPException(status_code=400, detail=f"Invalid status. Use: {VALID_STATUSES}")
-    task = db.query(KanbanTask).filter(KanbanTask.id == task_id).first()
+    task = await db.get(KanbanTask, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     prev_status = task.status
     task.status = status
-    db.commit()
     # Award XP for completing a task
     if status == "done" and prev_status != "done" and task.user_id:
-        user = db.query(User).filter(User.id == task.user_id).first()
+        user = await db.get(User, task.user_id)
         if user:
-            award_xp(db, user, 15, f"Задача завершена: {task.title[:40]}")
+            await db.run_sync(award_xp, user, 15, f"Задача завершена: {task.title[:40]}")
+    await db.commit()
     room = str(task.team_id or f"u{task.user_id}")
     await _kanban_mgr.broadcast(room, {"type": "task_moved", "id": task.id, "status": task.status})
     return {"success": True, "id": task.id, "status": task.status}
 
 
 @router.delete("/tasks/{task_id}")
-async def delete_task(task_id: int, db: Session = Depends(get_db)):
+async def delete_task(task_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a kanban task."""
-    task = db.query(KanbanTask).filter(KanbanTask.id == task_id).first()
+    task = await db.get(KanbanTask, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     room = str(task.team_id or f"u{task.user_id}")
-    db.delete(task)
-    db.commit()
+    await db.delete(task)
+    await db.commit()
     # Notify all clients in the room
     await _kanban_mgr.broadcast(room, {"type": "task_deleted", "id": task_id})
     return {"success": True}
@@ -0,0 +1,140 @@
+"""
+LLM Admin Route — runtime state of the OpenRouter integration
+Endpoints:
+  GET  /api/admin/llm/pool                 — shared HTTP client pool stats (connection reuse)
+  GET  /api/admin/llm/models               — per-model circuit breaker state and health
+  POST /api/admin/llm/models/reset         — close all circuits (forget health data)
+  POST /api/admin/llm/models/{model}/reset — close one model's circuit
+  GET    /api/admin/llm/cache              — LLM response cache hit/miss metrics
+  DELETE /api/admin/llm/cache              — drop both cache tiers
+  GET    /api/admin/llm/inflight           — singleflight coalescing counters
+  GET    /api/admin/llm/scheduler          — scheduler queue depth, wait times, slots in use
+  GET    /api/admin/llm/structured         — JSON parse success rates per call site
+  GET    /api/admin/llm/context            — user context snapshot cache hit rate and rebuild time
+  GET    /api/admin/llm/chat-memory        — rolling chat summary folds and failures
+  GET    /api/admin/llm/memory             — long-term memory index size and query latency
+  GET    /api/admin/llm/router             — route SLOs, per-model latency predictions, routing decisions
+  GET    /api/admin/llm/loop               — event-loop lag percentiles (time blocked by sync code)
+  DELETE /api/admin/llm/loop               — start a fresh lag measurement window
+  GET    /api/admin/llm/db                 — schema version, SQLite pragmas and writer queue waits
+All endpoints require a user with role "admin" (401 without a token, 403 otherwise).
+"""
+from fastapi import APIRouter, Depends
+from backend.routes.auth import require_admin
+from backend.services.openrouter_service import get_pool_stats, get_inflight_stats, FREE_MODELS_FALLBACK
+from backend.services.model_health import health_snapshot, reset_health, order_models
+from backend.services.llm_cache import cache_stats, cache_clear
+from backend.services.llm_scheduler import scheduler
+from backend.services.structured_output import structured_stats
+from backend.services.model_router import router_snapshot
+from backend.services.context_service import context_cache_stats
+from backend.services.chat_memory import memory_stats
+from backend.services.memory_index import memory_index_stats
+from backend.services.loop_monitor import loop_lag_stats, reset_loop_stats
+from backend.models.sqlite_profile import write_queue_stats
+from backend.models.migrations import migration_status
+
+router = APIRouter(prefix="/api/admin/llm", tags=["LLM Admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/pool")
+async def pool_stats():
+    """Connection pool stats of the shared OpenRouter client."""
+    return get_pool_stats()
+
+
+@router.get("/models")
+async def model_health():
+    """Circuit breaker state, rolling error rate and latency EWMA per model."""
+    return {
+        "models": health_snapshot(),
+        "fallback_order": order_models(FREE_MODELS_FALLBACK),
+    }
+
+
+@router.post("/models/reset")
+async def reset_all_models():
+    """Forget all health data — every circuit goes back to closed."""
+    reset_health()
+    return {"reset": "all"}
+
+
+@router.post("/models/{model:path}/reset")
+async def reset_model(model: str):
+    """Close one model's circuit (e.g. after its rate limit was lifted)."""
+    reset_health(model)
+    return {"reset": model}
+
+
+@router.get("/cache")
+async def llm_cache_stats():
+    """Hit/miss counters and sizes of the in-memory and SQLite cache tiers."""
+    return await cache_stats()
+
+
+@router.delete("/cache")
+async def llm_cache_clear():
+    """Drop every cached completion (memory and disk)."""
+    await cache_clear()
+    return {"cleared": True}
+
+
+@router.get("/inflight")
+async def inflight_stats():
+    """How many identical in-flight calls/streams were coalesced onto one upstream request."""
+    return get_inflight_stats()
+
+
+@router.get("/scheduler")
+async def scheduler_stats():
+    """Slots in use, queue depth and wait-time percentiles per priority lane."""
+    return scheduler.snapshot()
+
+
+@router.get("/structured")
+async def structured_output_stats():
+    """Structured-output outcomes per call site: parsed, repaired, retried on FAST_MODEL, failed."""
+    return structured_stats()
+
+
+@router.get("/context")
+async def user_context_stats():
+    """Hit rate, patches, invalidations and rebuild time of the per-user context snapshots."""
+    return context_cache_stats()
+
+
+@router.get("/chat-memory")
+async def chat_memory_stats():
+    """How many personal-chat messages were folded into rolling summaries."""
+    return memory_stats()
+
+
+@router.get("/memory")
+async def memory_index_state():
+    """Users and documents in the retrieval index, average query and build time."""
+    return memory_index_stats()
+
+
+@router.get("/router")
+async def model_router_stats():
+    """Route SLOs, predicted p95 / TTFT per model and which model served each route."""
+    return router_snapshot()
+
+
+@router.get("/loop")
+async def loop_lag():
+    """Event-loop lag: how long requests waited behind code that did not yield."""
+    return loop_lag_stats()
+
+
+@router.delete("/loop")
+async def reset_loop_lag():
+    """Drop recent lag samples (e.g. before a load test)."""
+    reset_loop_stats()
+    return {"ok": True}
+
+
+@router.get("/db")
+async def db_stats():
+    """Schema version, SQLite profile in effect and how long commits waited for the single writer slot."""
+    return {"schema": migration_status(), **write_queue_stats()}
@@ -6,6 +6,9 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from backend.models.database import MoodBoard, get_db
 from backend.services.openrouter_service import chat_completion
+from backend.services.structured_output import chat_completion_json
+from pydantic import BaseModel
+from typing import List
 from backend.config import DEFAULT_MODEL
 import base64
 import json
@@ -233,13 +236,22 @@ async def _extract_colors(photo_data: str) -> list:
         return ["#7c3aed", "#ec4899", "#f59e0b", "#10b981", "#06b6d4"]
 
 
+class _MoodTags(BaseModel):
+    tags: List[str]
+
+
+class _MoodBoardAnalysis(BaseModel):
+    mood: str
+    tags: List[str]
+
+
 async def _detect_mood(photo_data: str) -> list:
     """AI: detect mood/style tags from image."""
     try:
         messages = [
             {
                 "role": "system",
-                "content": "Based on this image, suggest 3-5 design mood/style tags (lowercase). Return JSON array: [\"tag1\", \"tag2\", ...]. Examples: minimal, colorful, dark, vibrant, professional, fun, edgy, calm."
+                "content": "Based on this image, suggest 3-5 design mood/style tags (lowercase). Return JSON: {\"tags\": [\"tag1\", \"tag2\", ...]}. Examples: minimal, colorful, dark, vibrant, professional, fun, edgy, calm."
             },
             {
                 "role": "user",
@@ -247,15 +259,11 @@ async def _detect_mood(photo_data: str) -> list:
             }
         ]
         
-        result = await chat_completion(messages, model=DEFAULT_MODEL, max_tokens=100)
-        
-        try:
-            tags = json.loads(result)
-            return tags if isinstance(tags, list) else []
-        except:
-            return ["modern", "design"]
+        result = await chat_completion_json(messages, _MoodTags, call_site="media.detect_mood",
+                                            model=DEFAULT_MODEL, max_tokens=100)
+        return result.tags
     except:
-        return ["modern"]
+        return ["modern", "design"]
 
 
 async def _suggest_palette(images_list: list) -> list:
@@ -299,15 +307,9 @@ async def _analyze_mood_board(title: str, description: str, images_list: list) -
             }
         ]
         
-        result = await chat_completion(messages, model=DEFAULT_MODEL, max_tokens=150)
-        
-        try:
-            data = json.loads(result)
-            mood = data.get("mood", "Beautiful design inspiration")
-            tags = data.get("tags", ["modern", "design"])
-            return mood, tags
-        except:
-            return "Beautiful design inspiration", ["modern", "design"]
+        result = await chat_completion_json(messages, _MoodBoardAnalysis, call_site="media.analyze_mood_board",
+                                            model=DEFAULT_MODEL, max_tokens=150)
+        return result.mood, result.tags
     except:
         return "Beautiful design inspiration", ["modern", "design"]
 
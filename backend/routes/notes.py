@@ -8,6 +8,9 @@ from datetime import datetime
 from backend.models.database import SmartNote, get_db, KanbanTask
 from backend.models.schemas import SmartNoteCreate, SmartNoteUpdate
 from backend.services.openrouter_service import chat_completion
+from backend.services.structured_output import chat_completion_json
+from pydantic import BaseModel
+from typing import List
 from backend.config import DEFAULT_MODEL, SMART_MODEL
 import base64
 import json
@@ -21,6 +24,7 @@ async def capture_note(
     tags: str = Form(default="[]"),
     photo_file: UploadFile = None,
     team_id: int = None,
+    user_id: int = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -44,6 +48,7 @@ async def capture_note(
     # Create note record
     note = SmartNote(
         team_id=team_id,
+        user_id=user_id,
         content=content,
         tags=tags_list,
         has_photo=has_photo,
@@ -204,6 +209,10 @@ async def _analyze_photo(photo_data: str) -> str:
         return "Photo uploaded (analysis skipped)"
 
 
+class _ExtractedTasks(BaseModel):
+    tasks: List[str]
+
+
 async def _extract_tasks(text: str) -> list:
     """AI extract actionable tasks from note text."""
     try:
@@ -213,7 +222,7 @@ async def _extract_tasks(text: str) -> list:
         messages = [
             {
                 "role": "system",
-                "content": "Extract 2-3 actionable tasks from the note. Return JSON array of strings. Only action items, no explanations. Example: [\"Add blue color\", \"Interview 5 users\"]"
+                "content": "Extract 2-3 actionable tasks from the note. Only action items, no explanations. Example: {\"tasks\": [\"Add blue color\", \"Interview 5 users\"]}"
             },
             {
                 "role": "user",
@@ -221,14 +230,9 @@ async def _extract_tasks(text: str) -> list:
             }
         ]
         
-        result = await chat_completion(messages, model=DEFAULT_MODEL, max_tokens=200)
-        
-        # Parse JSON from result
-        try:
-            tasks = json.loads(result)
-            return tasks if isinstance(tasks, list) else []
-        except:
-            return []
+        result = await chat_completion_json(messages, _ExtractedTasks, call_site="notes.extract_tasks",
+                                            model=DEFAULT_MODEL, max_tokens=200)
+        return result.tasks
     except:
         return []
 
@@ -7,6 +7,7 @@ from pydantic import BaseModel
 from typing import Optional, List
 from backend.services.openrouter_service import chat_completion, SMART_MODEL, DEFAULT_MODEL
 from backend.services.search_service import web_search, format_search_for_ai
+from backend.services.sse_service import stream_llm
 
 router = APIRouter(prefix="/api/olympiad", tags=["Olympiad"])
 
@@ -81,12 +82,12 @@ async def get_topics():
     return {"categories": cats, "total": len(TOPICS)}
 
 
-@router.post("/explain")
-async def explain_topic(req: ExplainRequest):
-    """AI explains a topic in detail for the given skill level."""
-    topic = next((t for t in TOPICS if t["id"] == req.topic_id), None)
-    if not topic:
-        topic = {"name": req.topic_id, "desc": req.topic_id}
+def _find_topic(topic_id: str) -> dict:
+    topic = next((t for t in TOPICS if t["id"] == topic_id), None)
+    return topic or {"name": topic_id, "desc": topic_id}
+
+
+def _explain_messages(req: ExplainRequest, topic: dict) -> list:
 
     level_desc = {"beginner": "новичка (простыми словами, с аналогиями)",
                   "mid":      "уровня junior/mid (с деталями реализации)",
@@ -121,12 +122,26 @@ async def explain_topic(req: ExplainRequest):
 [следующие темы для углубления]{lang_instr}"""
 
     system = "Ты опытный тренер по олимпиадному программированию. Объясняешь чётко, с примерами, адаптируя под уровень."
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=3000)
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+@router.post("/explain")
+async def explain_topic(req: ExplainRequest):
+    """AI explains a topic in detail for the given skill level."""
+    topic = _find_topic(req.topic_id)
+    content = await chat_completion(_explain_messages(req, topic), model=SMART_MODEL, max_tokens=3000, cache=True)
 
     return {"topic": topic, "level": req.level, "explanation": content}
 
 
+@router.post("/explain/stream")
+async def explain_topic_stream(req: ExplainRequest):
+    """Same explanation as /explain, streamed as Server-Sent Events."""
+    topic = _find_topic(req.topic_id)
+    return stream_llm(_explain_messages(req, topic), meta={"topic": topic, "level": req.level},
+                      model=SMART_MODEL, max_tokens=3000, cache=True)
+
+
 @router.post("/generate-problem")
 async def generate_problem(req: GenerateProblemRequest):
     """AI generates a practice problem on a given topic."""
@@ -1,13 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-import json
 from pydantic import BaseModel
-from backend.models.database import get_db, User, PersonalChatMessage
+from backend.models.database import get_async_db, AsyncSessionLocal, User, PersonalChatMessage
+from backend.models import queries
 from backend.models.schemas import AIResponse
-from backend.services.openrouter_service import chat_completion, stream_chat_completion, get_system_prompt, DEFAULT_MODEL
-from backend.services.context_service import build_user_context
+from backend.services.openrouter_service import chat_completion, get_system_prompt, DEFAULT_MODEL
+from backend.services.sse_service import stream_llm
+from backend.services.context_service import build_user_context, invalidate_user_context
+from backend.services.llm_scheduler import user_tenant
+from backend.services.token_budget import fit_messages
+from backend.services.prompt_layout import layout_messages
+from backend.services.chat_memory import load_history, memory_section, schedule_summary, forget
+from backend.services.memory_index import recall, memory_section as recall_section, forget_user
+from backend.config import LLM_CHAT_PROMPT_BUDGET
 from backend.services.search_service import web_search, format_search_for_ai
 
 router = APIRouter(prefix="/api/personal-chat", tags=["Personal AI Chat"])
@@ -45,65 +52,62 @@ SYSTEM_PROMPTS = {
 
 
 @router.post("/message", response_model=AIResponse)
-async def personal_chat(request: PersonalChatRequest, db: Session = Depends(get_db)):
+async def personal_chat(request: PersonalChatRequest, db: AsyncSession = Depends(get_async_db)):
     """Send a message to personal AI assistant and get a response."""
-    # Build context from last 10 messages
-    history = []
-    if request.user_id:
-        recent = (
-            db.query(PersonalChatMessage)
-            .filter(PersonalChatMessage.user_id == request.user_id)
-            .order_by(PersonalChatMessage.id.desc())
-            .limit(10)
-            .all()
-        )
-        history = [
-            {"role": m.role, "content": m.content}
-            for m in reversed(recent)
-        ]
+    # Rolling summary of older messages + the turns not folded into it yet
+    summary, history, in_prompt = (
+        await db.run_sync(load_history, request.user_id, request.mode) if request.user_id else ("", [], set())
+    )
+    # Older snippets (any mode, notes, roadmap hints) relevant to this message
+    recalled = await recall(request.user_id, request.message, skip_chat_ids=in_prompt) if request.user_id else []
 
     system_variants = SYSTEM_PROMPTS.get(request.mode, SYSTEM_PROMPTS["assistant"])
-    system = system_variants.get(request.language, system_variants.get("ru"))
+    persona = system_variants.get(request.language, system_variants.get("ru"))
 
-    # Inject live user context from all modules (Kanban, XP, badges, recent chat)
-    if request.user_id:
-        user_ctx = build_user_context(request.user_id, db, request.language)
-        if user_ctx:
-            system = user_ctx + "\n\n" + system
+    # Inject live user context from all modules (Kanban, XP, badges); recent chat is in history
+    user_ctx = (
+        await db.run_sync(lambda s: build_user_context(request.user_id, s, request.language, include_chat=False))
+        if request.user_id else ""
+    )
 
     # Auto-search: if message looks like a search query, fetch web results
     search_triggers = ["найди", "поищи", "что такое", "как сделать", "как установить",
                        "search", "find", "что лучше", "сравни", "документация", "docs"]
     needs_search = any(kw in request.message.lower() for kw in search_triggers) and len(request.message) > 15
+    search_ctx = ""
     if needs_search:
         search_result = await web_search(request.message, max_results=4)
         search_ctx = format_search_for_ai(search_result)
-        system += f"\n\n{search_ctx}"
 
-    messages = [{"role": "system", "content": system}] + history
-    messages.append({"role": "user", "content": request.message})
+    # Stable prefix first (persona, then user context and memory summary), volatile
+    # recall / search results go with the new message — see prompt_layout.py
+    messages = layout_messages(
+        persona,
+        [(1, user_ctx), (1, memory_section(summary))],
+        history,
+        [(2, recall_section(recalled)), (2, search_ctx)],
+        request.message,
+        LLM_CHAT_PROMPT_BUDGET,
+    )
+    messages = fit_messages(messages, DEFAULT_MODEL, 2000, cap=LLM_CHAT_PROMPT_BUDGET)
 
-    content = await chat_completion(messages, model=DEFAULT_MODEL, max_tokens=2000)
+    content = await chat_completion(messages, model=DEFAULT_MODEL, max_tokens=2000,
+                                    priority="interactive", tenant=user_tenant(request.user_id))
 
     # Save messages to DB if user_id provided
     if request.user_id:
         db.add(PersonalChatMessage(user_id=request.user_id, role="user", content=request.message, mode=request.mode))
         db.add(PersonalChatMessage(user_id=request.user_id, role="assistant", content=content, mode=request.mode))
-        db.commit()
+        await db.commit()
+        schedule_summary(request.user_id, request.mode)
 
     return AIResponse(success=True, content=content)
 
 
 @router.get("/history/{user_id}")
-async def get_history(user_id: int, limit: int = 30, db: Session = Depends(get_db)):
+async def get_history(user_id: int, limit: int = 30, db: AsyncSession = Depends(get_async_db)):
     """Get personal chat history for a user."""
-    messages = (
-        db.query(PersonalChatMessage)
-        .filter(PersonalChatMessage.user_id == user_id)
-        .order_by(PersonalChatMessage.id.desc())
-        .limit(limit)
-        .all()
-    )
+    messages = (await db.scalars(queries.personal_history(user_id, limit))).all()
     return [
         {"id": m.id, "role": m.role, "content": m.content, "mode": m.mode}
         for m in reversed(messages)
@@ -111,10 +115,13 @@ async def get_history(user_id: int, limit: int = 30, db: Session = Depends(get_d
 
 
 @router.delete("/history/{user_id}")
-async def clear_history(user_id: int, db: Session = Depends(get_db)):
+async def clear_history(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Clear personal chat history."""
-    db.query(PersonalChatMessage).filter(PersonalChatMessage.user_id == user_id).delete()
-    db.commit()
+    await db.execute(delete(PersonalChatMessage).where(PersonalChatMessage.user_id == user_id))
+    await db.run_sync(forget, user_id)
+    await db.commit()
+    forget_user(user_id)
+    invalidate_user_context(user_id, "chat")  # bulk delete bypasses the ORM events
     return {"success": True}
 
 
@@ -124,55 +131,31 @@ async def personal_chat_stream(
     user_id: Optional[int] = Query(None),
     language: str = Query("ru"),
     mode: str = Query("assistant"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Stream personal AI response as Server-Sent Events."""
-    # Build history context
-    history = []
-    if user_id:
-        recent = (
-            db.query(PersonalChatMessage)
-            .filter(PersonalChatMessage.user_id == user_id)
-            .order_by(PersonalChatMessage.id.desc())
-            .limit(10)
-            .all()
-        )
-        history = [{"role": m.role, "content": m.content} for m in reversed(recent)]
+    summary, history, in_prompt = await db.run_sync(load_history, user_id, mode) if user_id else ("", [], set())
+    recalled = await recall(user_id, message, skip_chat_ids=in_prompt) if user_id else []
 
     system_variants = SYSTEM_PROMPTS.get(mode, SYSTEM_PROMPTS["assistant"])
-    system = system_variants.get(language, system_variants.get("ru"))
+    persona = system_variants.get(language, system_variants.get("ru"))
 
-    messages = [{"role": "system", "content": system}] + history
-    messages.append({"role": "user", "content": message})
+    messages = layout_messages(persona, [(1, memory_section(summary))], history,
+                               [(2, recall_section(recalled))], message, LLM_CHAT_PROMPT_BUDGET)
+    messages = fit_messages(messages, DEFAULT_MODEL, 2000, cap=LLM_CHAT_PROMPT_BUDGET)
 
     # Save user message immediately
     if user_id:
         db.add(PersonalChatMessage(user_id=user_id, role="user", content=message, mode=mode))
-        db.commit()
-
-    async def sse_generator():
-        full_response = []
-        try:
-            async for token in stream_chat_completion(messages, model=DEFAULT_MODEL, max_tokens=2000):
-                full_response.append(token)
-                yield f"data: {json.dumps({'token': token})}\n\n"
-
-            # Save assistant response
-            if user_id:
-                complete = "".join(full_response)
-                db.add(PersonalChatMessage(user_id=user_id, role="assistant", content=complete, mode=mode))
-                db.commit()
-
-            yield f"data: {json.dumps({'done': True})}\n\n"
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-
-    return StreamingResponse(
-        sse_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",
-            "Access-Control-Allow-Origin": "*",
-        },
-    )
+        await db.commit()
+
+    async def save(complete: str):
+        # runs after the response started, when the request's session is already closed
+        if user_id:
+            async with AsyncSessionLocal() as session:
+                session.add(PersonalChatMessage(user_id=user_id, role="assistant", content=complete, mode=mode))
+                await session.commit()
+            schedule_summary(user_id, mode)
+
+    return stream_llm(messages, on_complete=save, model=DEFAULT_MODEL, max_tokens=2000,
+                      priority="interactive", tenant=user_tenant(user_id))
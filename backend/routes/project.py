@@ -1,7 +1,7 @@
 """
 Project AI Route — пошаговый план проекта + веб-поиск + персональный AI
 Endpoints:
-  POST /api/project/generate   — AI генерирует план из описания
+  POST /api/project/generate   — AI генерирует план из описания (?async_job=true → job id)
   GET  /api/project/list       — список планов пользователя
   GET  /api/project/{id}       — получить план
   PATCH /api/project/{id}/step/{idx} — отметить шаг
@@ -9,6 +9,7 @@ Endpoints:
   POST /api/project/search     — веб-поиск + AI-ответ
   DELETE /api/project/{id}     — удалить план
 """
+import asyncio
 import json
 import re
 import secrets
@@ -18,11 +19,12 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from datetime import datetime
 
-from backend.models.database import get_db, ProjectRoadmap, User, KanbanTask, XPLog
+from backend.models.database import get_db, SessionLocal, ProjectRoadmap, User, KanbanTask, XPLog
 from sqlalchemy import func
 from backend.services.openrouter_service import chat_completion, SMART_MODEL, DEFAULT_MODEL
 from backend.services.search_service import web_search, format_search_for_ai
 from backend.services.context_service import build_user_context
+from backend.services.job_service import register_job, submit_job
 from backend.routes.auth import get_current_user
 
 router = APIRouter(prefix="/api/project", tags=["Project AI"])
@@ -121,8 +123,19 @@ def _parse_steps_from_ai(ai_text: str) -> List[dict]:
 # ─── Endpoints ───────────────────────────────────────────────────────────────
 
 @router.post("/generate")
-async def generate_roadmap(req: GenerateRequest, db: Session = Depends(get_db)):
-    """AI generates a step-by-step project roadmap."""
+async def generate_roadmap(req: GenerateRequest, async_job: bool = Query(False)):
+    """AI generates a step-by-step project roadmap. async_job=true answers with a job id at once."""
+    if async_job:
+        return await submit_job("project.generate", req.model_dump(), user_id=req.user_id)
+    return await _generate_roadmap(req)
+
+
+@register_job("project.generate")
+async def _generate_roadmap_job(payload: dict) -> dict:
+    return await _generate_roadmap(GenerateRequest(**payload))
+
+
+async def _generate_roadmap(req: GenerateRequest) -> dict:
     type_label = PROJECT_TYPE_LABELS.get(req.project_type, req.project_type)
     tech_str   = ", ".join(req.tech_stack) if req.tech_stack else "не указан"
 
@@ -158,10 +171,22 @@ async def generate_roadmap(req: GenerateRequest, db: Session = Depends(get_db)):
     )
 
     messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    ai_text = await chat_completion(messages, model=SMART_MODEL, max_tokens=3000)
+    ai_text = await chat_completion(messages, model=SMART_MODEL, max_tokens=3000, hedge=True)
 
     steps = _parse_steps_from_ai(ai_text)
+    # no session is open during the LLM call; the save runs in a thread, off the event loop
+    return await asyncio.to_thread(_save_roadmap, req, steps, ai_text)
+
+
+def _save_roadmap(req: GenerateRequest, steps: List[dict], ai_text: str) -> dict:
+    db = SessionLocal()
+    try:
+        return _insert_roadmap(req, steps, ai_text, db)
+    finally:
+        db.close()
+
 
+def _insert_roadmap(req: GenerateRequest, steps: List[dict], ai_text: str, db: Session) -> dict:
     roadmap = ProjectRoadmap(
         user_id=req.user_id,
         title=req.title,
@@ -358,9 +383,10 @@ async def project_search(req: SearchRequest, db: Session = Depends(get_db)):
     if req.user_id:
         user_ctx = build_user_context(req.user_id, db, req.language)
 
+    # Static instructions first, user context after them: keeps the prompt prefix cacheable
     system = "Ты AI-ассистент разработчика. Отвечаешь на вопросы используя найденную информацию из интернета и свои знания."
     if user_ctx:
-        system = user_ctx + "\n\n" + system
+        system = system + "\n\n" + user_ctx
 
     prompt = f"""Вопрос: {req.query}
 
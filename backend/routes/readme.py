@@ -1,13 +1,16 @@
 """
 README Generator Route — AI writes a professional README.md for your project
 Endpoints:
-  POST /api/readme/generate  — generate full README from project info
+  POST /api/readme/generate         — generate full README from project info (?async_job=true → job id)
+  POST /api/readme/generate/stream  — same, as Server-Sent Events
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from pydantic import BaseModel
 from typing import List
 from backend.services.openrouter_service import chat_completion, SMART_MODEL
 from backend.services.search_service import web_search, format_search_for_ai
+from backend.services.job_service import register_job, submit_job
+from backend.services.sse_service import stream_llm
 
 router = APIRouter(prefix="/api/readme", tags=["README Generator"])
 
@@ -31,8 +34,31 @@ class ReadmeRequest(BaseModel):
 
 
 @router.post("/generate")
-async def generate_readme(req: ReadmeRequest):
-    """Generate a professional README.md using AI."""
+async def generate_readme(req: ReadmeRequest, async_job: bool = Query(False)):
+    """Generate a professional README.md using AI. async_job=true answers with a job id at once."""
+    if async_job:
+        return await submit_job("readme.generate", req.model_dump())
+    return await _generate_readme(req)
+
+
+@register_job("readme.generate")
+async def _generate_readme_job(payload: dict) -> dict:
+    return await _generate_readme(ReadmeRequest(**payload))
+
+
+@router.post("/generate/stream")
+async def generate_readme_stream(req: ReadmeRequest):
+    """Same README as /generate, streamed as Server-Sent Events."""
+    return stream_llm(await _readme_messages(req), meta={"project_name": req.project_name},
+                      model=SMART_MODEL, max_tokens=3500)
+
+
+async def _generate_readme(req: ReadmeRequest) -> dict:
+    content = await chat_completion(await _readme_messages(req), model=SMART_MODEL, max_tokens=3500)
+    return {"readme": content, "project_name": req.project_name}
+
+
+async def _readme_messages(req: ReadmeRequest) -> list:
     tech_text   = ", ".join(req.tech_stack)   if req.tech_stack   else "not specified"
     team_text   = ", ".join(req.team_members) if req.team_members else "Solo developer"
     feats_text  = "\n".join(f"- {f}" for f in req.features) if req.features else "- See description"
@@ -77,7 +103,4 @@ Output ONLY the raw markdown. Do NOT add any explanation outside the markdown.""
         "You are a professional technical writer specializing in open-source software documentation. "
         "Generate high-quality, GitHub-ready README.md files with proper markdown formatting."
     )
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=3500)
-
-    return {"readme": content, "project_name": req.project_name}
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
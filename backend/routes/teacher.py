@@ -4,6 +4,7 @@ from typing import List, Optional
 from backend.models.database import get_db, Member, LearningSession
 from backend.models.schemas import TeacherRequest, AIResponse
 from backend.services.openrouter_service import chat_completion, get_system_prompt, SMART_MODEL
+from backend.services.sse_service import stream_llm
 
 router = APIRouter(prefix="/api/teacher", tags=["AI Teacher"])
 
@@ -30,9 +31,7 @@ async def get_topics(language: str = "ru"):
     return {"topics": POPULAR_TOPICS.get(language, POPULAR_TOPICS["en"])}
 
 
-@router.post("/explain", response_model=AIResponse)
-async def explain_topic(request: TeacherRequest):
-    """Generate personalized lesson on a topic."""
+def _lesson_messages(request: TeacherRequest) -> list:
     level_map = {
         "beginner": {"ru": "новичка (объясняй простыми словами, без жаргона)", "kz": "жаңадан бастаушы", "en": "beginner (simple words, no jargon)"},
         "mid": {"ru": "среднего уровня (можно использовать технические термины)", "kz": "орта деңгей", "en": "intermediate (can use technical terms)"},
@@ -65,14 +64,26 @@ async def explain_topic(request: TeacherRequest):
 [2-3 следующие темы]{lang_instr}"""
 
     system = get_system_prompt("teacher", request.language)
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=3000)
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+@router.post("/explain", response_model=AIResponse)
+async def explain_topic(request: TeacherRequest):
+    """Generate personalized lesson on a topic."""
+    content = await chat_completion(_lesson_messages(request), model=SMART_MODEL, max_tokens=3000, cache=True)
 
     if request.member_id:
         return AIResponse(success=True, content=content, metadata={"topic": request.topic, "level": request.level})
     return AIResponse(success=True, content=content)
 
 
+@router.post("/explain/stream")
+async def explain_topic_stream(request: TeacherRequest):
+    """Same lesson as /explain, streamed as Server-Sent Events."""
+    meta = {"topic": request.topic, "level": request.level} if request.member_id else None
+    return stream_llm(_lesson_messages(request), meta=meta, model=SMART_MODEL, max_tokens=3000, cache=True)
+
+
 @router.post("/quiz", response_model=AIResponse)
 async def generate_quiz(topic: str, level: str = "beginner", language: str = "ru", num_questions: int = 5):
     """Generate quiz questions on a topic."""
@@ -90,7 +101,7 @@ D) [Вариант]
 
     system = get_system_prompt("teacher", language)
     messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=2000)
+    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=2000, cache=True)
     return AIResponse(success=True, content=content, metadata={"topic": topic, "questions": num_questions})
 
 
@@ -1,41 +1,58 @@
 """Team management — membership, join requests, invitations, settings."""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy import select, delete
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 import secrets
 
 from backend.models.database import (
-    get_db, Team, User, TeamMembership, JoinRequest, TeamInvitation
+    get_async_db, Team, User, TeamMembership, JoinRequest, TeamInvitation
 )
-from backend.routes.auth import get_current_user, require_user
+from backend.routes.auth import get_current_user_async, require_user_async
 
 router = APIRouter(prefix="/api/teams", tags=["teams"])
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 
-def _generate_code(db: Session) -> str:
+async def _generate_code(db: AsyncSession) -> str:
     for _ in range(20):
         code = secrets.token_hex(3).upper()
-        if not db.query(Team).filter(Team.invite_code == code).first():
+        if not (await db.scalars(select(Team.id).where(Team.invite_code == code))).first():
             return code
     return secrets.token_hex(4).upper()
 
-def _get_membership(db: Session, user_id: int, team_id: int) -> Optional[TeamMembership]:
-    return db.query(TeamMembership).filter(
+async def _get_membership(db: AsyncSession, user_id: int, team_id: int) -> Optional[TeamMembership]:
+    return (await db.scalars(select(TeamMembership).options(joinedload(TeamMembership.user)).where(
         TeamMembership.user_id == user_id,
         TeamMembership.team_id == team_id
-    ).first()
+    ))).first()
 
-def _my_team_membership(db: Session, user_id: int) -> Optional[TeamMembership]:
-    return db.query(TeamMembership).filter(
+async def _my_team_membership(db: AsyncSession, user_id: int) -> Optional[TeamMembership]:
+    return (await db.scalars(select(TeamMembership).options(joinedload(TeamMembership.team)).where(
         TeamMembership.user_id == user_id
-    ).first()
-
-def _team_to_dict(team: Team, db: Session, my_user_id: int = None) -> dict:
-    members = db.query(TeamMembership).filter(TeamMembership.team_id == team.id).all()
+    ))).first()
+
+async def _members_by_team(db: AsyncSession, team_ids: List[int]) -> Dict[int, List[TeamMembership]]:
+    """Memberships (with users) of several teams in one query."""
+    by_team: Dict[int, List[TeamMembership]] = {tid: [] for tid in team_ids}
+    if team_ids:
+        rows = await db.scalars(
+            select(TeamMembership).options(joinedload(TeamMembership.user))
+            .where(TeamMembership.team_id.in_(team_ids)).order_by(TeamMembership.id)
+        )
+        for m in rows:
+            by_team[m.team_id].append(m)
+    return by_team
+
+async def _team_dict(db: AsyncSession, team: Team, my_user_id: int = None) -> dict:
+    members = (await _members_by_team(db, [team.id]))[team.id]
+    return _team_to_dict(team, members, my_user_id)
+
+def _team_to_dict(team: Team, members: List[TeamMembership], my_user_id: int = None) -> dict:
     my_role = None
     if my_user_id:
         me = next((m for m in members if m.user_id == my_user_id), None)
@@ -92,40 +109,45 @@ class JoinByCodeReq(BaseModel):
 @router.get("")
 async def list_teams(
     q: str = "",
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_async)
 ):
     """List all teams (with optional search)."""
-    query = db.query(Team)
+    query = select(Team)
     if q:
-        query = query.filter(Team.name.ilike(f"%{q}%"))
-    teams = query.order_by(Team.created_at.desc()).all()
+        query = query.where(Team.name.ilike(f"%{q}%"))
+    teams = (await db.scalars(query.order_by(Team.created_at.desc()))).all()
     uid = current_user.id if current_user else None
-    return [_team_to_dict(t, db, uid) for t in teams]
+    members = await _members_by_team(db, [t.id for t in teams])
+    return [_team_to_dict(t, members[t.id], uid) for t in teams]
 
 
 @router.get("/my-team")
 async def get_my_team(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Get the team the current user belongs to."""
-    m = _my_team_membership(db, current_user.id)
+    m = await _my_team_membership(db, current_user.id)
     if not m:
         return {"team": None, "role": None}
-    return {"team": _team_to_dict(m.team, db, current_user.id), "role": m.role}
+    return {"team": await _team_dict(db, m.team, current_user.id), "role": m.role}
 
 
 @router.get("/my-invitations")
 async def get_my_invitations(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Get all pending invitations for the current user."""
-    invs = db.query(TeamInvitation).filter(
-        TeamInvitation.invitee_id == current_user.id,
-        TeamInvitation.status == "pending"
-    ).all()
+    invs = (await db.scalars(
+        select(TeamInvitation)
+        .options(joinedload(TeamInvitation.team), joinedload(TeamInvitation.inviter))
+        .where(
+            TeamInvitation.invitee_id == current_user.id,
+            TeamInvitation.status == "pending"
+        )
+    )).all()
     return [
         {
             "id": inv.id,
@@ -142,106 +164,106 @@ async def get_my_invitations(
 @router.get("/{team_id}")
 async def get_team(
     team_id: int,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_async)
 ):
-    team = db.query(Team).filter(Team.id == team_id).first()
+    team = await db.get(Team, team_id)
     if not team:
         raise HTTPException(404, "Команда не найдена")
     uid = current_user.id if current_user else None
-    return _team_to_dict(team, db, uid)
+    return await _team_dict(db, team, uid)
 
 
 @router.post("")
 async def create_team(
     req: TeamCreateReq,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Create a new team. Creator becomes the leader."""
     # Check user isn't already in a team
-    existing = _my_team_membership(db, current_user.id)
+    existing = await _my_team_membership(db, current_user.id)
     if existing:
         raise HTTPException(400, "Ты уже состоишь в команде. Выйди из неё перед созданием новой.")
     # Check name uniqueness
-    if db.query(Team).filter(Team.name == req.name).first():
+    if (await db.scalars(select(Team.id).where(Team.name == req.name))).first():
         raise HTTPException(400, f"Команда с именем «{req.name}» уже существует")
     team = Team(
         name=req.name,
         hackathon_theme=req.hackathon_theme,
-        invite_code=_generate_code(db),
+        invite_code=await _generate_code(db),
     )
     db.add(team)
-    db.flush()
+    await db.flush()
     membership = TeamMembership(team_id=team.id, user_id=current_user.id, role="leader")
     db.add(membership)
-    db.commit()
-    db.refresh(team)
-    return _team_to_dict(team, db, current_user.id)
+    await db.commit()
+    return await _team_dict(db, team, current_user.id)
 
 
 @router.post("/join-by-code")
 async def join_by_code(
     req: JoinByCodeReq,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Instantly join a team using its invite code."""
-    existing = _my_team_membership(db, current_user.id)
+    existing = await _my_team_membership(db, current_user.id)
     if existing:
         raise HTTPException(400, "Ты уже состоишь в команде")
-    team = db.query(Team).filter(Team.invite_code == req.code.strip().upper()).first()
+    team = (await db.scalars(select(Team).where(Team.invite_code == req.code.strip().upper()))).first()
     if not team:
         raise HTTPException(404, "Неверный код приглашения")
     m = TeamMembership(team_id=team.id, user_id=current_user.id, role="member")
     db.add(m)
-    db.commit()
-    db.refresh(team)
-    return {"ok": True, "team": _team_to_dict(team, db, current_user.id)}
+    await db.commit()
+    return {"ok": True, "team": await _team_dict(db, team, current_user.id)}
 
 
 @router.post("/{team_id}/join-request")
 async def send_join_request(
     team_id: int,
     req: JoinRequestReq,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Send a join request to a team."""
-    existing_m = _my_team_membership(db, current_user.id)
+    existing_m = await _my_team_membership(db, current_user.id)
     if existing_m:
         raise HTTPException(400, "Ты уже состоишь в команде")
-    team = db.query(Team).filter(Team.id == team_id).first()
+    team = await db.get(Team, team_id)
     if not team:
         raise HTTPException(404, "Команда не найдена")
     # Check no duplicate pending request
-    dup = db.query(JoinRequest).filter(
+    dup = (await db.scalars(select(JoinRequest.id).where(
         JoinRequest.team_id == team_id,
         JoinRequest.user_id == current_user.id,
         JoinRequest.status == "pending"
-    ).first()
+    ))).first()
     if dup:
         raise HTTPException(400, "Ты уже отправил заявку в эту команду")
     jr = JoinRequest(team_id=team_id, user_id=current_user.id, message=req.message)
     db.add(jr)
-    db.commit()
+    await db.commit()
     return {"ok": True, "message": "Заявка отправлена! Ожидай подтверждения лидера."}
 
 
 @router.get("/{team_id}/join-requests")
 async def get_join_requests(
     team_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Get all pending join requests for a team (leader only)."""
-    m = _get_membership(db, current_user.id, team_id)
+    m = await _get_membership(db, current_user.id, team_id)
     if not m or m.role != "leader":
         raise HTTPException(403, "Только лидер команды может смотреть заявки")
-    requests = db.query(JoinRequest).filter(
-        JoinRequest.team_id == team_id,
-        JoinRequest.status == "pending"
-    ).order_by(JoinRequest.created_at).all()
+    requests = (await db.scalars(
+        select(JoinRequest).options(joinedload(JoinRequest.user)).where(
+            JoinRequest.team_id == team_id,
+            JoinRequest.status == "pending"
+        ).order_by(JoinRequest.created_at)
+    )).all()
     return [
         {
             "id": r.id,
@@ -260,14 +282,14 @@ async def get_join_requests(
 async def respond_join_request(
     req_id: int,
     body: RespondReq,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Accept or reject a join request (leader only)."""
-    jr = db.query(JoinRequest).filter(JoinRequest.id == req_id).first()
+    jr = await db.get(JoinRequest, req_id)
     if not jr:
         raise HTTPException(404, "Заявка не найдена")
-    m = _get_membership(db, current_user.id, jr.team_id)
+    m = await _get_membership(db, current_user.id, jr.team_id)
     if not m or m.role != "leader":
         raise HTTPException(403, "Только лидер может отвечать на заявки")
     if jr.status != "pending":
@@ -275,10 +297,10 @@ async def respond_join_request(
     action = body.action.lower()
     if action == "accept":
         # Check requestor not already in a team
-        existing = _my_team_membership(db, jr.user_id)
+        existing = await _my_team_membership(db, jr.user_id)
         if existing:
             jr.status = "rejected"
-            db.commit()
+            await db.commit()
             return {"ok": False, "message": "Пользователь уже в другой команде"}
         jr.status = "accepted"
         new_m = TeamMembership(team_id=jr.team_id, user_id=jr.user_id, role="member")
@@ -287,7 +309,7 @@ async def respond_join_request(
         jr.status = "rejected"
     else:
         raise HTTPException(400, "action должен быть 'accept' или 'reject'")
-    db.commit()
+    await db.commit()
     return {"ok": True, "action": action}
 
 
@@ -295,27 +317,27 @@ async def respond_join_request(
 async def invite_user(
     team_id: int,
     req: InviteReq,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Invite a user by username (leader only)."""
-    m = _get_membership(db, current_user.id, team_id)
+    m = await _get_membership(db, current_user.id, team_id)
     if not m or m.role != "leader":
         raise HTTPException(403, "Только лидер может приглашать участников")
-    invitee = db.query(User).filter(User.username == req.username.strip()).first()
+    invitee = (await db.scalars(select(User).where(User.username == req.username.strip()))).first()
     if not invitee:
         raise HTTPException(404, f"Пользователь «{req.username}» не найден")
     if invitee.id == current_user.id:
         raise HTTPException(400, "Нельзя пригласить себя")
     # Check already a member
-    if _get_membership(db, invitee.id, team_id):
+    if await _get_membership(db, invitee.id, team_id):
         raise HTTPException(400, f"«{req.username}» уже в этой команде")
     # Check duplicate pending invite
-    dup = db.query(TeamInvitation).filter(
+    dup = (await db.scalars(select(TeamInvitation.id).where(
         TeamInvitation.team_id == team_id,
         TeamInvitation.invitee_id == invitee.id,
         TeamInvitation.status == "pending"
-    ).first()
+    ))).first()
     if dup:
         raise HTTPException(400, f"Приглашение «{req.username}» уже отправлено")
     inv = TeamInvitation(
@@ -325,7 +347,7 @@ async def invite_user(
         message=req.message,
     )
     db.add(inv)
-    db.commit()
+    await db.commit()
     return {"ok": True, "message": f"Приглашение отправлено пользователю «{req.username}»"}
 
 
@@ -333,24 +355,24 @@ async def invite_user(
 async def respond_invitation(
     inv_id: int,
     body: RespondReq,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Accept or decline an invitation."""
-    inv = db.query(TeamInvitation).filter(
+    inv = (await db.scalars(select(TeamInvitation).where(
         TeamInvitation.id == inv_id,
         TeamInvitation.invitee_id == current_user.id
-    ).first()
+    ))).first()
     if not inv:
         raise HTTPException(404, "Приглашение не найдено")
     if inv.status != "pending":
         raise HTTPException(400, "Приглашение уже обработано")
     action = body.action.lower()
     if action == "accept":
-        existing = _my_team_membership(db, current_user.id)
+        existing = await _my_team_membership(db, current_user.id)
         if existing:
             inv.status = "declined"
-            db.commit()
+            await db.commit()
             return {"ok": False, "message": "Ты уже в другой команде"}
         inv.status = "accepted"
         new_m = TeamMembership(team_id=inv.team_id, user_id=current_user.id, role="member")
@@ -359,7 +381,7 @@ async def respond_invitation(
         inv.status = "declined"
     else:
         raise HTTPException(400, "action должен быть 'accept' или 'decline'")
-    db.commit()
+    await db.commit()
     return {"ok": True, "action": action}
 
 
@@ -367,43 +389,42 @@ async def respond_invitation(
 async def update_team_settings(
     team_id: int,
     req: TeamSettingsReq,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Update team name, theme, etc. (leader only)."""
-    m = _get_membership(db, current_user.id, team_id)
+    m = await _get_membership(db, current_user.id, team_id)
     if not m or m.role != "leader":
         raise HTTPException(403, "Только лидер может изменять настройки команды")
-    team = db.query(Team).filter(Team.id == team_id).first()
+    team = await db.get(Team, team_id)
     if not team:
         raise HTTPException(404, "Команда не найдена")
     if req.name and req.name != team.name:
-        dup = db.query(Team).filter(Team.name == req.name).first()
+        dup = (await db.scalars(select(Team.id).where(Team.name == req.name))).first()
         if dup:
             raise HTTPException(400, f"Название «{req.name}» уже занято")
         team.name = req.name
     if req.hackathon_theme is not None:
         team.hackathon_theme = req.hackathon_theme
-    db.commit()
-    db.refresh(team)
-    return _team_to_dict(team, db, current_user.id)
+    await db.commit()
+    return await _team_dict(db, team, current_user.id)
 
 
 @router.post("/{team_id}/regenerate-code")
 async def regenerate_invite_code(
     team_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Generate a new invite code (leader only)."""
-    m = _get_membership(db, current_user.id, team_id)
+    m = await _get_membership(db, current_user.id, team_id)
     if not m or m.role != "leader":
         raise HTTPException(403, "Только лидер может обновлять код")
-    team = db.query(Team).filter(Team.id == team_id).first()
+    team = await db.get(Team, team_id)
     if not team:
         raise HTTPException(404, "Команда не найдена")
-    team.invite_code = _generate_code(db)
-    db.commit()
+    team.invite_code = await _generate_code(db)
+    await db.commit()
     return {"ok": True, "invite_code": team.invite_code}
 
 
@@ -411,54 +432,56 @@ async def regenerate_invite_code(
 async def remove_member(
     team_id: int,
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Kick a member from the team (leader only, can't kick self)."""
-    m = _get_membership(db, current_user.id, team_id)
+    m = await _get_membership(db, current_user.id, team_id)
     if not m or m.role != "leader":
         raise HTTPException(403, "Только лидер может удалять участников")
     if user_id == current_user.id:
         raise HTTPException(400, "Лидер не может исключить сам себя. Используй 'Покинуть команду'.")
-    target = _get_membership(db, user_id, team_id)
+    target = await _get_membership(db, user_id, team_id)
     if not target:
         raise HTTPException(404, "Участник не найден в команде")
-    db.delete(target)
-    db.commit()
+    await db.delete(target)
+    await db.commit()
     return {"ok": True}
 
 
 @router.post("/{team_id}/leave")
 async def leave_team(
     team_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Leave a team. If leader and there are other members, leadership transfers."""
-    m = _get_membership(db, current_user.id, team_id)
+    m = await _get_membership(db, current_user.id, team_id)
     if not m:
         raise HTTPException(400, "Ты не состоишь в этой команде")
     if m.role == "leader":
         # Transfer leadership to next member, or disband if alone
-        others = db.query(TeamMembership).filter(
+        others = (await db.scalars(select(TeamMembership).options(joinedload(TeamMembership.user)).where(
             TeamMembership.team_id == team_id,
             TeamMembership.user_id != current_user.id
-        ).all()
+        ))).all()
         if others:
             others[0].role = "leader"
-            db.delete(m)
-            db.commit()
+            await db.delete(m)
+            await db.commit()
             return {"ok": True, "message": f"Лидерство передано «{others[0].user.username}»"}
         else:
-            # Disband team
-            db.delete(m)
-            team = db.query(Team).filter(Team.id == team_id).first()
+            # Disband team (its requests and invitations go too; PostgreSQL enforces the foreign keys)
+            await db.delete(m)
+            await db.execute(delete(JoinRequest).where(JoinRequest.team_id == team_id))
+            await db.execute(delete(TeamInvitation).where(TeamInvitation.team_id == team_id))
+            team = await db.get(Team, team_id)
             if team:
-                db.delete(team)
-            db.commit()
+                await db.delete(team)
+            await db.commit()
             return {"ok": True, "message": "Команда расформирована (ты был единственным участником)"}
-    db.delete(m)
-    db.commit()
+    await db.delete(m)
+    await db.commit()
     return {"ok": True, "message": "Ты покинул команду"}
 
 
@@ -466,17 +489,17 @@ async def leave_team(
 async def transfer_leadership(
     team_id: int,
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_user_async)
 ):
     """Transfer leadership to another member."""
-    m = _get_membership(db, current_user.id, team_id)
+    m = await _get_membership(db, current_user.id, team_id)
     if not m or m.role != "leader":
         raise HTTPException(403, "Только лидер может передать права")
-    target = _get_membership(db, user_id, team_id)
+    target = await _get_membership(db, user_id, team_id)
     if not target:
         raise HTTPException(404, "Участник не найден в команде")
     m.role = "member"
     target.role = "leader"
-    db.commit()
+    await db.commit()
     return {"ok": True, "message": f"Лидерство передано «{target.user.username}»"}
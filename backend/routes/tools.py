@@ -1,18 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from backend.models.database import get_db, IdeaLog
-from backend.models.schemas import IdeaGeneratorRequest, CodeReviewRequest, PitchRequest, AIResponse
+from backend.models.database import get_db, SessionLocal, IdeaLog
+from backend.models.schemas import IdeaGeneratorRequest, CodeReviewRequest, PitchRequest, AIResponse, JobResponse
 from backend.services.openrouter_service import chat_completion, get_system_prompt, SMART_MODEL
+from backend.services.job_service import register_job, submit_job
+from backend.services.sse_service import stream_llm
+from backend.services.llm_scheduler import DEFAULT_PRIORITY
 import httpx
 import base64
+from typing import Union
 
 router = APIRouter(prefix="/api/tools", tags=["AI Tools"])
 
 
 # ─── IDEA GENERATOR ────────────────────────────────────────────────────────────
-@router.post("/generate-ideas", response_model=AIResponse)
-async def generate_ideas(request: IdeaGeneratorRequest, db: Session = Depends(get_db)):
-    """Generate hackathon project ideas."""
+def _ideas_messages(request: IdeaGeneratorRequest) -> list:
     constraints_text = f"\nОграничения: {request.constraints}" if request.constraints else ""
     prompt = f"""Тема хакатона: {request.theme}{constraints_text}
 
@@ -27,20 +29,40 @@ async def generate_ideas(request: IdeaGeneratorRequest, db: Session = Depends(ge
 **Сложность:** ⭐⭐⭐☆☆ (1-5)"""
 
     system = get_system_prompt("idea_generator", request.language)
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=3000)
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
 
-    # Save to DB
-    idea_log = IdeaLog(team_id=request.team_id, theme=request.theme, ideas=[content])
-    db.add(idea_log)
+
+def _log_ideas(db: Session, request: IdeaGeneratorRequest, content: str):
+    db.add(IdeaLog(team_id=request.team_id, theme=request.theme, ideas=[content]))
     db.commit()
 
+
+@router.post("/generate-ideas", response_model=AIResponse)
+async def generate_ideas(request: IdeaGeneratorRequest, db: Session = Depends(get_db)):
+    """Generate hackathon project ideas."""
+    content = await chat_completion(_ideas_messages(request), model=SMART_MODEL, max_tokens=3000, hedge=True)
+
+    # Save to DB
+    _log_ideas(db, request, content)
+
     return AIResponse(success=True, content=content, metadata={"theme": request.theme})
 
 
-@router.post("/validate-idea", response_model=AIResponse)
-async def validate_idea(idea: str, team_skills: str, language: str = "ru"):
-    """Validate hackathon idea feasibility."""
+@router.post("/generate-ideas/stream")
+async def generate_ideas_stream(request: IdeaGeneratorRequest):
+    """Same as /generate-ideas, streamed as Server-Sent Events; the ideas are logged once complete."""
+    def save(content: str):
+        db = SessionLocal()   # the request's session is already closed while the body streams
+        try:
+            _log_ideas(db, request, content)
+        finally:
+            db.close()
+
+    return stream_llm(_ideas_messages(request), on_complete=save, meta={"theme": request.theme},
+                      model=SMART_MODEL, max_tokens=3000)
+
+
+def _validate_idea_messages(idea: str, team_skills: str, language: str) -> list:
     prompt = f"""Оцени идею для хакатона:
 
 **Идея:** {idea}
@@ -59,15 +81,23 @@ async def validate_idea(idea: str, team_skills: str, language: str = "ru"):
 **Рекомендации по доработке:** ..."""
 
     system = get_system_prompt("idea_generator", language)
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL)
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+@router.post("/validate-idea", response_model=AIResponse)
+async def validate_idea(idea: str, team_skills: str, language: str = "ru"):
+    """Validate hackathon idea feasibility."""
+    content = await chat_completion(_validate_idea_messages(idea, team_skills, language), model=SMART_MODEL)
     return AIResponse(success=True, content=content)
 
 
+@router.post("/validate-idea/stream")
+async def validate_idea_stream(idea: str, team_skills: str, language: str = "ru"):
+    return stream_llm(_validate_idea_messages(idea, team_skills, language), model=SMART_MODEL)
+
+
 # ─── CODE REVIEWER ─────────────────────────────────────────────────────────────
-@router.post("/code-review", response_model=AIResponse)
-async def code_review(request: CodeReviewRequest):
-    """AI code review."""
+def _code_review_messages(request: CodeReviewRequest) -> list:
     context_text = f"\nКонтекст: {request.context}" if request.context else ""
     prompt = f"""Сделай code review:{context_text}
 
@@ -93,15 +123,23 @@ async def code_review(request: CodeReviewRequest):
 - ..."""
 
     system = get_system_prompt("code_reviewer", request.review_lang)
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=3000)
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+@router.post("/code-review", response_model=AIResponse)
+async def code_review(request: CodeReviewRequest):
+    """AI code review."""
+    content = await chat_completion(_code_review_messages(request), model=SMART_MODEL, max_tokens=3000)
     return AIResponse(success=True, content=content)
 
 
+@router.post("/code-review/stream")
+async def code_review_stream(request: CodeReviewRequest):
+    return stream_llm(_code_review_messages(request), model=SMART_MODEL, max_tokens=3000)
+
+
 # ─── PITCH HELPER ──────────────────────────────────────────────────────────────
-@router.post("/build-pitch", response_model=AIResponse)
-async def build_pitch(request: PitchRequest):
-    """Generate a compelling hackathon pitch."""
+def _pitch_messages(request: PitchRequest) -> list:
     prompt = f"""Создай убедительный питч для хакатона:
 
 **Название проекта:** {request.project_name}
@@ -132,22 +170,29 @@ async def build_pitch(request: PitchRequest):
 ## ❓ Топ-5 вопросов жюри и ответы на них:"""
 
     system = get_system_prompt("pitch_helper", request.language)
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=3000)
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+@router.post("/build-pitch", response_model=AIResponse)
+async def build_pitch(request: PitchRequest):
+    """Generate a compelling hackathon pitch."""
+    content = await chat_completion(_pitch_messages(request), model=SMART_MODEL, max_tokens=3000)
     return AIResponse(success=True, content=content)
 
 
+@router.post("/build-pitch/stream")
+async def build_pitch_stream(request: PitchRequest):
+    return stream_llm(_pitch_messages(request), model=SMART_MODEL, max_tokens=3000)
+
+
 # ─── PROGRESS TRACKER ──────────────────────────────────────────────────────────
-@router.post("/analyze-progress", response_model=AIResponse)
-async def analyze_progress(
-    completed_tasks: int,
-    total_tasks: int,
-    remaining_hours: float,
-    blockers: str = "",
-    language: str = "ru",
-):
-    """Analyze team progress and suggest adjustments."""
-    progress_pct = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+def _progress_pct(completed_tasks: int, total_tasks: int) -> float:
+    return (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+
+
+def _progress_messages(completed_tasks: int, total_tasks: int, remaining_hours: float,
+                       blockers: str, language: str) -> list:
+    progress_pct = _progress_pct(completed_tasks, total_tasks)
     prompt = f"""Анализ прогресса команды:
 - Выполнено задач: {completed_tasks}/{total_tasks} ({progress_pct:.0f}%)
 - Оставшееся время: {remaining_hours} часов
@@ -160,21 +205,39 @@ async def analyze_progress(
 4. Конкретные действия на следующий час"""
 
     system = get_system_prompt("hackathon_helper", language)
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+@router.post("/analyze-progress", response_model=AIResponse)
+async def analyze_progress(
+    completed_tasks: int,
+    total_tasks: int,
+    remaining_hours: float,
+    blockers: str = "",
+    language: str = "ru",
+):
+    """Analyze team progress and suggest adjustments."""
+    messages = _progress_messages(completed_tasks, total_tasks, remaining_hours, blockers, language)
     content = await chat_completion(messages)
-    return AIResponse(success=True, content=content, metadata={"progress_pct": progress_pct})
+    return AIResponse(success=True, content=content,
+                      metadata={"progress_pct": _progress_pct(completed_tasks, total_tasks)})
 
 
-# ─── TECH STACK ADVISOR ────────────────────────────────────────────────────────
-@router.post("/tech-stack", response_model=AIResponse)
-async def tech_stack_advisor(
-    description: str,
-    time_hours: int = 24,
-    team_size: int = 3,
-    team_skills: str = "",
+@router.post("/analyze-progress/stream")
+async def analyze_progress_stream(
+    completed_tasks: int,
+    total_tasks: int,
+    remaining_hours: float,
+    blockers: str = "",
     language: str = "ru",
 ):
-    """Recommend optimal hackathon tech stack based on project and constraints."""
+    messages = _progress_messages(completed_tasks, total_tasks, remaining_hours, blockers, language)
+    return stream_llm(messages, meta={"progress_pct": _progress_pct(completed_tasks, total_tasks)})
+
+
+# ─── TECH STACK ADVISOR ────────────────────────────────────────────────────────
+def _tech_stack_messages(description: str, time_hours: int, team_size: int, team_skills: str,
+                         language: str) -> list:
     prompt = f"""Посоветуй оптимальный технологический стек для хакатона:
 
 **Описание проекта:** {description}
@@ -210,13 +273,37 @@ async def tech_stack_advisor(
 **Итоговый стек (одна строка):** `Frontend + Backend + DB + AI + Deploy`"""
 
     system = get_system_prompt("hackathon_helper", language)
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+@router.post("/tech-stack", response_model=AIResponse)
+async def tech_stack_advisor(
+    description: str,
+    time_hours: int = 24,
+    team_size: int = 3,
+    team_skills: str = "",
+    language: str = "ru",
+):
+    """Recommend optimal hackathon tech stack based on project and constraints."""
+    messages = _tech_stack_messages(description, time_hours, team_size, team_skills, language)
     content = await chat_completion(messages, model=SMART_MODEL, max_tokens=2000)
     return AIResponse(success=True, content=content)
 
 
+@router.post("/tech-stack/stream")
+async def tech_stack_advisor_stream(
+    description: str,
+    time_hours: int = 24,
+    team_size: int = 3,
+    team_skills: str = "",
+    language: str = "ru",
+):
+    messages = _tech_stack_messages(description, time_hours, team_size, team_skills, language)
+    return stream_llm(messages, model=SMART_MODEL, max_tokens=2000)
+
+
 # ─── POST-HACKATHON REPORT ──────────────────────────────────────────────────────
-@router.post("/hackathon-report", response_model=AIResponse)
+@router.post("/hackathon-report", response_model=Union[AIResponse, JobResponse])
 async def hackathon_report(
     project_name: str,
     what_was_done: str,
@@ -225,8 +312,48 @@ async def hackathon_report(
     challenges: str = "",
     tech_stack: str = "",
     language: str = "ru",
+    async_job: bool = Query(False),
+):
+    """
+    Generate a professional post-hackathon report for portfolio/LinkedIn.
+    async_job=true answers with the job at once (poll /api/jobs/{job_id}).
+    """
+    params = dict(project_name=project_name, what_was_done=what_was_done, duration_hours=duration_hours,
+                  team_names=team_names, challenges=challenges, tech_stack=tech_stack, language=language)
+    if async_job:
+        return await submit_job("tools.hackathon_report", params)
+    return AIResponse(success=True, content=await _hackathon_report(params))
+
+
+@router.post("/hackathon-report/stream")
+async def hackathon_report_stream(
+    project_name: str,
+    what_was_done: str,
+    duration_hours: int = 24,
+    team_names: str = "",
+    challenges: str = "",
+    tech_stack: str = "",
+    language: str = "ru",
 ):
-    """Generate a professional post-hackathon report for portfolio/LinkedIn."""
+    """Same report as /hackathon-report, streamed as Server-Sent Events."""
+    messages = _hackathon_report_messages(project_name, what_was_done, duration_hours, team_names,
+                                          challenges, tech_stack, language)
+    return stream_llm(messages, model=SMART_MODEL, max_tokens=3000)
+
+
+@register_job("tools.hackathon_report")
+async def _hackathon_report_job(payload: dict) -> dict:
+    return AIResponse(success=True, content=await _hackathon_report(payload, priority="background")).model_dump()
+
+
+async def _hackathon_report(params: dict, priority: str = DEFAULT_PRIORITY) -> str:
+    """Report text; the job path runs in the background lane, a waiting HTTP caller in the stream's lane."""
+    messages = _hackathon_report_messages(**params)
+    return await chat_completion(messages, model=SMART_MODEL, max_tokens=3000, priority=priority)
+
+
+def _hackathon_report_messages(project_name: str, what_was_done: str, duration_hours: int, team_names: str,
+                               challenges: str, tech_stack: str, language: str) -> list:
     prompt = f"""Создай профессиональный итоговый отчёт хакатона для портфолио:
 
 **Проект:** {project_name}
@@ -268,9 +395,7 @@ async def hackathon_report(
 _Отчёт готов для размещения на GitHub, LinkedIn или в резюме_"""
 
     system = get_system_prompt("hackathon_helper", language)
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=3000)
-    return AIResponse(success=True, content=content)
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
 
 
 # ─── GITHUB REPO AUTO-CREATE ────────────────────────────────────────────────────
@@ -370,9 +495,7 @@ cd {repo_name}
     return AIResponse(success=True, content=result, metadata={"repo_url": repo_url})
 
 
-@router.post("/project-names", response_model=AIResponse)
-async def project_names(keywords: str, language: str = "ru"):
-    """Generate 10 creative project names based on a few keywords."""
+def _project_names_messages(keywords: str, language: str) -> list:
     prompt = f"""Придумай 10 крутых названий для хакатонного проекта.
 
 Ключевые слова / идея: {keywords}
@@ -388,20 +511,22 @@ async def project_names(keywords: str, language: str = "ru"):
 - Годится для хакатона и будущего стартапа
 - В конце — ⭐ Топ-3 рекомендации с обоснованием"""
     system = get_system_prompt("hackathon_helper", language)
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
-    content = await chat_completion(messages, model=SMART_MODEL, max_tokens=2000)
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+@router.post("/project-names", response_model=AIResponse)
+async def project_names(keywords: str, language: str = "ru"):
+    """Generate 10 creative project names based on a few keywords."""
+    content = await chat_completion(_project_names_messages(keywords, language), model=SMART_MODEL, max_tokens=2000)
     return AIResponse(success=True, content=content)
 
 
-@router.post("/slide-deck", response_model=AIResponse)
-async def slide_deck(
-    project_name: str,
-    problem: str,
-    solution: str = "",
-    tech_stack: str = "",
-    language: str = "ru"
-):
-    """Generate a full pitch deck structure with talking points."""
+@router.post("/project-names/stream")
+async def project_names_stream(keywords: str, language: str = "ru"):
+    return stream_llm(_project_names_messages(keywords, language), model=SMART_MODEL, max_tokens=2000)
+
+
+def _slide_deck_messages(project_name: str, problem: str, solution: str, tech_stack: str, language: str) -> list:
     prompt = f"""Создай профессиональную структуру питч-дека для хакатона (10–12 слайдов).
 
 Проект: {project_name}
@@ -419,6 +544,30 @@ async def slide_deck(
 
 В конце: ⚡ Советы по питчу и что выделит вас среди других команд."""
     system = get_system_prompt("hackathon_helper", language)
-    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+@router.post("/slide-deck", response_model=AIResponse)
+async def slide_deck(
+    project_name: str,
+    problem: str,
+    solution: str = "",
+    tech_stack: str = "",
+    language: str = "ru"
+):
+    """Generate a full pitch deck structure with talking points."""
+    messages = _slide_deck_messages(project_name, problem, solution, tech_stack, language)
     content = await chat_completion(messages, model=SMART_MODEL, max_tokens=3000)
     return AIResponse(success=True, content=content)
+
+
+@router.post("/slide-deck/stream")
+async def slide_deck_stream(
+    project_name: str,
+    problem: str,
+    solution: str = "",
+    tech_stack: str = "",
+    language: str = "ru"
+):
+    messages = _slide_deck_messages(project_name, problem, solution, tech_stack, language)
+    return stream_llm(messages, model=SMART_MODEL, max_tokens=3000)
@@ -3,11 +3,13 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from backend.models.database import get_db, Tournament, Project, ProjectMember, Vote, User, Badge, UserBadge, XPLog
+from backend.models import queries
 from backend.routes.auth import get_current_user, require_user, award_xp, award_badge, seed_badges
-from backend.services.openrouter_service import chat_completion, get_system_prompt
+from backend.services.openrouter_service import chat_completion, get_system_prompt, SMART_MODEL
+from backend.services.structured_output import chat_completion_json
 
 router = APIRouter(prefix="/api/tournament", tags=["tournament"])
 
@@ -52,6 +54,11 @@ class VoteCreate(BaseModel):
     comment: Optional[str] = None
     category: str = "overall"
 
+class ProjectReview(BaseModel):
+    """AI jury verdict on a submitted project (structured LLM output)."""
+    score: float = Field(ge=1, le=10)
+    feedback: str
+
 # ── Helpers ───────────────────────────────────────────────────────────────────
 def tournament_dict(t: Tournament) -> dict:
     return {
@@ -237,16 +244,13 @@ async def submit_project(pid: int, current_user: User = Depends(require_user), d
 Решение: {p.solution or '-'}
 Стек: {', '.join(p.tech_stack or [])}
 
-Ответь в формате:
-SCORE: X
-FEEDBACK: текст"""
+Ответь JSON: {{"score": X, "feedback": "текст"}}"""
     try:
-        resp = await chat_completion([{"role": "user", "content": prompt}], model_type="smart")
-        lines = resp.strip().split("\n")
-        score_line = next((l for l in lines if l.startswith("SCORE:")), "SCORE: 7")
-        feedback_line = "\n".join(l for l in lines if l.startswith("FEEDBACK:") or (not l.startswith("SCORE:")))
-        p.ai_score = float(score_line.replace("SCORE:", "").strip())
-        p.ai_feedback = feedback_line.replace("FEEDBACK:", "").strip()
+        review = await chat_completion_json([{"role": "user", "content": prompt}], ProjectReview,
+                                            call_site="tournament.submit_project", model=SMART_MODEL,
+                                            max_tokens=1500)
+        p.ai_score = review.score
+        p.ai_feedback = review.feedback.strip()
     except Exception:
         p.ai_score = 7.0
         p.ai_feedback = "AI оценка недоступна"
@@ -277,7 +281,7 @@ async def vote_project(pid: int, req: VoteCreate, current_user: User = Depends(r
     # Can't vote own project
     if any(m.user_id == current_user.id for m in p.members):
         raise HTTPException(400, "Нельзя голосовать за свой проект")
-    existing = db.query(Vote).filter(Vote.project_id == pid, Vote.user_id == current_user.id, Vote.category == req.category).first()
+    existing = db.scalars(queries.user_vote(pid, current_user.id, req.category)).first()
     if existing:
         existing.score = req.score
         existing.comment = req.comment
@@ -285,7 +289,7 @@ async def vote_project(pid: int, req: VoteCreate, current_user: User = Depends(r
         v = Vote(project_id=pid, user_id=current_user.id, score=req.score, comment=req.comment, category=req.category)
         db.add(v)
     # Update vote count
-    p.vote_count = db.query(Vote).filter(Vote.project_id == pid).count() + 1
+    p.vote_count = db.scalar(queries.project_vote_count(pid)) + 1
     db.commit()
     seed_badges(db)
     award_badge(db, current_user, "voter")
@@ -295,7 +299,7 @@ async def vote_project(pid: int, req: VoteCreate, current_user: User = Depends(r
 
 @router.get("/projects/{pid}/votes")
 async def get_votes(pid: int, db: Session = Depends(get_db)):
-    votes = db.query(Vote).filter(Vote.project_id == pid).all()
+    votes = db.scalars(queries.project_votes(pid)).all()
     if not votes:
         return {"count": 0, "avg": 0, "votes": []}
     avg = sum(v.score for v in votes) / len(votes)
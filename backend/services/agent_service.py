@@ -2,10 +2,15 @@
 Multi-Agent System for AkylTeam
 Agents: TeamLead, Motivator, Critic, Planner, TechGuru
 They communicate in the group chat to provide diverse feedback.
+A discussion is a dependency graph (DISCUSSION_GRAPH): agents that need no
+one else's opinion run concurrently, Critic and Planner start once their
+inputs are in.
 """
 import asyncio
-from typing import List, Dict
+from typing import AsyncGenerator, Awaitable, Callable, List, Dict, Optional, Set
 from backend.services.openrouter_service import chat_completion, FAST_MODEL, DEFAULT_MODEL
+from backend.services.token_budget import fit_messages
+from backend.config import LLM_AGENT_PROMPT_BUDGET
 
 AGENTS = {
     "TeamLead": {
@@ -66,6 +71,16 @@ AGENTS = {
 }
 
 
+# Agent → agents whose answers it reads before speaking
+DISCUSSION_GRAPH = {
+    "TeamLead": [],
+    "TechGuru": [],
+    "Motivator": [],
+    "Critic": ["TeamLead", "TechGuru"],
+    "Planner": ["TeamLead", "TechGuru", "Critic"],
+}
+
+
 async def run_agent(
     agent_name: str,
     context: str,
@@ -82,7 +97,8 @@ async def run_agent(
         messages.extend(previous_messages[-4:])  # last 4 messages for context
 
     messages.append({"role": "user", "content": context})
-    
+    messages = fit_messages(messages, FAST_MODEL, 300, cap=LLM_AGENT_PROMPT_BUDGET)
+
     try:
         response = await chat_completion(messages, model=FAST_MODEL, max_tokens=300)
         return response
@@ -90,60 +106,125 @@ async def run_agent(
         return f"[Ошибка агента: {str(e)}]"
 
 
-async def multi_agent_discussion(
+def _discussion_context(topic: str, inputs: List[Dict[str, str]]) -> str:
+    context = f"Тема обсуждения: {topic}\n"
+    if inputs:
+        context += "\nПредыдущие мнения коллег:\n"
+        for prev in inputs:
+            context += f"- {prev['emoji']} {prev['agent']}: {prev['content'][:200]}\n"
+    return context
+
+
+async def iter_agent_discussion(
     topic: str,
     language: str = "ru",
     agents_to_use: List[str] = None,
-) -> List[Dict[str, str]]:
-    """Run a multi-agent discussion on a topic."""
+) -> AsyncGenerator[Dict[str, str], None]:
+    """
+    Run the discussion graph and yield each agent's entry as soon as it finishes.
+    Dependencies on agents that are not taking part are dropped.
+    """
     if agents_to_use is None:
         agents_to_use = list(AGENTS.keys())
+    deps = {name: [d for d in DISCUSSION_GRAPH.get(name, []) if d in agents_to_use] for name in agents_to_use}
 
-    responses = []
-    discussion_history = []
+    results: Dict[str, Dict[str, str]] = {}
+    ready = {name: asyncio.Event() for name in agents_to_use}
+    finished: asyncio.Queue = asyncio.Queue()
 
-    for agent_name in agents_to_use:
+    async def speak(agent_name: str):
+        for dep in deps[agent_name]:
+            await ready[dep].wait()
         agent = AGENTS[agent_name]
-        role_key = f"role_{language}" if f"role_{language}" in agent else "role_en"
-        role = agent.get(f"role_{language}", agent["role_en"])
-
-        context = f"Тема обсуждения: {topic}\n"
-        if discussion_history:
-            context += "\nПредыдущие мнения коллег:\n"
-            for prev in discussion_history:
-                context += f"- {prev['agent']}: {prev['content'][:200]}\n"
-
-        response = await run_agent(agent_name, context, language, [])
-        
-        entry = {
+        inputs = [results[dep] for dep in deps[agent_name]]
+        response = await run_agent(agent_name, _discussion_context(topic, inputs), language, [])
+        results[agent_name] = {
             "agent": agent_name,
             "emoji": agent["emoji"],
-            "role": role,
+            "role": agent.get(f"role_{language}", agent["role_en"]),
             "content": response,
+            "depends_on": deps[agent_name],
         }
-        responses.append(entry)
-        discussion_history.append({"agent": f"{agent['emoji']} {agent_name}", "content": response})
+        ready[agent_name].set()
+        await finished.put(results[agent_name])
 
-    return responses
+    tasks = [asyncio.create_task(speak(name)) for name in agents_to_use]
+    try:
+        for _ in tasks:
+            yield await finished.get()
+    finally:
+        for task in tasks:
+            task.cancel()  # client went away — stop the agents still waiting or talking
+
+
+async def multi_agent_discussion(
+    topic: str,
+    language: str = "ru",
+    agents_to_use: List[str] = None,
+) -> List[Dict[str, str]]:
+    """Run a multi-agent discussion on a topic (answers in agents_to_use order)."""
+    if agents_to_use is None:
+        agents_to_use = list(AGENTS.keys())
+    by_agent = {entry["agent"]: entry async for entry in iter_agent_discussion(topic, language, agents_to_use)}
+    return [by_agent[name] for name in agents_to_use]
+
+
+FEEDBACK_AGENTS = ["TeamLead", "Critic", "Motivator"]
+
+# Late feedback still being awaited after its deadline (strong refs keep the tasks alive)
+_late_feedback: Set[asyncio.Task] = set()
+
+
+def _feedback_entry(agent_name: str, result, pending: bool = False) -> Dict:
+    agent = AGENTS[agent_name]
+    return {
+        "agent": agent_name,
+        "emoji": agent["emoji"],
+        "content": "" if pending else (str(result) if not isinstance(result, Exception) else "Нет ответа"),
+        "pending": pending,
+    }
 
 
 async def get_team_feedback(
     situation: str,
     language: str = "ru",
+    deadline: Optional[float] = None,
+    on_late: Optional[Callable[[Dict], Awaitable[None]]] = None,
 ) -> List[Dict]:
-    """Get quick feedback from all agents on a situation."""
-    tasks = []
-    for agent_name in ["TeamLead", "Critic", "Motivator"]:
-        tasks.append(run_agent(agent_name, f"Дай краткую обратную связь: {situation}", language))
-    
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    
+    """
+    Get quick feedback from all agents on a situation.
+    With a deadline (seconds) only the agents that answered in time are
+    returned filled in; the rest come back with pending=True and keep running,
+    and on_late(entry) is awaited for each of them once it answers.
+    """
+    tasks = {
+        asyncio.ensure_future(run_agent(agent_name, f"Дай краткую обратную связь: {situation}", language)): agent_name
+        for agent_name in FEEDBACK_AGENTS
+    }
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+
     feedback = []
-    for i, (agent_name, result) in enumerate(zip(["TeamLead", "Critic", "Motivator"], results)):
-        agent = AGENTS[agent_name]
-        feedback.append({
-            "agent": agent_name,
-            "emoji": agent["emoji"],
-            "content": str(result) if not isinstance(result, Exception) else "Нет ответа",
-        })
+    for task, agent_name in tasks.items():
+        if task in done:
+            feedback.append(_feedback_entry(agent_name, task.exception() or task.result()))
+        else:
+            feedback.append(_feedback_entry(agent_name, None, pending=True))
+
+    for task in pending:
+        late = asyncio.ensure_future(_deliver_late(task, tasks[task], on_late))
+        _late_feedback.add(late)
+        late.add_done_callback(_late_feedback.discard)
     return feedback
+
+
+async def _deliver_late(task: asyncio.Future, agent_name: str, on_late):
+    try:
+        result = await task
+    except Exception as e:
+        result = e
+    if on_late is None:
+        return
+    try:
+        await on_late(_feedback_entry(agent_name, result))
+    except Exception:
+        pass  # a failed push must not break the other late answers
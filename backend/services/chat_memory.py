@@ -0,0 +1,178 @@
+"""
+Chat Memory — rolling conversation summaries for the personal AI chat.
+Instead of the last 10 raw messages, a turn sends a compact summary of the
+older conversation (per user and mode) plus only the messages not folded into
+it yet. After each turn a background task folds older messages into the
+summary with FAST_MODEL, so prompts stay small and nothing is forgotten.
+"""
+import asyncio
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend.config import (
+    FAST_MODEL, CHAT_MEMORY_RECENT_MESSAGES, CHAT_MEMORY_TURN_TOKENS,
+    CHAT_SUMMARY_BATCH, CHAT_SUMMARY_TOKENS,
+)
+from backend.models.database import SessionLocal, PersonalChatMessage, ConversationSummary
+from backend.models import queries
+from backend.services.openrouter_service import chat_completion
+from backend.services.llm_scheduler import user_tenant
+from backend.services.token_budget import truncate_text
+
+FOLD_MAX_MESSAGES = CHAT_SUMMARY_BATCH * 4   # messages folded in one summarizer call
+FOLD_MESSAGE_TOKENS = 300                    # each message is shortened to this for the summarizer
+
+SUMMARY_SYSTEM = (
+    "Ты ведёшь краткую память диалога пользователя с AI-ассистентом. "
+    "Сохраняй факты о пользователе, его цели, проекты, принятые решения, договорённости "
+    "и открытые вопросы. Без приветствий и воды, на языке диалога."
+)
+
+_running: Set[Tuple[int, str]] = set()
+_tasks: Set[asyncio.Task] = set()
+_stats = {"folds": 0, "folded_messages": 0, "conflicts": 0, "failures": 0}
+
+
+def _summary_row(db: Session, user_id: int, mode: str):
+    return (
+        db.query(ConversationSummary)
+        .filter(ConversationSummary.user_id == user_id, ConversationSummary.mode == mode)
+        .first()
+    )
+
+
+def load_history(db: Session, user_id: int, mode: str) -> Tuple[str, List[Dict[str, str]], Set[int]]:
+    """
+    (summary, history, message ids in history) for the next prompt: every
+    message not yet folded into the summary, and at least the last
+    CHAT_MEMORY_RECENT_MESSAGES.
+    """
+    row = _summary_row(db, user_id, mode)
+    last_id = row.last_message_id if row else 0
+    recent = db.scalars(queries.personal_history(user_id, CHAT_MEMORY_RECENT_MESSAGES + FOLD_MAX_MESSAGES, mode)).all()
+    kept = [m for i, m in enumerate(recent) if m.id > last_id or i < CHAT_MEMORY_RECENT_MESSAGES]
+    history = [
+        {"role": m.role, "content": truncate_text(m.content or "", CHAT_MEMORY_TURN_TOKENS)}
+        for m in reversed(kept)
+    ]
+    return (row.summary if row else "") or "", history, {m.id for m in kept}
+
+
+def memory_section(summary: str) -> str:
+    """System-prompt block with the rolling summary ("" when there is none yet)."""
+    if not summary:
+        return ""
+    return "=== ПАМЯТЬ ДИАЛОГА (кратко о прошлых сообщениях) ===\n" + summary
+
+
+def schedule_summary(user_id: int, mode: str):
+    """Fold older messages into the summary in the background (one task per user and mode)."""
+    key = (user_id, mode)
+    if key in _running:
+        return
+    _running.add(key)
+    task = asyncio.ensure_future(_summarize(user_id, mode))
+    _tasks.add(task)
+    task.add_done_callback(lambda t: (_tasks.discard(t), _running.discard(key)))
+
+
+async def _summarize(user_id: int, mode: str):
+    """
+    Fold in three steps so no session is open while the LLM runs: read the
+    pending messages (short session, in a thread), summarize, then save in a
+    fresh transaction — only if the summary still ends where it did when read.
+    """
+    try:
+        while True:
+            summary, last_id, pending = await asyncio.to_thread(_pending, user_id, mode)
+            to_fold = pending[:-CHAT_MEMORY_RECENT_MESSAGES] if CHAT_MEMORY_RECENT_MESSAGES else pending
+            if len(to_fold) < CHAT_SUMMARY_BATCH:
+                return
+            to_fold = to_fold[:FOLD_MAX_MESSAGES]
+            folded = await _fold(user_id, summary, [(role, content) for _, role, content in to_fold])
+            if not await asyncio.to_thread(_save, user_id, mode, last_id, folded, to_fold[-1][0]):
+                _stats["conflicts"] += 1   # history cleared or folded elsewhere meanwhile
+                return
+            _stats["folds"] += 1
+            _stats["folded_messages"] += len(to_fold)
+    except Exception:
+        _stats["failures"] += 1   # the messages stay unfolded and are retried after the next turn
+
+
+def _pending(user_id: int, mode: str) -> Tuple[str, int, List[Tuple[int, str, str]]]:
+    """(summary, last folded message id, [(id, role, content)] of the messages after it)."""
+    db = SessionLocal()
+    try:
+        row = _summary_row(db, user_id, mode)
+        last_id = (row.last_message_id or 0) if row else 0
+        pending = (
+            db.query(PersonalChatMessage.id, PersonalChatMessage.role, PersonalChatMessage.content)
+            .filter(
+                PersonalChatMessage.user_id == user_id,
+                PersonalChatMessage.mode == mode,
+                PersonalChatMessage.id > last_id,
+            )
+            .order_by(PersonalChatMessage.id.asc())
+            .all()
+        )
+        return (row.summary if row else "") or "", last_id, [tuple(m) for m in pending]
+    finally:
+        db.close()
+
+
+def _save(user_id: int, mode: str, expected_last_id: int, summary: str, last_id: int) -> bool:
+    """Store the new summary unless it moved past expected_last_id (or the history was cleared)."""
+    db = SessionLocal()
+    try:
+        if db.get(PersonalChatMessage, last_id) is None:
+            return False
+        if expected_last_id == 0 and _summary_row(db, user_id, mode) is None:
+            db.add(ConversationSummary(user_id=user_id, mode=mode, summary=summary, last_message_id=last_id))
+            updated = 1
+        else:
+            updated = (
+                db.query(ConversationSummary)
+                .filter(
+                    ConversationSummary.user_id == user_id,
+                    ConversationSummary.mode == mode,
+                    func.coalesce(ConversationSummary.last_message_id, 0) == expected_last_id,
+                )
+                .update({"summary": summary, "last_message_id": last_id}, synchronize_session=False)
+            )
+        db.commit()
+        return updated == 1
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def _fold(user_id: int, summary: str, messages: List[Tuple[str, str]]) -> str:
+    transcript = "\n".join(
+        f"{'Пользователь' if role == 'user' else 'AI'}: {truncate_text(content or '', FOLD_MESSAGE_TOKENS)}"
+        for role, content in messages
+    )
+    prompt = (
+        f"Текущее резюме:\n{summary or '—'}\n\n"
+        f"Новые сообщения:\n{transcript}\n\n"
+        f"Перепиши резюме так, чтобы оно включало новые сообщения. "
+        f"Не длиннее {CHAT_SUMMARY_TOKENS // 2} слов, списком коротких пунктов."
+    )
+    result = await chat_completion(
+        [{"role": "system", "content": SUMMARY_SYSTEM}, {"role": "user", "content": prompt}],
+        model=FAST_MODEL, temperature=0.2, max_tokens=CHAT_SUMMARY_TOKENS,
+        priority="background", tenant=user_tenant(user_id),
+    )
+    return truncate_text(result.strip(), CHAT_SUMMARY_TOKENS)
+
+
+def forget(db: Session, user_id: int):
+    """Drop every summary of a user (history was cleared)."""
+    db.query(ConversationSummary).filter(ConversationSummary.user_id == user_id).delete()
+
+
+def memory_stats() -> Dict:
+    return {**_stats, "running": len(_running)}
@@ -1,17 +1,31 @@
 """
 Context Service — собирает данные всех модулей для одного пользователя
 и формирует персонализированный контекст для AI.
+Snapshot cache: каждая секция контекста (профиль, ачивки, kanban, XP, чат)
+хранится в памяти по user_id. После commit'а ORM-события сбрасывают только
+затронутую секцию, а новые XP-записи и сообщения чата дописываются в снимок
+без запроса к БД — в обычном случае сборка контекста не трогает базу.
 """
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
 from datetime import datetime, date
-from typing import Optional
+from typing import Dict, Optional
+from backend.config import USER_CONTEXT_CACHE_SIZE, USER_CONTEXT_TTL
 from backend.models.database import (
     User, KanbanTask, PersonalChatMessage, XPLog, UserBadge, Badge
 )
+from backend.models import queries
 
 
 XP_PER_LEVEL = 200
 
+SECTIONS = ("profile", "badges", "kanban", "xp", "chat")
+PROFILE_FIELDS = ("username", "full_name", "xp", "streak_days", "skills", "preferred_roles", "language", "created_at")
+KANBAN_LIMIT, XP_LIMIT, CHAT_LIMIT = 15, 5, 6
+
 
 def _level_from_xp(xp: int) -> int:
     return xp // XP_PER_LEVEL + 1
@@ -32,53 +46,211 @@ def _rank_from_xp(xp: int) -> str:
     return "Новичок"
 
 
-def build_user_context(user_id: int, db: Session, language: str = "ru") -> str:
+# ── Snapshot cache ────────────────────────────────────────────────────────────
+
+class _Snapshot:
+    def __init__(self):
+        self.sections: Dict[str, object] = {}   # section → raw rows (rendered on every build)
+        self.loaded_at: Dict[str, float] = {}
+        self.versions: Dict[str, int] = {}      # bumped by every write; stale rebuilds are dropped
+
+
+_snapshots: "OrderedDict[int, _Snapshot]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "patches": 0, "invalidations": 0,
+          "rebuild_seconds": 0.0, "rebuild_max_seconds": 0.0}
+
+
+def _snapshot(user_id: int) -> _Snapshot:
+    snap = _snapshots.get(user_id)
+    if snap is None:
+        snap = _snapshots[user_id] = _Snapshot()
+        while len(_snapshots) > USER_CONTEXT_CACHE_SIZE:
+            _snapshots.popitem(last=False)
+    _snapshots.move_to_end(user_id)
+    return snap
+
+
+def _load_section(section: str, user_id: int, db: Session):
+    if section == "profile":
+        user: Optional[User] = db.query(User).filter(User.id == user_id).first()
+        return {f: getattr(user, f) for f in PROFILE_FIELDS} if user else None
+    if section == "badges":
+        user_badges = (
+            db.query(UserBadge)
+            .filter(UserBadge.user_id == user_id)
+            .join(Badge)
+            .limit(5)
+            .all()
+        )
+        return [ub.badge.name for ub in user_badges if ub.badge]
+    if section == "kanban":
+        tasks = db.scalars(queries.recent_user_tasks(user_id, KANBAN_LIMIT)).all()
+        return [(t.status, t.priority, t.title, t.due_date) for t in tasks]
+    if section == "xp":
+        xp_logs = db.scalars(queries.recent_xp(user_id, XP_LIMIT)).all()
+        return [(log.amount, log.reason) for log in xp_logs]
+    recent_chat = db.scalars(queries.personal_history(user_id, CHAT_LIMIT)).all()
+    return [(msg.role, msg.content) for msg in reversed(recent_chat)]
+
+
+def _get_sections(user_id: int, db: Session) -> Dict[str, object]:
+    """All sections for a user: cached ones as-is, missing or expired ones reloaded."""
+    now = time.time()
+    with _lock:
+        snap = _snapshot(user_id)
+        missing = [s for s in SECTIONS
+                   if s not in snap.sections or now - snap.loaded_at[s] > USER_CONTEXT_TTL]
+        versions = {s: snap.versions.get(s, 0) for s in missing}
+        data = dict(snap.sections)
+        _stats["hits" if not missing else "misses"] += 1
+    if not missing:
+        return data
+
+    start = time.perf_counter()
+    fresh = {s: _load_section(s, user_id, db) for s in missing}
+    elapsed = time.perf_counter() - start
+    with _lock:
+        _stats["rebuild_seconds"] += elapsed
+        _stats["rebuild_max_seconds"] = max(_stats["rebuild_max_seconds"], elapsed)
+        for s, value in fresh.items():
+            if snap.versions.get(s, 0) == versions[s]:   # no write landed while we were reading
+                snap.sections[s] = value
+                snap.loaded_at[s] = now
+    data.update(fresh)
+    return data
+
+
+def invalidate_user_context(user_id: int, *sections: str):
+    """Drop cached sections (all if none given) — for writes the ORM events can't see, e.g. bulk deletes."""
+    with _lock:
+        snap = _snapshots.get(user_id)
+        if snap is None:
+            return
+        for s in sections or SECTIONS:
+            snap.sections.pop(s, None)
+            snap.versions[s] = snap.versions.get(s, 0) + 1
+        _stats["invalidations"] += 1
+
+
+def _patch(user_id: int, section: str, row, limit: int, newest_first: bool):
+    """Add one new row to a cached list section instead of reloading it."""
+    with _lock:
+        snap = _snapshots.get(user_id)
+        if snap is None:
+            return
+        snap.versions[section] = snap.versions.get(section, 0) + 1
+        rows = snap.sections.get(section)
+        if rows is None:
+            return
+        snap.sections[section] = ([row] + rows)[:limit] if newest_first else (rows + [row])[-limit:]
+        _stats["patches"] += 1
+
+
+def context_cache_stats() -> Dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **{k: v for k, v in _stats.items() if k not in ("rebuild_seconds", "rebuild_max_seconds")},
+        "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else None,
+        "avg_rebuild_ms": round(_stats["rebuild_seconds"] / _stats["misses"] * 1000, 2) if _stats["misses"] else None,
+        "max_rebuild_ms": round(_stats["rebuild_max_seconds"] * 1000, 2),
+        "users": len(_snapshots),
+        "max_users": USER_CONTEXT_CACHE_SIZE,
+        "ttl_seconds": USER_CONTEXT_TTL,
+    }
+
+
+# ── Write tracking (ORM events) ───────────────────────────────────────────────
+# Changes are collected per flush and applied after commit, so a rolled-back
+# transaction never touches the cache.
+
+def _user_ids(obj, attr: str = "user_id"):
+    ids = {getattr(obj, attr)}
+    ids.update(inspect(obj).attrs[attr].history.deleted or ())   # row moved to another user
+    return {i for i in ids if i is not None}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_context_changes(session, flush_context):
+    changes = session.info.setdefault("user_context_changes", [])
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        is_new = obj in session.new
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if obj in session.deleted or any(state.attrs[f].history.has_changes() for f in PROFILE_FIELDS):
+                changes.append(("invalidate", obj.id, "profile"))
+        elif isinstance(obj, KanbanTask):
+            changes.extend(("invalidate", uid, "kanban") for uid in _user_ids(obj))
+        elif isinstance(obj, UserBadge):
+            changes.extend(("invalidate", uid, "badges") for uid in _user_ids(obj))
+        elif isinstance(obj, XPLog):
+            if is_new and obj.user_id is not None:
+                changes.append(("patch", obj.user_id, "xp", (obj.amount, obj.reason)))
+            else:
+                changes.extend(("invalidate", uid, "xp") for uid in _user_ids(obj))
+        elif isinstance(obj, PersonalChatMessage):
+            if is_new and obj.user_id is not None:
+                changes.append(("patch", obj.user_id, "chat", (obj.role, obj.content)))
+            else:
+                changes.extend(("invalidate", uid, "chat") for uid in _user_ids(obj))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_context_changes(session):
+    for change in session.info.pop("user_context_changes", ()):
+        if change[0] == "patch":
+            _, user_id, section, row = change
+            if section == "xp":
+                _patch(user_id, "xp", row, XP_LIMIT, newest_first=True)
+            else:
+                _patch(user_id, "chat", row, CHAT_LIMIT, newest_first=False)
+        else:
+            invalidate_user_context(change[1], change[2])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_context_changes(session):
+    session.info.pop("user_context_changes", None)
+
+
+def build_user_context(user_id: int, db: Session, language: str = "ru", include_chat: bool = True) -> str:
     """
     Собирает весь доступный контекст пользователя из всех модулей.
     Возвращает строку, которую можно вставить в system prompt AI.
+    Данные берутся из snapshot-кэша; из БД читаются только сброшенные секции.
+    include_chat=False — без недавнего диалога (он меняется каждый ход и ломает
+    кэш префикса промпта; персональный чат и так передаёт историю сообщениями).
     """
+    data = _get_sections(user_id, db)
     lines = []
 
     # ── USER PROFILE ─────────────────────────────────────────────────────────
-    user: Optional[User] = db.query(User).filter(User.id == user_id).first()
+    user = data["profile"]
     if user:
-        lvl = _level_from_xp(user.xp)
-        rank = _rank_from_xp(user.xp)
-        days_since_join = (datetime.utcnow() - user.created_at).days if user.created_at else 0
-        skills_str = ", ".join(user.skills) if user.skills else "не указаны"
-        roles_str  = ", ".join(user.preferred_roles) if user.preferred_roles else "не указаны"
+        lvl = _level_from_xp(user["xp"])
+        rank = _rank_from_xp(user["xp"])
+        days_since_join = (datetime.utcnow() - user["created_at"]).days if user["created_at"] else 0
+        skills_str = ", ".join(user["skills"]) if user["skills"] else "не указаны"
+        roles_str  = ", ".join(user["preferred_roles"]) if user["preferred_roles"] else "не указаны"
 
         lines.append("=== ПРОФИЛЬ ПОЛЬЗОВАТЕЛЯ ===")
-        lines.append(f"Имя: {user.full_name or user.username}")
-        lines.append(f"Уровень: {lvl} ({rank}), XP: {user.xp}")
-        lines.append(f"Стрик: {user.streak_days} дней подряд")
+        lines.append(f"Имя: {user['full_name'] or user['username']}")
+        lines.append(f"Уровень: {lvl} ({rank}), XP: {user['xp']}")
+        lines.append(f"Стрик: {user['streak_days']} дней подряд")
         lines.append(f"Дней на платформе: {days_since_join}")
         lines.append(f"Навыки: {skills_str}")
         lines.append(f"Предпочтительные роли: {roles_str}")
-        lines.append(f"Язык интерфейса: {user.language}")
+        lines.append(f"Язык интерфейса: {user['language']}")
         lines.append("")
 
         # Badges
-        user_badges = (
-            db.query(UserBadge)
-            .filter(UserBadge.user_id == user_id)
-            .join(Badge)
-            .limit(5)
-            .all()
-        )
-        if user_badges:
-            badge_names = [ub.badge.name for ub in user_badges if ub.badge]
+        badge_names = data["badges"]
+        if badge_names:
             lines.append(f"Ачивки: {', '.join(badge_names)}")
             lines.append("")
 
     # ── KANBAN TASKS ─────────────────────────────────────────────────────────
-    tasks = (
-        db.query(KanbanTask)
-        .filter(KanbanTask.user_id == user_id)
-        .order_by(KanbanTask.updated_at.desc())
-        .limit(15)
-        .all()
-    )
+    tasks = data["kanban"]
     if tasks:
         lines.append("=== KANBAN (текущие задачи) ===")
         status_map = {
@@ -91,42 +263,30 @@ def build_user_context(user_id: int, db: Session, language: str = "ru") -> str:
         # Group by status
         by_status: dict = {}
         for t in tasks:
-            s = status_map.get(t.status, t.status)
+            s = status_map.get(t[0], t[0])
             by_status.setdefault(s, []).append(t)
         for status, group in by_status.items():
             lines.append(f"{status}:")
-            for t in group:
-                due = f" (дедлайн: {t.due_date.strftime('%d.%m')})" if t.due_date else ""
-                lines.append(f"  • [{t.priority.upper()}] {t.title}{due}")
+            for _, priority, title, due_date in group:
+                due = f" (дедлайн: {due_date.strftime('%d.%m')})" if due_date else ""
+                lines.append(f"  • [{priority.upper()}] {title}{due}")
         lines.append("")
 
     # ── RECENT XP ACTIVITY ────────────────────────────────────────────────────
-    xp_logs = (
-        db.query(XPLog)
-        .filter(XPLog.user_id == user_id)
-        .order_by(XPLog.created_at.desc())
-        .limit(5)
-        .all()
-    )
+    xp_logs = data["xp"]
     if xp_logs:
         lines.append("=== ПОСЛЕДНЯЯ АКТИВНОСТЬ ===")
-        for log in xp_logs:
-            lines.append(f"  +{log.amount} XP — {log.reason}")
+        for amount, reason in xp_logs:
+            lines.append(f"  +{amount} XP — {reason}")
         lines.append("")
 
     # ── RECENT CHAT CONTEXT ───────────────────────────────────────────────────
-    recent_chat = (
-        db.query(PersonalChatMessage)
-        .filter(PersonalChatMessage.user_id == user_id)
-        .order_by(PersonalChatMessage.id.desc())
-        .limit(6)
-        .all()
-    )
+    recent_chat = data["chat"] if include_chat else []
     if recent_chat:
         lines.append("=== НЕДАВНИЙ ДИАЛОГ С AI ===")
-        for msg in reversed(recent_chat):
-            role_label = "Пользователь" if msg.role == "user" else "AI"
-            lines.append(f"  {role_label}: {msg.content[:120]}...")
+        for role, content in recent_chat:
+            role_label = "Пользователь" if role == "user" else "AI"
+            lines.append(f"  {role_label}: {content[:120]}...")
         lines.append("")
 
     if not lines:
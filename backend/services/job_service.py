@@ -0,0 +1,240 @@
+"""
+Job Service — in-process engine for long AI generations.
+Endpoints that keep SMART_MODEL busy for 30–90 s can hand the work to a job
+instead of holding the HTTP request open: submit_job() stores an AIJob row
+and returns its id right away, a bounded pool of workers runs the registered
+handler, and clients poll GET /api/jobs/{id} or stream /api/jobs/{id}/events.
+Every ?async_job=true endpoint answers with the same job dict (JobResponse).
+Database work runs in worker threads, never on the event loop.
+Identical inputs dedupe onto the same job; queued/running jobs survive a
+restart (they are re-enqueued on startup).
+"""
+import asyncio
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from backend.config import JOB_WORKERS, JOB_DEDUPE_SECONDS, JOB_MAX_ATTEMPTS
+from backend.models.database import SessionLocal, AIJob
+
+JobHandler = Callable[[dict], Awaitable]
+
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+_queue: Optional[asyncio.Queue] = None
+_workers: list = []
+_updates: Dict[str, asyncio.Event] = {}   # job id → set on every status change
+
+
+def register_job(kind: str):
+    """Decorator: register the coroutine that runs jobs of this kind (payload dict → JSON result)."""
+    def wrap(fn: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return wrap
+
+
+def job_to_dict(job: AIJob) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _input_hash(kind: str, payload: dict) -> str:
+    raw = json.dumps({"kind": kind, "payload": payload}, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _notify(job_id: str):
+    event = _updates.pop(job_id, None)
+    if event is not None:
+        event.set()
+
+
+def watch_job(job_id: str) -> asyncio.Event:
+    """
+    Event set on the job's next status change. Take it *before* reading the
+    job: a change that lands between the read and the wait still sets it.
+    """
+    return _updates.setdefault(job_id, asyncio.Event())
+
+
+def unwatch_job(job_id: str):
+    """Forget the job's event once it is finished (no change will ever set it)."""
+    _updates.pop(job_id, None)
+
+
+async def wait_for_update(update: asyncio.Event, timeout: float) -> bool:
+    """Wait until the watched job changes state (True) or timeout passes (False)."""
+    try:
+        await asyncio.wait_for(update.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+async def submit_job(kind: str, payload: dict, user_id: Optional[int] = None) -> dict:
+    """Create (or reuse an identical) job and enqueue it. Returns the job dict."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = await asyncio.to_thread(_create_job, kind, payload, user_id)
+    if not job["deduplicated"]:
+        _enqueue(job["job_id"])
+    return job
+
+
+def _create_job(kind: str, payload: dict, user_id: Optional[int]) -> dict:
+    digest = _input_hash(kind, payload)
+    db = SessionLocal()
+    try:
+        fresh_after = datetime.utcnow() - timedelta(seconds=JOB_DEDUPE_SECONDS)
+        existing = (
+            db.query(AIJob)
+            .filter(AIJob.input_hash == digest)
+            .order_by(AIJob.created_at.desc())
+            .first()
+        )
+        if existing and (existing.status in ("queued", "running") or
+                         (existing.status == "done" and existing.finished_at and existing.finished_at >= fresh_after)):
+            return {**job_to_dict(existing), "deduplicated": True}
+
+        job = AIJob(id=uuid.uuid4().hex, kind=kind, input_hash=digest, payload=payload, user_id=user_id)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return {**job_to_dict(job), "deduplicated": False}
+    finally:
+        db.close()
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    return await asyncio.to_thread(_load_job, job_id)
+
+
+def _load_job(job_id: str) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        job = db.query(AIJob).filter(AIJob.id == job_id).first()
+        return job_to_dict(job) if job else None
+    finally:
+        db.close()
+
+
+def _enqueue(job_id: str):
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue()
+    _queue.put_nowait(job_id)
+
+
+def _save_status(job_id: str, fields: dict):
+    db = SessionLocal()
+    try:
+        job = db.query(AIJob).filter(AIJob.id == job_id).first()
+        if job is None:
+            return
+        for key, value in fields.items():
+            setattr(job, key, value)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _set_status(job_id: str, **fields):
+    try:
+        await asyncio.to_thread(_save_status, job_id, fields)
+    finally:
+        _notify(job_id)   # on the loop: asyncio.Event is not thread-safe
+
+
+def _claim(job_id: str) -> Optional[tuple]:
+    """(kind, payload, attempt number) of a job that still has to run, else None."""
+    db = SessionLocal()
+    try:
+        job = db.query(AIJob).filter(AIJob.id == job_id).first()
+        if job is None or job.status in ("done", "failed"):
+            return None
+        return job.kind, job.payload or {}, (job.attempts or 0) + 1
+    finally:
+        db.close()
+
+
+async def _run(job_id: str):
+    claimed = await asyncio.to_thread(_claim, job_id)
+    if claimed is None:
+        return
+    kind, payload, attempts = claimed
+    if attempts > JOB_MAX_ATTEMPTS:
+        await _set_status(job_id, status="failed", error="Interrupted too many times", finished_at=datetime.utcnow())
+        return
+    await _set_status(job_id, status="running", attempts=attempts, started_at=datetime.utcnow())
+    try:
+        result = await JOB_HANDLERS[kind](payload)
+    except Exception as e:
+        await _set_status(job_id, status="failed", error=str(e) or type(e).__name__, finished_at=datetime.utcnow())
+        return
+    await _set_status(job_id, status="done", result=result, finished_at=datetime.utcnow())
+
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        try:
+            await _run(job_id)
+        except Exception as e:  # never let one job kill the worker
+            print(f"[jobs] {job_id} crashed: {e}")
+        finally:
+            _queue.task_done()
+
+
+async def start_job_workers():
+    """Start the worker pool and re-enqueue jobs a previous process left unfinished."""
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue()
+    for job_id in await asyncio.to_thread(_requeue_unfinished):
+        _queue.put_nowait(job_id)
+    for _ in range(max(JOB_WORKERS, 1) - len(_workers)):
+        _workers.append(asyncio.create_task(_worker()))
+
+
+def _requeue_unfinished() -> list:
+    db = SessionLocal()
+    try:
+        pending = (
+            db.query(AIJob)
+            .filter(AIJob.status.in_(("queued", "running")))
+            .order_by(AIJob.created_at)
+            .all()
+        )
+        for job in pending:
+            job.status = "queued"
+        db.commit()
+        return [job.id for job in pending]
+    finally:
+        db.close()
+
+
+async def stop_job_workers():
+    """Cancel the workers; running jobs stay 'running' and resume on the next start."""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+def job_stats() -> dict:
+    return {
+        "workers": len(_workers),
+        "queued": _queue.qsize() if _queue is not None else 0,
+        "kinds": sorted(JOB_HANDLERS),
+    }
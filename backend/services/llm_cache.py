@@ -0,0 +1,184 @@
+"""
+LLM Cache — two-tier response cache in front of chat_completion.
+Tier 1 is an in-process LRU with TTL, tier 2 a small SQLite file that
+survives restarts. Entries are keyed by model, normalized messages,
+temperature and max_tokens, so byte-identical prompts (olympiad topics,
+quizzes, catalog ideas) are served without an upstream call.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from backend.config import LLM_CACHE_ENABLED, LLM_CACHE_MEMORY_SIZE, LLM_CACHE_TTL, LLM_CACHE_DB_PATH
+
+PRUNE_EVERY = 500  # disk writes between expired-row cleanups
+
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+
+def _normalize(content) -> str:
+    if isinstance(content, str):
+        return "\n".join(line.rstrip() for line in content.strip().splitlines())
+    return json.dumps(content, ensure_ascii=False, sort_keys=True)
+
+
+def make_key(model: str, messages: List[Dict], temperature: float, max_tokens: int,
+             response_format: Optional[Dict] = None) -> str:
+    """Stable cache key for one completion request."""
+    normalized = [{"role": m.get("role"), "content": _normalize(m.get("content"))} for m in messages]
+    request = {"model": model, "messages": normalized, "temperature": round(float(temperature), 3), "max_tokens": max_tokens}
+    if response_format:
+        request["response_format"] = response_format
+    raw = json.dumps(request, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# ── Tier 1: in-memory LRU ─────────────────────────────────────────────────────
+
+class MemoryLRU:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key → (expires_at, value)
+
+    def get(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl: int):
+        self._data[key] = (time.time() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ── Tier 2: SQLite file ───────────────────────────────────────────────────────
+
+class DiskCache:
+    """Blocking SQLite store; called through asyncio.to_thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, model TEXT, response TEXT,"
+                " created_at REAL, expires_at REAL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT response, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return row
+
+    def set(self, key: str, model: str, value: str, ttl: int):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, value, now, now + ttl),
+            )
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM llm_cache")
+            self._connect().commit()
+
+
+_memory = MemoryLRU(LLM_CACHE_MEMORY_SIZE)
+_disk = DiskCache(LLM_CACHE_DB_PATH)
+
+
+async def cache_get(key: str) -> Optional[str]:
+    """Look a completion up in memory, then on disk (promoting disk hits)."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    value = _memory.get(key)
+    if value is not None:
+        _stats["memory_hits"] += 1
+        return value
+    try:
+        row = await asyncio.to_thread(_disk.get, key)
+    except sqlite3.Error:
+        _stats["errors"] += 1
+        row = None
+    if row is not None:
+        value, expires_at = row
+        _memory.set(key, value, max(int(expires_at - time.time()), 1))
+        _stats["disk_hits"] += 1
+        return value
+    _stats["misses"] += 1
+    return None
+
+
+async def cache_set(key: str, model: str, value: str, ttl: Optional[int] = None):
+    if not LLM_CACHE_ENABLED or not value:
+        return
+    ttl = ttl or LLM_CACHE_TTL
+    _memory.set(key, value, ttl)
+    try:
+        await asyncio.to_thread(_disk.set, key, model, value, ttl)
+    except sqlite3.Error:
+        _stats["errors"] += 1
+    _stats["stores"] += 1
+
+
+async def cache_clear():
+    _memory.clear()
+    await asyncio.to_thread(_disk.clear)
+
+
+async def cache_stats() -> Dict:
+    lookups = _stats["memory_hits"] + _stats["disk_hits"] + _stats["misses"]
+    hits = _stats["memory_hits"] + _stats["disk_hits"]
+    try:
+        disk_entries = await asyncio.to_thread(_disk.count)
+    except sqlite3.Error:
+        disk_entries = None
+    return {
+        **_stats,
+        "enabled": LLM_CACHE_ENABLED,
+        "hit_rate": round(hits / lookups, 3) if lookups else None,
+        "memory_entries": len(_memory),
+        "memory_max": LLM_CACHE_MEMORY_SIZE,
+        "disk_entries": disk_entries,
+        "ttl_seconds": LLM_CACHE_TTL,
+    }
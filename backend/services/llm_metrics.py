@@ -0,0 +1,241 @@
+"""
+LLM Metrics — latency, TTFT, throughput and fallback stats in Prometheus format.
+openrouter_service reports every upstream call here; each sample is labeled
+with the model and the API route that triggered it (set per request by
+RouteLabelMiddleware). Rendered as text at GET /metrics — no client library
+needed.
+"""
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.routing import Match
+
+from backend.services.prompt_layout import cached_tokens
+
+# Route of the HTTP request currently being served (inherited by tasks it spawns)
+current_route: ContextVar[str] = ContextVar("llm_route", default="background")
+
+UNMATCHED_ROUTE = "unmatched"   # 404s: the raw path would make the label unbounded
+
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+TTFT_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+TPS_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320)
+DEPTH_BUCKETS = (0, 1, 2, 3, 5, 8, 12)
+
+
+def route_label(scope) -> str:
+    """
+    Template of the route the request will be dispatched to (/api/teams/42 →
+    /api/teams/{team_id}), so label cardinality is bounded by the app's
+    routes whatever the path carries — ids, share tokens, model slugs.
+    """
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:   # PARTIAL = right path, wrong method
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name, self.help, self.labelnames = name, help, labels
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_num(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name, self.help, self.labelnames = name, help, labels
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[tuple, list] = {}   # key → [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        data = self.values.get(key)
+        if data is None:
+            data = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                data[i] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, data in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, data):
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {data[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(round(data[-2], 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {data[-1]}")
+        return lines
+
+
+class Gauge:
+    """Read at scrape time from a callback returning {label values tuple: value}."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], fn: Callable[[], Dict[tuple, float]]):
+        self.name, self.help, self.labelnames, self.fn = name, help, labels, fn
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.fn()
+        except Exception:
+            values = {}
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_num(value)}")
+        return lines
+
+
+_registry: list = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+LLM_LATENCY = _register(Histogram(
+    "llm_request_duration_seconds", "Upstream LLM call duration (full response)",
+    ("model", "route", "stream"), LATENCY_BUCKETS))
+LLM_TTFT = _register(Histogram(
+    "llm_time_to_first_token_seconds", "Time until the first streamed token",
+    ("model", "route"), TTFT_BUCKETS))
+LLM_TPS = _register(Histogram(
+    "llm_tokens_per_second", "Completion tokens per second of generation",
+    ("model", "route"), TPS_BUCKETS))
+LLM_TOKENS = _register(Counter(
+    "llm_tokens_total", "Prompt / completion / cached prompt tokens reported in usage",
+    ("model", "route", "kind")))
+LLM_TTFT_CACHE = _register(Histogram(
+    "llm_ttft_by_prompt_cache_seconds", "Time to first token, split by provider prefix-cache hit",
+    ("model", "prompt_cache"), TTFT_BUCKETS))
+LLM_REQUESTS = _register(Counter(
+    "llm_requests_total", "Upstream LLM calls by outcome (HTTP status or error class)",
+    ("model", "route", "code")))
+LLM_FALLBACK_DEPTH = _register(Histogram(
+    "llm_fallback_depth", "Failed models tried before one answered (0 = primary)",
+    ("route",), DEPTH_BUCKETS))
+LLM_STREAM_FAILOVERS = _register(Counter(
+    "llm_stream_failovers_total", "Streams continued on another model after a mid-stream failure",
+    ("model", "route", "reason")))
+LLM_QUEUE_WAIT = _register(Histogram(
+    "llm_queue_wait_seconds", "Time spent waiting for an LLM scheduler slot",
+    ("lane",), (0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60)))
+
+
+def register_counter(name: str, help: str, labels: Tuple[str, ...]) -> Counter:
+    return _register(Counter(name, help, labels))
+
+
+def register_histogram(name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]) -> Histogram:
+    return _register(Histogram(name, help, labels, buckets))
+
+
+def register_gauge(name: str, help: str, labels: Tuple[str, ...], fn: Callable[[], Dict[tuple, float]]):
+    _register(Gauge(name, help, labels, fn))
+
+
+def observe_call(model: str, latency: float, usage: Optional[dict] = None):
+    route = current_route.get()
+    LLM_REQUESTS.inc(model=model, route=route, code="200")
+    LLM_LATENCY.observe(latency, model=model, route=route, stream="false")
+    _observe_usage(model, route, usage, latency)
+
+
+def observe_stream(model: str, ttft: Optional[float], duration: float,
+                   usage: Optional[dict] = None, completion_estimate: int = 0):
+    route = current_route.get()
+    LLM_REQUESTS.inc(model=model, route=route, code="200")
+    LLM_LATENCY.observe(duration, model=model, route=route, stream="true")
+    if ttft is not None:
+        LLM_TTFT.observe(ttft, model=model, route=route)
+    if ttft is not None and usage and usage.get("prompt_tokens"):
+        LLM_TTFT_CACHE.observe(ttft, model=model, prompt_cache="hit" if cached_tokens(usage) else "miss")
+    if not usage and completion_estimate:
+        usage = {"completion_tokens": completion_estimate}
+    generation = duration - (ttft or 0)
+    _observe_usage(model, route, usage, generation)
+
+
+def _observe_usage(model: str, route: str, usage: Optional[dict], generation_seconds: float):
+    if not usage:
+        return
+    prompt = usage.get("prompt_tokens") or 0
+    completion = usage.get("completion_tokens") or 0
+    if prompt:
+        LLM_TOKENS.inc(prompt, model=model, route=route, kind="prompt")
+        cached = cached_tokens(usage)
+        if cached:
+            LLM_TOKENS.inc(cached, model=model, route=route, kind="cached")
+    if completion:
+        LLM_TOKENS.inc(completion, model=model, route=route, kind="completion")
+        if generation_seconds > 0:
+            LLM_TPS.observe(completion / generation_seconds, model=model, route=route)
+
+
+def observe_error(model: str, code):
+    LLM_REQUESTS.inc(model=model, route=current_route.get(), code=str(code))
+
+
+def observe_fallback(depth: int):
+    LLM_FALLBACK_DEPTH.observe(depth, route=current_route.get())
+
+
+def observe_stream_failover(model: str, reason: str):
+    LLM_STREAM_FAILOVERS.inc(model=model, route=current_route.get(), reason=reason)
+
+
+def observe_queue_wait(lane: str, seconds: float):
+    LLM_QUEUE_WAIT.observe(seconds, lane=lane)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RouteLabelMiddleware:
+    """Pure ASGI middleware: tags LLM calls with the route that caused them."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        token = current_route.set(route_label(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
@@ -0,0 +1,167 @@
+"""
+LLM Scheduler — one admission point for every OpenRouter call.
+Bounds global and per-model concurrency so a burst of 3000-token reports
+can't starve interactive chat or trip mass 429s. Waiting requests sit in
+priority lanes (interactive > generation > background); inside a lane,
+tenants (users / teams) share slots by weighted fair queuing on the
+requested max_tokens, so one team firing ten reports doesn't block the rest.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from backend.config import LLM_MAX_CONCURRENCY, LLM_MAX_PER_MODEL, LLM_QUEUE_AGING
+from backend.services.llm_metrics import observe_queue_wait, register_gauge
+
+PRIORITIES = ("interactive", "generation", "background")
+DEFAULT_PRIORITY = "generation"
+WAIT_SAMPLES = 500            # recent wait times kept per lane for percentiles
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class LLMScheduler:
+    """Global slot pool with priority lanes and per-tenant fair queuing."""
+
+    def __init__(self, max_concurrency: int, max_per_model: int, aging: float):
+        self.max_concurrency = max_concurrency
+        self.max_per_model = max_per_model
+        self.aging = aging                     # a waiter this old jumps the lanes
+        self.in_use = 0
+        self._lanes: Dict[str, list] = {p: [] for p in PRIORITIES}   # heaps of [tag, seq, enqueued_at, future]
+        self._vtime: Dict[str, float] = {p: 0.0 for p in PRIORITIES}  # virtual clock per lane
+        self._finish: Dict[tuple, float] = {}  # (lane, tenant) → last virtual finish tag
+        self._weights: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._models: Dict[str, asyncio.Semaphore] = {}
+        self._model_in_use: Dict[str, int] = {}
+        self._waits: Dict[str, deque] = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITIES}
+        self._granted: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self._queued_total: Dict[str, int] = {p: 0 for p in PRIORITIES}
+
+    def set_weight(self, tenant: str, weight: float):
+        """Give a tenant a bigger (or smaller) share of its lane. Default weight is 1."""
+        self._weights[tenant] = max(weight, 0.01)
+
+    def _queued(self) -> int:
+        return sum(1 for lane in self._lanes.values() for entry in lane if not entry[3].done())
+
+    def _pick(self) -> Optional[tuple]:
+        heads = []
+        for p in PRIORITIES:
+            lane = self._lanes[p]
+            while lane and lane[0][3].done():   # cancelled while waiting
+                heapq.heappop(lane)
+            if lane:
+                heads.append((p, lane[0]))
+        if not heads:
+            return None
+        now = time.monotonic()
+        aged = [h for h in heads if now - h[1][2] >= self.aging]
+        lane, _ = min(aged, key=lambda h: h[1][2]) if aged else heads[0]
+        return lane, heapq.heappop(self._lanes[lane])
+
+    def _dispatch(self):
+        while self.in_use < self.max_concurrency:
+            picked = self._pick()
+            if picked is None:
+                break
+            lane, (tag, _, _, future) = picked
+            self._vtime[lane] = max(self._vtime[lane], tag)
+            self.in_use += 1
+            future.set_result(None)
+        if len(self._finish) > 1000:
+            self._finish = {k: v for k, v in self._finish.items() if v > self._vtime[k[0]]}
+
+    def _release(self):
+        self.in_use -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str = DEFAULT_PRIORITY, tenant: Optional[str] = None, cost: float = 1.0):
+        """Hold one global slot for the duration of the block (waits in line if full)."""
+        lane = priority if priority in self._lanes else DEFAULT_PRIORITY
+        start = time.monotonic()
+        if self.in_use < self.max_concurrency and not self._queued():
+            self.in_use += 1
+        else:
+            key = (lane, tenant or "anonymous")
+            tag = max(self._vtime[lane], self._finish.get(key, 0.0)) + cost / self._weights.get(key[1], 1.0)
+            self._finish[key] = tag
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._lanes[lane], [tag, next(self._seq), start, future])
+            self._queued_total[lane] += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release()   # granted and cancelled in the same tick — hand the slot on
+                raise
+        waited = time.monotonic() - start
+        self._waits[lane].append(waited)
+        observe_queue_wait(lane, waited)
+        self._granted[lane] += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def model_slot(self, model: str):
+        """Cap concurrent requests to one model (free models rate-limit per key)."""
+        sem = self._models.get(model)
+        if sem is None:
+            sem = self._models[model] = asyncio.Semaphore(self.max_per_model)
+        async with sem:
+            self._model_in_use[model] = self._model_in_use.get(model, 0) + 1
+            try:
+                yield
+            finally:
+                self._model_in_use[model] -= 1
+
+    def snapshot(self) -> Dict:
+        lanes = {}
+        for p in PRIORITIES:
+            waits = list(self._waits[p])
+            lanes[p] = {
+                "queued": sum(1 for e in self._lanes[p] if not e[3].done()),
+                "granted": self._granted[p],
+                "queued_total": self._queued_total[p],
+                "wait_avg": round(sum(waits) / len(waits), 3) if waits else None,
+                "wait_p50": round(_percentile(waits, 0.5), 3) if waits else None,
+                "wait_p95": round(_percentile(waits, 0.95), 3) if waits else None,
+                "wait_max": round(max(waits), 3) if waits else None,
+            }
+        return {
+            "in_use": self.in_use,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._queued(),
+            "lanes": lanes,
+            "max_per_model": self.max_per_model,
+            "models_in_use": {m: n for m, n in sorted(self._model_in_use.items()) if n},
+        }
+
+
+scheduler = LLMScheduler(LLM_MAX_CONCURRENCY, LLM_MAX_PER_MODEL, LLM_QUEUE_AGING)
+
+register_gauge("llm_scheduler_slots_in_use", "LLM scheduler slots currently held", (),
+               lambda: {(): scheduler.in_use})
+register_gauge("llm_scheduler_queue_depth", "Calls waiting for an LLM scheduler slot", ("lane",),
+               lambda: {(p,): lane["queued"] for p, lane in scheduler.snapshot()["lanes"].items()})
+
+
+def team_tenant(team_id: Optional[int]) -> Optional[str]:
+    return f"team:{team_id}" if team_id else None
+
+
+def user_tenant(user_id: Optional[int]) -> Optional[str]:
+    return f"user:{user_id}" if user_id else None
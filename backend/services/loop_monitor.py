@@ -0,0 +1,70 @@
+"""
+Loop Monitor — event-loop lag of the API process.
+A background task sleeps LOOP_LAG_INTERVAL seconds at a time and records how
+late it woke up. Lag is time the loop spent in code that did not yield — a
+blocking database query, a CPU-bound parse — and every other request waited
+that long. Exported as event_loop_lag_seconds at /metrics; recent
+percentiles are at GET /api/admin/llm/loop.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from backend.config import LOOP_LAG_INTERVAL
+from backend.services.llm_metrics import register_histogram
+
+LAG_SAMPLES = 2400   # ~10 min at the default interval
+
+LOOP_LAG = register_histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer (time blocked by non-yielding code)",
+    (), (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+
+_samples: deque = deque(maxlen=LAG_SAMPLES)
+_task: Optional[asyncio.Task] = None
+
+
+async def _watch(interval: float):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - start - interval)
+        _samples.append(lag)
+        LOOP_LAG.observe(lag)
+
+
+def start_loop_monitor():
+    global _task
+    if _task is None and LOOP_LAG_INTERVAL > 0:
+        _task = asyncio.ensure_future(_watch(LOOP_LAG_INTERVAL))
+
+
+async def stop_loop_monitor():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+
+def loop_lag_stats() -> Dict:
+    """Lag percentiles (ms) over the last LAG_SAMPLES wake-ups."""
+    lags = sorted(_samples)
+    if not lags:
+        return {"samples": 0, "interval": LOOP_LAG_INTERVAL}
+
+    def pct(q: float) -> float:
+        return round(lags[min(len(lags) - 1, int(q * len(lags)))] * 1000, 2)
+
+    return {
+        "samples": len(lags),
+        "interval": LOOP_LAG_INTERVAL,
+        "p50_ms": pct(0.5),
+        "p99_ms": pct(0.99),
+        "max_ms": round(lags[-1] * 1000, 2),
+        "mean_ms": round(sum(lags) / len(lags) * 1000, 2),
+    }
+
+
+def reset_loop_stats():
+    _samples.clear()
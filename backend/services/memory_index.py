@@ -0,0 +1,351 @@
+"""
+Memory Index — long-term retrieval over a user's own history.
+Every personal-chat message, note and roadmap step hint of a user goes into
+an in-memory BM25 index over hashed terms (no external service). A chat turn
+asks it for the few snippets most relevant to the new message and injects
+only those into the prompt.
+The index of a user is built on first use in a worker thread with its own
+session — the event loop never waits for it; a turn that arrives before the
+build is done just gets no recall. Commits that land while it builds are
+queued and replayed onto it before it is published, then ORM events keep it
+up to date after each commit (an edited message, note or roadmap is
+re-indexed; hints of removed steps go away). Postings are append-only arrays, so
+an insert costs O(terms) and a query only touches the postings of its terms;
+NumPy scores them when installed (it ships with openai-whisper), plain
+Python otherwise.
+"""
+import asyncio
+import math
+import re
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from backend.config import MEMORY_INDEX_USERS, MEMORY_TOP_K
+from backend.models.database import SessionLocal, PersonalChatMessage, SmartNote, ProjectRoadmap
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python scoring
+    np = None
+
+HASH_BITS = 20              # 1M term buckets; collisions are rare at per-user vocabulary sizes
+STEM_CHARS = 6              # crude stemming: Russian/Kazakh endings differ after ~6 letters
+MIN_SCORE = 1.0             # below this a snippet is noise, not memory
+SNIPPET_CHARS = 300
+BUILD_WAIT = 0.2            # a first turn waits this long for a small index, then goes without recall
+BM25_K1, BM25_B = 1.2, 0.75
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = {
+    "и", "в", "во", "на", "не", "что", "как", "это", "по", "но", "из", "за", "то", "же",
+    "мне", "мы", "вы", "ты", "он", "она", "они", "так", "для", "или", "да", "нет", "бы",
+    "the", "and", "for", "you", "are", "was", "with", "this", "that", "what", "how",
+}
+
+
+def _terms(text: str) -> List[int]:
+    words = (w.lower() for w in _WORD.findall(text or ""))
+    return [
+        zlib.crc32(w[:STEM_CHARS].encode()) & ((1 << HASH_BITS) - 1)
+        for w in words if len(w) > 1 and w not in _STOPWORDS and not w.isdigit()
+    ]
+
+
+class UserIndex:
+    """BM25 index over one user's documents."""
+
+    def __init__(self):
+        self.keys: List[Tuple[str, int, int]] = []      # doc → (kind, row id, step index)
+        self.snippets: List[str] = []
+        self.lengths = array("i")
+        self.postings: Dict[int, Tuple[array, array]] = {}   # term → (doc ids, term freqs)
+        self.positions: Dict[Tuple[str, int, int], int] = {}
+        self.removed: set = set()
+        self.total_length = 0
+
+    def add(self, key: Tuple[str, int, int], text: str):
+        if key in self.positions or not text:
+            return
+        terms = _terms(text)
+        if not terms:
+            return
+        doc = len(self.keys)
+        self.keys.append(key)
+        self.positions[key] = doc
+        self.snippets.append(text[:SNIPPET_CHARS])
+        self.lengths.append(len(terms))
+        self.total_length += len(terms)
+        counts: Dict[int, int] = {}
+        for t in terms:
+            counts[t] = counts.get(t, 0) + 1
+        for t, tf in counts.items():
+            docs, freqs = self.postings.setdefault(t, (array("i"), array("i")))
+            docs.append(doc)
+            freqs.append(tf)
+
+    def remove(self, key: Tuple[str, int, int]):
+        doc = self.positions.pop(key, None)
+        if doc is not None:
+            self.removed.add(doc)
+
+    def update(self, key: Tuple[str, int, int], text: str):
+        """Re-index an edited document (postings are append-only: the old one is tombstoned)."""
+        self.remove(key)
+        self.add(key, text)
+
+    def replace_hints(self, roadmap_id: int, docs: List[Tuple[Tuple[str, int, int], str]]):
+        """Swap every hint of a roadmap for docs — steps may have been edited, added or removed."""
+        for key in [key for key in self.positions if key[0] == "hint" and key[1] == roadmap_id]:
+            self.remove(key)
+        for key, text in docs:
+            self.add(key, text)
+
+    def search(self, query: str, k: int, skip: Optional[set] = None) -> List[Tuple[float, int]]:
+        n = len(self.keys)
+        terms = set(_terms(query))
+        if not n or not terms or k <= 0:
+            return []
+        avgdl = self.total_length / n
+        hits = [(t, self.postings[t]) for t in terms if t in self.postings]
+        if not hits:
+            return []
+        excluded = (skip or set()) | self.removed
+        if np is not None:
+            scores = np.zeros(n, dtype=np.float32)
+            lengths = np.frombuffer(self.lengths, dtype=np.int32)
+            for _, (docs, freqs) in hits:
+                d = np.frombuffer(docs, dtype=np.int32)
+                tf = np.frombuffer(freqs, dtype=np.int32).astype(np.float32)
+                idf = math.log(1 + (n - len(d) + 0.5) / (len(d) + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[d] / avgdl)
+                scores[d] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            if excluded:
+                scores[list(excluded)] = 0
+            top = np.argpartition(-scores, k - 1)[:k] if n > k else np.arange(n)
+            ranked = sorted(((float(scores[i]), int(i)) for i in top), reverse=True)
+        else:
+            acc: Dict[int, float] = {}
+            for _, (docs, freqs) in hits:
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc, tf in zip(docs, freqs):
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc] / avgdl)
+                    acc[doc] = acc.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            ranked = sorted(((s, d) for d, s in acc.items() if d not in excluded), reverse=True)[:k]
+        return [(s, d) for s, d in ranked if s >= MIN_SCORE]
+
+
+_indexes: "OrderedDict[int, UserIndex]" = OrderedDict()
+_building: Dict[int, Tuple[asyncio.Future, list]] = {}   # user → (build, changes committed meanwhile)
+_lock = threading.Lock()
+_stats = {"queries": 0, "query_seconds": 0.0, "builds": 0, "build_seconds": 0.0, "inserts": 0, "cold": 0}
+
+
+def _hint_docs(roadmap: ProjectRoadmap):
+    for i, step in enumerate(roadmap.steps or []):
+        if isinstance(step, dict) and step.get("ai_hint"):
+            yield ("hint", roadmap.id, i), f"{roadmap.title} — {step.get('title', '')}: {step['ai_hint']}"
+
+
+def _apply(index: UserIndex, op: str, key, text):
+    """One queued change: "add" / "update" / "remove" a document, or "hints" = a roadmap's hint docs."""
+    if op == "add":
+        index.add(key, text)
+    elif op == "update":
+        index.update(key, text)
+    elif op == "hints":
+        index.replace_hints(key[1], text)
+    else:
+        index.remove(key)
+
+
+def _build(user_id: int, db: Session) -> UserIndex:
+    start = time.perf_counter()
+    index = UserIndex()
+    rows = (
+        db.query(PersonalChatMessage.id, PersonalChatMessage.content)
+        .filter(PersonalChatMessage.user_id == user_id)
+        .order_by(PersonalChatMessage.id.asc())
+        .all()
+    )
+    for msg_id, content in rows:
+        index.add(("chat", msg_id, 0), content)
+    for note_id, content, summary in (
+        db.query(SmartNote.id, SmartNote.content, SmartNote.ai_summary).filter(SmartNote.user_id == user_id).all()
+    ):
+        index.add(("note", note_id, 0), summary or content)
+    for roadmap in db.query(ProjectRoadmap).filter(ProjectRoadmap.user_id == user_id).all():
+        for key, text in _hint_docs(roadmap):
+            index.add(key, text)
+    _stats["builds"] += 1
+    _stats["build_seconds"] += time.perf_counter() - start
+    return index
+
+
+def _build_and_publish(user_id: int, pending: list):
+    """Worker thread: build from the database, replay commits made meanwhile, publish."""
+    db = SessionLocal()
+    try:
+        index = _build(user_id, db)
+    except Exception as e:
+        print(f"[memory_index] build for user {user_id} failed: {e}")
+        with _lock:
+            _building.pop(user_id, None)   # the next turn tries again
+        return
+    finally:
+        db.close()
+    with _lock:
+        _building.pop(user_id, None)
+        if any(op == "drop" for op, _, _ in pending):
+            return   # a roadmap went away mid-build; the next turn rebuilds
+        for op, key, text in pending:   # add skips documents the build already read
+            _apply(index, op, key, text)
+        _indexes[user_id] = index
+        while len(_indexes) > MEMORY_INDEX_USERS:
+            _indexes.popitem(last=False)
+
+
+def _index_or_build(user_id: int) -> Tuple[Optional[UserIndex], Optional[asyncio.Future]]:
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            _indexes.move_to_end(user_id)
+            return index, None
+        if user_id not in _building:
+            # registered before the build's SELECT, so no commit can slip between the two
+            pending: list = []
+            build = asyncio.ensure_future(asyncio.to_thread(_build_and_publish, user_id, pending))
+            _building[user_id] = (build, pending)
+        return None, _building[user_id][0]
+
+
+async def recall(user_id: int, query: str, k: int = MEMORY_TOP_K,
+                 skip_chat_ids: Optional[set] = None) -> List[Dict]:
+    """
+    Top-k snippets of the user's history relevant to query (chat ids in
+    skip_chat_ids are left out). [] while the user's index is still building.
+    """
+    index, build = _index_or_build(user_id)
+    if index is None:
+        try:
+            await asyncio.wait_for(asyncio.shield(build), BUILD_WAIT)
+        except asyncio.TimeoutError:
+            _stats["cold"] += 1
+            return []
+        index, _ = _index_or_build(user_id)
+        if index is None:
+            return []
+    start = time.perf_counter()
+    with _lock:
+        skip = {index.positions[("chat", i, 0)] for i in (skip_chat_ids or ()) if ("chat", i, 0) in index.positions}
+        ranked = index.search(query, k, skip)
+        results = [
+            {"kind": index.keys[d][0], "id": index.keys[d][1], "score": round(s, 2), "text": index.snippets[d]}
+            for s, d in ranked
+        ]
+    _stats["queries"] += 1
+    _stats["query_seconds"] += time.perf_counter() - start
+    return results
+
+
+def memory_section(snippets: List[Dict]) -> str:
+    """System-prompt block with recalled snippets ("" when nothing relevant was found)."""
+    if not snippets:
+        return ""
+    labels = {"chat": "чат", "note": "заметка", "hint": "подсказка к роадмапу"}
+    lines = ["=== ИЗ ПРОШЛЫХ РАЗГОВОРОВ И ЗАМЕТОК (может быть полезно) ==="]
+    lines += [f"- [{labels.get(s['kind'], s['kind'])}] {s['text']}" for s in snippets]
+    return "\n".join(lines)
+
+
+def forget_user(user_id: int):
+    """Drop a user's index (rebuilt on next use) — for bulk deletes the ORM events can't see."""
+    with _lock:
+        _indexes.pop(user_id, None)
+        if user_id in _building:
+            _building[user_id][1].append(("drop", None, None))
+
+
+def memory_index_stats() -> Dict:
+    with _lock:
+        docs = sum(len(i.keys) - len(i.removed) for i in _indexes.values())
+    return {
+        "users": len(_indexes),
+        "building": len(_building),
+        "max_users": MEMORY_INDEX_USERS,
+        "documents": docs,
+        "numpy": np is not None,
+        "queries": _stats["queries"],
+        "avg_query_ms": round(_stats["query_seconds"] / _stats["queries"] * 1000, 3) if _stats["queries"] else None,
+        "builds": _stats["builds"],
+        "avg_build_ms": round(_stats["build_seconds"] / _stats["builds"] * 1000, 1) if _stats["builds"] else None,
+        "inserts": _stats["inserts"],
+        "cold_queries": _stats["cold"],   # answered without recall while the index was building
+    }
+
+
+# ── Incremental updates (ORM events) ──────────────────────────────────────────
+# Loaded indexes are updated in place, changes for an index being built are
+# queued for it; other users are built fresh.
+
+def _changed(obj, *attrs: str) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[a].history.has_changes() for a in attrs)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_memory_changes(session, flush_context):
+    changes = session.info.setdefault("memory_index_changes", [])
+    for obj in session.new:
+        if isinstance(obj, PersonalChatMessage) and obj.user_id:
+            changes.append(("add", obj.user_id, ("chat", obj.id, 0), obj.content))
+        elif isinstance(obj, SmartNote) and obj.user_id:
+            changes.append(("add", obj.user_id, ("note", obj.id, 0), obj.ai_summary or obj.content))
+        elif isinstance(obj, ProjectRoadmap) and obj.user_id:
+            changes.extend(("add", obj.user_id, key, text) for key, text in _hint_docs(obj))
+    for obj in session.dirty:
+        if not getattr(obj, "user_id", None):
+            continue
+        if isinstance(obj, PersonalChatMessage) and _changed(obj, "content"):
+            changes.append(("update", obj.user_id, ("chat", obj.id, 0), obj.content))
+        elif isinstance(obj, SmartNote) and _changed(obj, "content", "ai_summary"):
+            changes.append(("update", obj.user_id, ("note", obj.id, 0), obj.ai_summary or obj.content))
+        elif isinstance(obj, ProjectRoadmap) and _changed(obj, "steps", "title"):
+            changes.append(("hints", obj.user_id, ("hint", obj.id, 0), list(_hint_docs(obj))))
+    for obj in session.deleted:
+        if isinstance(obj, (PersonalChatMessage, SmartNote)) and obj.user_id:
+            kind = "chat" if isinstance(obj, PersonalChatMessage) else "note"
+            changes.append(("remove", obj.user_id, (kind, obj.id, 0), None))
+        elif isinstance(obj, ProjectRoadmap) and obj.user_id:
+            changes.append(("drop", obj.user_id, None, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_memory_changes(session):
+    changes = session.info.pop("memory_index_changes", ())
+    if not changes:
+        return
+    with _lock:
+        for op, user_id, key, text in changes:
+            index = _indexes.get(user_id)
+            if index is None:
+                if user_id in _building:
+                    _building[user_id][1].append((op, key, text))
+                continue
+            if op == "drop":
+                _indexes.pop(user_id, None)
+                continue
+            _apply(index, op, key, text)
+            if op == "add":
+                _stats["inserts"] += 1
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_memory_changes(session):
+    session.info.pop("memory_index_changes", None)
@@ -0,0 +1,218 @@
+"""
+Model Health — per-model circuit breaker and live health scoring.
+Tracks rolling error rate, latency EWMA and rate-limit reset hints for every
+OpenRouter model, so the fallback loop stops burning round-trips on models
+that have been returning 429/503 for minutes.
+"""
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from backend.services.llm_metrics import register_gauge
+
+WINDOW_SECONDS = 120          # rolling window for the error rate
+MIN_SAMPLES = 4               # don't judge a model on fewer calls than this
+ERROR_RATE_THRESHOLD = 0.5    # open the circuit at 50% errors in the window
+OPEN_SECONDS = 30             # first cool-down; doubles on failed probes
+MAX_OPEN_SECONDS = 600
+PROBE_TIMEOUT = 120           # half-open probe that never reported back
+LATENCY_ALPHA = 0.3           # EWMA smoothing for latency
+GONE_STATUSES = (404,)        # model removed from OpenRouter — long cool-down
+
+
+class ModelHealth:
+    """Health of one model: closed (ok) → open (skip) → half_open (one probe)."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.events: deque = deque()     # (timestamp, ok)
+        self.latency_ewma: Optional[float] = None
+        self.state = "closed"
+        self.open_until = 0.0
+        self.open_seconds = OPEN_SECONDS
+        self.probe_in_flight = False
+        self.probe_started_at = 0.0
+        self.last_status: Optional[int] = None
+        self.last_error_at: Optional[float] = None
+        self.successes = 0
+        self.failures = 0
+
+    def _trim(self, now: float):
+        while self.events and self.events[0][0] < now - WINDOW_SECONDS:
+            self.events.popleft()
+
+    def error_rate(self) -> float:
+        self._trim(time.time())
+        if not self.events:
+            return 0.0
+        return sum(1 for _, ok in self.events if not ok) / len(self.events)
+
+    def available(self) -> bool:
+        """True if a request may go to this model now (claims the probe when half-open)."""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.time() >= self.open_until:
+            self.state = "half_open"
+            self.probe_in_flight = False
+        if self.state == "half_open" and (
+            not self.probe_in_flight or time.time() - self.probe_started_at > PROBE_TIMEOUT
+        ):
+            # a probe that was cancelled (e.g. lost a hedge race) never reports back
+            self.probe_in_flight = True
+            self.probe_started_at = time.time()
+            return True
+        return False
+
+    def usable(self) -> bool:
+        """Closed, or cooled down enough to get a probe (no side effects)."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.time() >= self.open_until
+        return not self.probe_in_flight
+
+    def _open(self, seconds: float):
+        self.state = "open"
+        self.open_until = time.time() + min(seconds, MAX_OPEN_SECONDS)
+        self.probe_in_flight = False
+
+    def record_success(self, latency: float):
+        now = time.time()
+        self.events.append((now, True))
+        self._trim(now)
+        self.successes += 1
+        self.latency_ewma = latency if self.latency_ewma is None else (
+            LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * self.latency_ewma
+        )
+        if self.state != "closed":
+            self.events.clear()          # fresh start after a successful probe
+            self.events.append((now, True))
+        self.state = "closed"
+        self.open_seconds = OPEN_SECONDS
+        self.probe_in_flight = False
+
+    def record_failure(self, status: Optional[int], retry_after: Optional[float] = None):
+        now = time.time()
+        self.events.append((now, False))
+        self._trim(now)
+        self.failures += 1
+        self.last_status = status
+        self.last_error_at = now
+        if self.state == "half_open":
+            self.open_seconds = min(self.open_seconds * 2, MAX_OPEN_SECONDS)
+            self._open(max(self.open_seconds, retry_after or 0))
+        elif status in GONE_STATUSES:
+            self._open(MAX_OPEN_SECONDS)
+        elif retry_after:
+            self._open(retry_after)      # provider told us when the limit resets
+        elif len(self.events) >= MIN_SAMPLES and self.error_rate() >= ERROR_RATE_THRESHOLD:
+            self._open(self.open_seconds)
+
+    def score(self) -> tuple:
+        """Sort key, lower is better: error rate first, then latency (unknown = last)."""
+        latency = self.latency_ewma if self.latency_ewma is not None else float("inf")
+        return (round(self.error_rate(), 1), latency)
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        return {
+            "model": self.model,
+            "state": self.state,
+            "error_rate": round(self.error_rate(), 3),
+            "samples": len(self.events),
+            "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "open_for_seconds": round(self.open_until - now, 1) if self.state == "open" and self.open_until > now else 0,
+            "last_status": self.last_status,
+            "successes": self.successes,
+            "failures": self.failures,
+        }
+
+
+_health: Dict[str, ModelHealth] = {}
+
+
+def get_health(model: str) -> ModelHealth:
+    if model not in _health:
+        _health[model] = ModelHealth(model)
+    return _health[model]
+
+
+def record_success(model: str, latency: float):
+    get_health(model).record_success(latency)
+
+
+def record_failure(model: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+    get_health(model).record_failure(status, retry_after)
+
+
+def retry_after_from_headers(headers) -> Optional[float]:
+    """Seconds until the rate limit resets, from Retry-After or X-RateLimit-Reset (epoch ms)."""
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+    reset = headers.get("x-ratelimit-reset")
+    if reset:
+        try:
+            reset_ts = float(reset)
+            if reset_ts > 1e12:          # milliseconds
+                reset_ts /= 1000
+            return max(reset_ts - time.time(), 0.0)
+        except ValueError:
+            pass
+    return None
+
+
+def order_models(models: List[str]) -> List[str]:
+    """
+    Reorder a fallback list by live health.
+    The requested model stays first while its circuit is closed (or due for a
+    probe); the other usable models are sorted by score (stable, so the static
+    order wins without data); models with an open circuit go last.
+    """
+    if not models:
+        return []
+    primary, rest = models[0], models[1:]
+    healthy, tripped = [], []
+    for m in rest:
+        (healthy if get_health(m).usable() else tripped).append(m)
+    healthy.sort(key=lambda m: get_health(m).score())
+    if get_health(primary).usable():
+        return [primary] + healthy + tripped
+    return healthy + [primary] + tripped
+
+
+def is_available(model: str) -> bool:
+    return get_health(model).available()
+
+
+def iter_available(models: List[str]):
+    """
+    Yield the models whose circuit lets a request through, lazily (so a
+    half-open probe is only claimed when the caller actually gets to it).
+    If every circuit is open, yield the first model anyway as a last resort.
+    """
+    yielded = False
+    for m in models:
+        if is_available(m):
+            yielded = True
+            yield m
+    if not yielded and models:
+        yield models[0]
+
+
+def health_snapshot() -> List[dict]:
+    return sorted((h.to_dict() for h in _health.values()), key=lambda d: d["model"])
+
+
+register_gauge("llm_circuit_open", "1 while a model's circuit breaker is open or half-open", ("model",),
+               lambda: {(h.model,): int(h.state != "closed") for h in _health.values()})
+
+
+def reset_health(model: Optional[str] = None):
+    if model is None:
+        _health.clear()
+    else:
+        _health.pop(model, None)
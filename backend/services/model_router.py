@@ -0,0 +1,215 @@
+"""
+Model Router — picks the model for each LLM call from live latency stats.
+Callers still ask for a tier (FAST_MODEL / DEFAULT_MODEL / SMART_MODEL); the
+tier sets a quality floor, and a route with an SLO (e.g. "p95 under 8 s,
+quality ≥ mid") gets the best model predicted to meet it. Routes without an
+SLO keep the requested model. The model that answered is reported in the
+X-LLM-Model response header and in the "done" event of SSE streams.
+"""
+import json
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from backend.config import DEFAULT_MODEL, FAST_MODEL, SMART_MODEL, LLM_ROUTER_ENABLED, LLM_ROUTE_SLOS
+from backend.services.llm_metrics import current_route, register_counter
+from backend.services.model_health import get_health
+
+QUALITY = {"low": 1, "mid": 2, "high": 3}
+
+# Quality rating of the free OpenRouter models (unlisted models count as "mid")
+MODEL_QUALITY = {
+    "deepseek/deepseek-r1-0528:free": "high",
+    "openai/gpt-oss-120b:free": "high",
+    "z-ai/glm-4.5-air:free": "mid",
+    "meta-llama/llama-3.3-70b-instruct:free": "mid",
+    "nvidia/nemotron-3-nano-30b-a3b:free": "mid",
+    "upstage/solar-pro-3:free": "mid",
+    "google/gemma-3-27b-it:free": "mid",
+    "mistralai/mistral-small-3.1-24b-instruct:free": "mid",
+    "openai/gpt-oss-20b:free": "mid",
+    "arcee-ai/trinity-mini:free": "low",
+    "nvidia/nemotron-nano-12b-2-vl:free": "low",
+    "google/gemma-3-12b-it:free": "low",
+}
+
+TIERS = {FAST_MODEL: "fast", DEFAULT_MODEL: "default", SMART_MODEL: "smart"}
+TIER_FLOOR = {"fast": "low", "default": "mid", "smart": "high"}
+
+# Per-route SLOs (route labels as in /metrics; a "/stream" twin shares its endpoint's SLO).
+# p95 = full answer, ttft_p95 = first token of a stream, seconds.
+ROUTE_SLOS: Dict[str, dict] = {
+    "/api/tools/project-names": {"p95": 8, "min_quality": "mid"},
+    "/api/tools/validate-idea": {"p95": 15, "min_quality": "mid"},
+    "/api/codespace/complete": {"p95": 20, "ttft_p95": 4, "min_quality": "mid"},
+    "/api/personal-chat/message": {"p95": 12},
+    "/api/personal-chat/stream": {"ttft_p95": 3},
+}
+ROUTE_SLOS.update(json.loads(LLM_ROUTE_SLOS or "{}"))
+
+WINDOW = 50          # recent calls kept per model
+MIN_SAMPLES = 3      # fewer than this = no prediction (the model is not routed to)
+
+_samples: Dict[str, deque] = {}        # model → (ttft, duration, completion_tokens)
+_route_tokens: Dict[str, deque] = {}   # route → completion tokens of recent answers
+_decisions: Dict[tuple, int] = {}      # (route, requested, chosen) → count
+
+# Models that answered during the current HTTP request (a list shared with the
+# tasks the request spawns — hedge racers, singleflight leaders, stream pumps)
+_served: ContextVar[Optional[list]] = ContextVar("llm_served", default=None)
+
+LLM_ROUTER = register_counter(
+    "llm_router_decisions_total", "Model chosen by the router per route and requested model",
+    ("route", "requested", "chosen"))
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def observe(model: str, duration: float, ttft: Optional[float] = None, completion_tokens: int = 0):
+    """Feed one finished upstream call (ttft is None for non-streaming calls)."""
+    _samples.setdefault(model, deque(maxlen=WINDOW)).append((ttft, duration, completion_tokens))
+    served = _served.get()
+    if served is not None:
+        served.append(model)
+    if completion_tokens:
+        _route_tokens.setdefault(current_route.get(), deque(maxlen=WINDOW)).append(completion_tokens)
+
+
+def served_model() -> Optional[str]:
+    """Model that produced the latest answer in this request (None outside a request)."""
+    served = _served.get()
+    return served[-1] if served else None
+
+
+def slo_for(route: str) -> Optional[dict]:
+    if route in ROUTE_SLOS:
+        return ROUTE_SLOS[route]
+    if route.endswith("/stream"):
+        return ROUTE_SLOS.get(route[:-len("/stream")])
+    return None
+
+
+def predict(model: str, max_tokens: int, route: Optional[str] = None) -> Optional[Dict[str, float]]:
+    """Predicted p95 time to first token and to the full answer, from the model's recent calls."""
+    samples = list(_samples.get(model, ()))
+    if len(samples) < MIN_SAMPLES:
+        return None
+    ttft_p95 = _percentile([t or 0.0 for t, _, _ in samples], 0.95)
+    rates = [c / (d - (t or 0.0)) for t, d, c in samples if c and d - (t or 0.0) > 0]
+    if not rates:
+        p95 = _percentile([d for _, d, _ in samples], 0.95)
+        return {"ttft_p95": ttft_p95, "p95": p95, "tokens_per_sec": None}
+    tps = _percentile(rates, 0.5)
+    return {"ttft_p95": ttft_p95, "p95": ttft_p95 + _expected_tokens(max_tokens, route) / tps, "tokens_per_sec": tps}
+
+
+def _expected_tokens(max_tokens: int, route: Optional[str]) -> int:
+    """Typical answer length on the route (half of max_tokens until it has a few answers)."""
+    typical = list(_route_tokens.get(route or current_route.get(), ()))
+    return min(max_tokens, _percentile(typical, 0.5) if len(typical) >= MIN_SAMPLES else max_tokens // 2)
+
+
+def expected_latency(model: str, max_tokens: int, q: float, route: Optional[str] = None) -> Optional[float]:
+    """
+    q-th percentile time to a full answer on the route: each recent call of
+    the model is projected to the route's typical answer length, so slow
+    first tokens and slow generation both count (None until MIN_SAMPLES calls).
+    """
+    samples = list(_samples.get(model, ()))
+    if len(samples) < MIN_SAMPLES:
+        return None
+    expected = _expected_tokens(max_tokens, route)
+    projected = [(t or 0.0) + expected * (d - (t or 0.0)) / c for t, d, c in samples if c and d - (t or 0.0) > 0]
+    return _percentile(projected or [d for _, d, _ in samples], q)
+
+
+def _rating(model: str) -> int:
+    return QUALITY[MODEL_QUALITY.get(model, "mid")]
+
+
+def route_model(model: str, max_tokens: int, stream: bool = False) -> str:
+    """
+    Model to call for this request. The requested model wins while it meets
+    the SLO (or has no stats yet); otherwise the highest-quality model above
+    the floor that is predicted to meet it, else the fastest one above the floor.
+    """
+    route = current_route.get()
+    slo = slo_for(route)
+    if not LLM_ROUTER_ENABLED or slo is None:
+        return model
+    tier = TIERS.get(model)
+    floor = QUALITY[slo.get("min_quality") or (TIER_FLOOR[tier] if tier else MODEL_QUALITY.get(model, "mid"))]
+    key = "ttft_p95" if stream and "ttft_p95" in slo else "p95"
+    limit = slo.get(key, float("inf"))
+
+    def predicted(m: str) -> Optional[float]:
+        p = predict(m, max_tokens, route)
+        return p[key] if p else None
+
+    chosen = model
+    own = predicted(model)
+    if _rating(model) < floor or (own is not None and own > limit) or not get_health(model).usable():
+        known = [(m, p) for m in MODEL_QUALITY
+                 if _rating(m) >= floor and get_health(m).usable() and (p := predicted(m)) is not None]
+        meeting = [(m, p) for m, p in known if p <= limit]
+        if meeting:
+            chosen = max(meeting, key=lambda mp: (_rating(mp[0]), -mp[1]))[0]
+        elif known:
+            chosen = min(known, key=lambda mp: mp[1])[0]
+
+    _decisions[(route, model, chosen)] = _decisions.get((route, model, chosen), 0) + 1
+    LLM_ROUTER.inc(route=route, requested=model, chosen=chosen)
+    return chosen
+
+
+def router_snapshot() -> Dict:
+    models = {}
+    for m in sorted(set(MODEL_QUALITY) | set(_samples)):
+        p = predict(m, 1000, "")
+        models[m] = {
+            "quality": MODEL_QUALITY.get(m, "mid"),
+            "tier": TIERS.get(m),
+            "samples": len(_samples.get(m, ())),
+            "ttft_p95": round(p["ttft_p95"], 3) if p else None,
+            "tokens_per_sec": round(p["tokens_per_sec"], 1) if p and p["tokens_per_sec"] else None,
+            "p95_1k_tokens": round(p["p95"], 2) if p else None,
+        }
+    return {
+        "enabled": LLM_ROUTER_ENABLED,
+        "slos": ROUTE_SLOS,
+        "models": models,
+        "decisions": [
+            {"route": r, "requested": req, "chosen": ch, "count": n}
+            for (r, req, ch), n in sorted(_decisions.items())
+        ],
+    }
+
+
+class ServedModelMiddleware:
+    """Pure ASGI middleware: adds X-LLM-Model with the model(s) that answered the request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        served: list = []
+        token = _served.set(served)
+
+        async def send_with_model(message):
+            if message["type"] == "http.response.start" and served:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-llm-model", ",".join(dict.fromkeys(served)).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_model)
+        finally:
+            _served.reset(token)
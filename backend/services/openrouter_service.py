@@ -1,8 +1,27 @@
 import httpx
 import json
 import asyncio
+import time
+import weakref
 from typing import List, Dict, Optional, AsyncGenerator
-from backend.config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, DEFAULT_MODEL, SMART_MODEL, FAST_MODEL
+from backend.config import (
+    OPENROUTER_API_KEY, OPENROUTER_BASE_URL, DEFAULT_MODEL, SMART_MODEL, FAST_MODEL,
+    OPENROUTER_HTTP2, OPENROUTER_MAX_CONNECTIONS, OPENROUTER_MAX_KEEPALIVE,
+    OPENROUTER_KEEPALIVE_EXPIRY, OPENROUTER_CONNECT_TIMEOUT,
+    OPENROUTER_HEDGE_DELAY, OPENROUTER_HEDGE_QUANTILE, OPENROUTER_HEDGE_WIDTH, OPENROUTER_STREAM_STALL_TIMEOUT,
+)
+from backend.services.model_health import (
+    order_models, is_available, iter_available, record_success, record_failure,
+    retry_after_from_headers,
+)
+from backend.services.llm_cache import make_key, cache_get, cache_set
+from backend.services.singleflight import SingleFlight
+from backend.services.llm_scheduler import scheduler, DEFAULT_PRIORITY
+from backend.services.token_budget import fit_messages, estimate_tokens
+from backend.services.llm_metrics import (
+    observe_call, observe_stream, observe_error, observe_fallback, observe_stream_failover,
+)
+from backend.services.model_router import route_model, expected_latency, observe as observe_route
 
 # All free models to try in order when rate limited (sorted by weekly token volume)
 FREE_MODELS_FALLBACK = [
@@ -20,54 +39,312 @@ FREE_MODELS_FALLBACK = [
     "google/gemma-3-12b-it:free",                      # 58.8M tokens/week, 32K ctx
 ]
 
+# 429 = rate limit, 503/502 = server error, 404/400 = model issues — try next
+RETRYABLE_STATUSES = (429, 503, 502, 404, 400)
 
-async def _call_model(client: httpx.AsyncClient, model: str, messages, temperature, max_tokens, headers) -> str:
+# Free models that accept response_format={"type": "json_schema"}; the rest get
+# the schema in the prompt only (sending it would 400 and cascade the fallback)
+JSON_SCHEMA_MODELS = {
+    "openai/gpt-oss-120b:free",
+    "openai/gpt-oss-20b:free",
+    "meta-llama/llama-3.3-70b-instruct:free",
+    "mistralai/mistral-small-3.1-24b-instruct:free",
+}
+
+# Identical concurrent requests share one upstream call / stream
+_inflight = SingleFlight()
+
+HEADERS = {
+    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+    "Content-Type": "application/json",
+    "HTTP-Referer": "http://localhost:8000",
+    "X-Title": "AkylTeam Hackathon AI",
+}
+
+
+# ── Shared HTTP client ────────────────────────────────────────────────────────
+# One app-lifetime client so every AI call (and every fallback model) reuses
+# warm TCP+TLS connections instead of paying a fresh handshake each time.
+
+_client: Optional[httpx.AsyncClient] = None
+_seen_connections: "weakref.WeakSet" = weakref.WeakSet()
+_pool_stats = {"requests": 0, "connections_opened": 0, "http2": False}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401 — httpx needs it for HTTP/2
+        return True
+    except ImportError:
+        return False
+
+
+def _pool_connections(client: httpx.AsyncClient) -> list:
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    return list(getattr(pool, "connections", []) or [])
+
+
+async def _track_response(response: httpx.Response):
+    """Count requests and newly opened pool connections (for reuse rate)."""
+    _pool_stats["requests"] += 1
+    if _client is None:
+        return
+    for conn in _pool_connections(_client):
+        if conn not in _seen_connections:
+            _seen_connections.add(conn)
+            _pool_stats["connections_opened"] += 1
+
+
+async def open_client() -> httpx.AsyncClient:
+    """Create the shared OpenRouter client. Called from main.py on startup."""
+    global _client
+    if _client is None or _client.is_closed:
+        _pool_stats["http2"] = OPENROUTER_HTTP2 and _http2_available()
+        _client = httpx.AsyncClient(
+            http2=_pool_stats["http2"],
+            timeout=httpx.Timeout(60.0, connect=OPENROUTER_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=OPENROUTER_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENROUTER_MAX_KEEPALIVE,
+                keepalive_expiry=OPENROUTER_KEEPALIVE_EXPIRY,
+            ),
+            event_hooks={"response": [_track_response]},
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared client. Called from main.py on shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def get_client() -> httpx.AsyncClient:
+    """Return the shared client, opening it lazily (scripts, tests, workers)."""
+    if _client is None or _client.is_closed:
+        return await open_client()
+    return _client
+
+
+def get_pool_stats() -> Dict:
+    """Connection pool stats: how often requests reuse a warm connection."""
+    conns = _pool_connections(_client) if _client is not None else []
+    requests = _pool_stats["requests"]
+    opened = _pool_stats["connections_opened"]
+    return {
+        "open": _client is not None and not _client.is_closed,
+        "http2": _pool_stats["http2"],
+        "requests": requests,
+        "connections_opened": opened,
+        "reuse_rate": round(1 - opened / requests, 3) if requests else None,
+        "connections": len(conns),
+        "idle_connections": sum(1 for c in conns if c.is_idle()),
+        "max_connections": OPENROUTER_MAX_CONNECTIONS,
+        "max_keepalive": OPENROUTER_MAX_KEEPALIVE,
+    }
+
+
+async def _call_model(client: httpx.AsyncClient, model: str, messages, temperature, max_tokens, headers,
+                      response_format: Optional[Dict] = None) -> str:
     payload = {
         "model": model,
-        "messages": messages,
+        # smaller windows (e.g. 32K) get a trimmed prompt
+        "messages": fit_messages(messages, model, max_tokens),
         "temperature": temperature,
         "max_tokens": max_tokens,
     }
-    response = await client.post(
-        f"{OPENROUTER_BASE_URL}/chat/completions",
-        headers=headers,
-        json=payload,
-    )
-    response.raise_for_status()
+    if response_format and model in JSON_SCHEMA_MODELS:
+        payload["response_format"] = response_format
+    async with scheduler.model_slot(model):
+        start = time.monotonic()
+        try:
+            response = await client.post(
+                f"{OPENROUTER_BASE_URL}/chat/completions",
+                headers=headers,
+                json=payload,
+            )
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            _record_http_failure(model, e.response)
+            observe_error(model, e.response.status_code)
+            raise
+        except httpx.TransportError as e:
+            record_failure(model)
+            observe_error(model, type(e).__name__)
+            raise
+        latency = time.monotonic() - start
+        record_success(model, latency)
     data = response.json()
+    usage = data.get("usage")
+    observe_call(model, latency, usage)
+    observe_route(model, latency, completion_tokens=(usage or {}).get("completion_tokens") or 0)
     return data["choices"][0]["message"]["content"]
 
 
+def _record_http_failure(model: str, response: httpx.Response):
+    """Feed the model's circuit breaker (auth errors are ours, not the model's)."""
+    status = response.status_code
+    if status in RETRYABLE_STATUSES or status >= 500:
+        record_failure(model, status, retry_after_from_headers(response.headers))
+
+
+async def _hedged_call(
+    client: httpx.AsyncClient,
+    models_to_try: List[str],
+    messages,
+    temperature,
+    max_tokens,
+    hedge_delay: Optional[float],
+    hedge_width: int,
+    response_format: Optional[Dict] = None,
+) -> str:
+    """
+    Race the primary model against the next fallbacks.
+    A backup model is fired right away when an in-flight one fails, or when
+    the latest one stays silent past its delay: hedge_delay seconds, or by
+    default the model's observed OPENROUTER_HEDGE_QUANTILE latency for this
+    route and max_tokens (never below OPENROUTER_HEDGE_DELAY; no timed hedge
+    until the model has a few calls on record). At most 1 + hedge_width
+    models run at once; the first successful answer wins, the rest are cancelled.
+    """
+    pending = list(models_to_try)
+    in_flight: Dict[asyncio.Task, str] = {}
+    last_error: Optional[Exception] = None
+
+    def delay_for(m: str) -> Optional[float]:
+        if hedge_delay is not None:
+            return hedge_delay
+        observed = expected_latency(m, max_tokens, OPENROUTER_HEDGE_QUANTILE)
+        return max(OPENROUTER_HEDGE_DELAY, observed) if observed is not None else None
+
+    def launch():
+        # Skip models whose circuit is open; if all are, take the best one anyway
+        while pending and not is_available(pending[0]) and (in_flight or last_error or len(pending) > 1):
+            pending.pop(0)
+        if not pending:
+            return
+        m = pending.pop(0)
+        task = asyncio.create_task(_call_model(client, m, messages, temperature, max_tokens, HEADERS,
+                                               response_format))
+        in_flight[task] = m
+
+    launch()
+    try:
+        while in_flight:
+            can_hedge = bool(pending) and len(in_flight) < 1 + hedge_width
+            done, _ = await asyncio.wait(
+                in_flight,
+                timeout=delay_for(list(in_flight.values())[-1]) if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                launch()  # primary is slow — hedge with the next model
+                continue
+            for task in done:
+                m = in_flight.pop(task)
+                try:
+                    result = task.result()
+                    observe_fallback(models_to_try.index(m))
+                    return result
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code not in RETRYABLE_STATUSES:
+                        raise  # 401 = bad API key, let it propagate
+                    last_error = e
+                except httpx.TransportError as e:
+                    last_error = e  # one racer's network error shouldn't sink the others
+            # Replace failed racers with the next models in line
+            while pending and len(in_flight) < 1 + hedge_width:
+                launch()
+    finally:
+        for task in in_flight:
+            task.cancel()
+    raise last_error
+
+
+async def _complete_with_fallback(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    hedge: bool,
+    hedge_delay: Optional[float],
+    hedge_width: int,
+    response_format: Optional[Dict] = None,
+) -> str:
+    # Build list: requested model first, then all fallbacks (skip duplicates),
+    # reordered by live health so tripped models go to the back
+    models_to_try = order_models([model] + [m for m in FREE_MODELS_FALLBACK if m != model])
+
+    client = await get_client()
+    if hedge:
+        return await _hedged_call(client, models_to_try, messages, temperature, max_tokens,
+                                  hedge_delay, hedge_width, response_format)
+
+    last_error = None
+    for depth, m in enumerate(iter_available(models_to_try)):  # open circuits are skipped, no round-trip
+        try:
+            result = await _call_model(client, m, messages, temperature, max_tokens, HEADERS, response_format)
+            observe_fallback(depth)
+            return result
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in RETRYABLE_STATUSES:
+                last_error = e
+                await asyncio.sleep(0.3)
+                continue
+            raise  # 401 = bad API key, let it propagate
+        except httpx.TransportError as e:
+            last_error = e  # timeout / connect error: already counted against m's circuit, try the next model
+    raise last_error
+
+
 async def chat_completion(
     messages: List[Dict[str, str]],
     model: str = DEFAULT_MODEL,
     temperature: float = 0.7,
     max_tokens: int = 2048,
+    hedge: bool = False,
+    hedge_delay: Optional[float] = None,
+    hedge_width: int = OPENROUTER_HEDGE_WIDTH,
+    cache: bool = False,
+    cache_ttl: Optional[int] = None,
+    coalesce: bool = True,
+    priority: str = DEFAULT_PRIORITY,
+    tenant: Optional[str] = None,
+    response_format: Optional[Dict] = None,
 ) -> str:
-    """Call OpenRouter API with automatic fallback on 429."""
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "http://localhost:8000",
-        "X-Title": "AkylTeam Hackathon AI",
-    }
-    # Build list: requested model first, then all fallbacks (skip duplicates)
-    models_to_try = [model] + [m for m in FREE_MODELS_FALLBACK if m != model]
-
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        last_error = None
-        for m in models_to_try:
-            try:
-                return await _call_model(client, m, messages, temperature, max_tokens, headers)
-            except httpx.HTTPStatusError as e:
-                status = e.response.status_code
-                if status in (429, 503, 502, 404, 400):
-                    # 429 = rate limit, 503/502 = server error, 404/400 = model issues — try next
-                    last_error = e
-                    await asyncio.sleep(0.3)
-                    continue
-                raise  # 401 = bad API key, let it propagate
-        raise last_error
+    """
+    Call OpenRouter API with automatic fallback on 429.
+    hedge=True races the primary against the next fallbacks instead of
+    walking the list one model at a time (lower tail latency, more upstream
+    calls); hedge_delay=None sets the delay from the model's observed latency.
+    cache=True serves byte-identical requests from the two-tier LLM cache.
+    coalesce=True lets identical concurrent calls share one upstream request.
+    priority ("interactive" / "generation" / "background") and tenant
+    ("user:<id>" / "team:<id>") decide where the call waits in the scheduler.
+    On routes with a latency SLO the model router may serve the call from a
+    faster model of the same quality tier (see model_router.py).
+    response_format is sent to the models in JSON_SCHEMA_MODELS (see
+    structured_output.chat_completion_json for validated JSON answers).
+    """
+    key = make_key(model, messages, temperature, max_tokens, response_format)
+    if cache:
+        cached = await cache_get(key)
+        if cached is not None:
+            return cached
+
+    async def upstream() -> str:
+        async with scheduler.slot(priority, tenant, cost=max_tokens):
+            content = await _complete_with_fallback(messages, route_model(model, max_tokens), temperature,
+                                                    max_tokens, hedge, hedge_delay, hedge_width, response_format)
+        if cache:
+            await cache_set(key, model, content, cache_ttl)
+        return content
+
+    if coalesce:
+        return await _inflight.do(key, upstream)
+    return await upstream()
 
 
 async def stream_chat_completion(
@@ -75,57 +352,206 @@ async def stream_chat_completion(
     model: str = DEFAULT_MODEL,
     temperature: float = 0.7,
     max_tokens: int = 2048,
+    coalesce: bool = True,
+    priority: str = DEFAULT_PRIORITY,
+    tenant: Optional[str] = None,
+    cache: bool = False,
+    cache_ttl: Optional[int] = None,
 ) -> AsyncGenerator[str, None]:
-    """Stream chat completion with fallback on 429."""
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "http://localhost:8000",
-        "X-Title": "AkylTeam Hackathon AI",
-    }
-    models_to_try = [model] + [m for m in FREE_MODELS_FALLBACK if m != model]
+    """
+    Stream chat completion with fallback on 429.
+    coalesce=True fans identical concurrent streams out from one upstream stream.
+    cache=True shares the LLM cache with chat_completion: a hit is yielded as a
+    single chunk, a stream that ran to the end is stored.
+    The scheduler slot is held until the stream ends.
+    """
+    key = make_key(model, messages, temperature, max_tokens)
+    if cache:
+        cached = await cache_get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    def upstream():
+        return _scheduled_stream(messages, model, temperature, max_tokens, priority, tenant)
+
+    chunks = []
+    source = _inflight.stream("stream:" + key, upstream) if coalesce else upstream()
+    async for text in source:
+        chunks.append(text)
+        yield text
+    if cache:
+        await cache_set(key, model, "".join(chunks), cache_ttl)
+
+
+async def _scheduled_stream(messages, model, temperature, max_tokens, priority, tenant) -> AsyncGenerator[str, None]:
+    async with scheduler.slot(priority, tenant, cost=max_tokens):
+        routed = route_model(model, max_tokens, stream=True)
+        async for text in _stream_with_fallback(messages, routed, temperature, max_tokens):
+            yield text
 
-    for m in models_to_try:
+
+def get_inflight_stats() -> Dict:
+    return _inflight.snapshot()
+
+
+class StreamInterrupted(Exception):
+    """A streaming response stalled, dropped or ended without finishing."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"stream {reason}")
+        self.reason = reason
+
+
+async def _next_line(lines, timeout: float) -> Optional[str]:
+    """Next SSE line, None at the end of the body; StreamInterrupted if nothing arrives in time."""
+    try:
+        return await asyncio.wait_for(lines.__anext__(), timeout)
+    except StopAsyncIteration:
+        return None
+    except asyncio.TimeoutError:
+        raise StreamInterrupted("stall")
+    except httpx.TransportError:
+        raise StreamInterrupted("disconnect")
+
+
+def _continuation(messages: List[Dict[str, str]], emitted: str) -> List[Dict[str, str]]:
+    """Prompt that makes the next model carry on from the text already sent to the client."""
+    if not emitted:
+        return messages
+    return messages + [{"role": "assistant", "content": emitted}]
+
+
+def _strip_restart(prefix: str):
+    """
+    Filter for a continuation's chunks: some models ignore the assistant prefix
+    and start the answer over — hold text back while it repeats the prefix and
+    drop it if the whole prefix comes back; release it on the first mismatch.
+    """
+    state = {"matched": 0, "held": [], "done": not prefix}
+
+    def feed(text: str) -> str:
+        if state["done"]:
+            return text
+        rest = prefix[state["matched"]:]
+        if rest.startswith(text):
+            state["matched"] += len(text)
+            state["held"].append(text)
+            if state["matched"] == len(prefix):
+                state["done"], state["held"] = True, []
+            return ""
+        if text.startswith(rest):        # prefix repeated, new text follows
+            state["done"] = True
+            return text[len(rest):]
+        state["done"] = True
+        held, state["held"] = "".join(state["held"]), []
+        return held + text
+
+    return feed
+
+
+async def _stream_with_fallback(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: float,
+    max_tokens: int,
+) -> AsyncGenerator[str, None]:
+    """
+    Stream from the first healthy model. If a stream stalls for
+    OPENROUTER_STREAM_STALL_TIMEOUT, drops, or ends without finishing, the next
+    model continues it: the text already emitted is sent as an assistant prefix
+    so the client sees one uninterrupted answer.
+    """
+    models_to_try = order_models([model] + [m for m in FREE_MODELS_FALLBACK if m != model])
+    emitted: List[str] = []       # across models — what the client has already received
+    interrupted: Optional[StreamInterrupted] = None
+
+    for depth, m in enumerate(iter_available(models_to_try)):
+        sent = "".join(emitted)
+        budget = max(max_tokens - estimate_tokens(sent), 64)
         payload = {
             "model": m,
-            "messages": messages,
+            "messages": fit_messages(_continuation(messages, sent), m, budget),
             "temperature": temperature,
-            "max_tokens": max_tokens,
+            "max_tokens": budget,
             "stream": True,
+            "stream_options": {"include_usage": True},  # final chunk carries token counts
         }
         try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                async with client.stream(
-                    "POST",
-                    f"{OPENROUTER_BASE_URL}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                ) as response:
-                    if response.status_code in (429, 503, 502, 404, 400):
-                        await asyncio.sleep(0.3)
-                        continue  # try next model
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if not line.strip():
-                            continue
-                        if line.startswith("data: "):
-                            line = line[6:]
-                        if line == "[DONE]":
-                            return
-                        try:
-                            chunk = json.loads(line)
-                            delta = chunk["choices"][0].get("delta", {})
-                            text = delta.get("content", "")
-                            if text:
-                                yield text
-                        except (json.JSONDecodeError, KeyError, IndexError):
-                            continue
-                    return  # success — stop trying other models
+            client = await get_client()
+            start = time.monotonic()
+            async with scheduler.model_slot(m), client.stream(
+                "POST",
+                f"{OPENROUTER_BASE_URL}/chat/completions",
+                headers=HEADERS,
+                json=payload,
+                timeout=120.0,
+            ) as response:
+                if response.status_code in RETRYABLE_STATUSES:
+                    _record_http_failure(m, response)
+                    observe_error(m, response.status_code)
+                    await asyncio.sleep(0.3)
+                    continue  # try next model
+                response.raise_for_status()
+                record_success(m, time.monotonic() - start)
+                if interrupted is None:
+                    observe_fallback(depth)
+                ttft, usage, finished, own = None, None, False, []
+                feed = _strip_restart(sent)
+                lines = response.aiter_lines()
+                while (line := await _next_line(lines, OPENROUTER_STREAM_STALL_TIMEOUT)) is not None:
+                    if not line.strip() or line.startswith(":"):
+                        continue  # blank line / SSE comment ("OPENROUTER PROCESSING")
+                    if line.startswith("data: "):
+                        line = line[6:]
+                    if line == "[DONE]":
+                        finished = True
+                        break
+                    try:
+                        chunk = json.loads(line)
+                        usage = chunk.get("usage") or usage
+                        if not chunk.get("choices"):
+                            continue  # usage-only chunk
+                        choice = chunk["choices"][0]
+                        finished = finished or bool(choice.get("finish_reason"))
+                        text = feed(choice.get("delta", {}).get("content") or "")
+                        if text:
+                            if ttft is None:
+                                ttft = time.monotonic() - start
+                            own.append(text)
+                            emitted.append(text)
+                            yield text
+                    except (json.JSONDecodeError, KeyError, IndexError):
+                        continue
+                if not finished:
+                    raise StreamInterrupted("truncated")
+                duration = time.monotonic() - start
+                completion = (usage or {}).get("completion_tokens") or estimate_tokens("".join(own))
+                observe_stream(m, ttft, duration, usage, completion_estimate=completion)
+                observe_route(m, duration, ttft, completion)
+                return  # success — stop trying other models
+        except StreamInterrupted as e:
+            record_failure(m)
+            observe_error(m, e.reason)
+            observe_stream_failover(m, e.reason)
+            interrupted = e
+            continue
         except httpx.HTTPStatusError as e:
-            if e.response.status_code in (429, 503, 502, 404, 400):
+            _record_http_failure(m, e.response)
+            observe_error(m, e.response.status_code)
+            if e.response.status_code in RETRYABLE_STATUSES:
                 await asyncio.sleep(0.3)
                 continue
             raise
+        except httpx.TransportError as e:
+            record_failure(m)
+            observe_error(m, type(e).__name__)
+            if interrupted is None and not emitted:
+                raise  # could not even start: surface it like before
+            observe_stream_failover(m, "disconnect")
+            interrupted = StreamInterrupted("disconnect")
+    if interrupted is not None:
+        raise interrupted  # every model failed after the answer had started
 
 
 async def get_available_models() -> List[Dict]:
@@ -133,12 +559,12 @@ async def get_available_models() -> List[Dict]:
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
     }
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.get(f"{OPENROUTER_BASE_URL}/models", headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        free_models = [m for m in data.get("data", []) if ":free" in m.get("id", "")]
-        return free_models
+    client = await get_client()
+    response = await client.get(f"{OPENROUTER_BASE_URL}/models", headers=headers, timeout=30.0)
+    response.raise_for_status()
+    data = response.json()
+    free_models = [m for m in data.get("data", []) if ":free" in m.get("id", "")]
+    return free_models
 
 
 SYSTEM_PROMPTS = {
@@ -0,0 +1,46 @@
+"""
+Prompt Layout — order prompts so providers can reuse a cached prefix.
+OpenRouter providers that support it cache the longest prompt prefix they
+have seen recently, automatically; a cached prefix is not re-processed,
+which shortens time to first token. Any byte that changes early in the
+prompt throws that away, so builders lay prompts out as:
+  1. system prompt: static persona and instructions — identical for every call,
+     then semi-static context (profile, memory)      — changes now and then
+  2. earlier turns                                   — grow append-only
+  3. user: volatile context (search, recall) + the new message
+Cached-token counts from `usage` land in llm_tokens_total{kind="cached"} and
+llm_ttft_by_prompt_cache_seconds (see llm_metrics.py). Explicit
+cache_control breakpoints are an Anthropic / Gemini feature that none of the
+models in FREE_MODELS_FALLBACK takes, so none are sent.
+"""
+from typing import Dict, List, Tuple
+
+from backend.services.token_budget import join_sections
+
+VOLATILE_SEPARATOR = "\n\n---\n\n"
+
+
+def layout_messages(
+    static: str,
+    semi_static: List[Tuple[int, str]],
+    history: List[Dict[str, str]],
+    volatile: List[Tuple[int, str]],
+    message: str,
+    budget: int,
+) -> List[Dict[str, str]]:
+    """
+    Messages in cache-friendly order. semi_static / volatile are (priority,
+    text) sections as for join_sections; the system part gets half of budget,
+    volatile context a quarter, history and the message whatever is left
+    (trim the result with fit_messages).
+    """
+    system = join_sections([(0, static)] + list(semi_static), budget // 2)
+    context = join_sections(list(volatile), budget // 4)
+    turn = context + VOLATILE_SEPARATOR + message if context else message
+    return [{"role": "system", "content": system}] + list(history) + [{"role": "user", "content": turn}]
+
+
+def cached_tokens(usage: Dict) -> int:
+    """Prompt tokens served from the provider's prefix cache, as reported in usage."""
+    details = usage.get("prompt_tokens_details") or {}
+    return int(details.get("cached_tokens") or usage.get("cache_read_input_tokens") or 0)
@@ -0,0 +1,108 @@
+"""
+Singleflight — coalesce identical in-flight LLM calls.
+When 30 students open the same olympiad topic at once, concurrent callers
+with the same key await one upstream call and share its result; streaming
+subscribers fan out from one upstream stream. Independent of the cache:
+it helps even with caching disabled.
+"""
+import asyncio
+from contextlib import aclosing
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+
+
+class StreamFanout:
+    """One upstream stream, many subscribers; late joiners replay what was already sent."""
+
+    def __init__(self, source: AsyncGenerator[str, None], on_done: Callable[[], None]):
+        self.chunks: List[str] = []
+        self.done = False
+        self.closed = False   # last subscriber left; no longer joinable
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Condition()
+        self._on_done = on_done
+        self._task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncGenerator[str, None]):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                async with self._changed:
+                    self._changed.notify_all()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._on_done()
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        self.subscribers += 1
+        sent = 0
+        try:
+            while True:
+                while sent < len(self.chunks):
+                    yield self.chunks[sent]
+                    sent += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                async with self._changed:
+                    await self._changed.wait_for(lambda: sent < len(self.chunks) or self.done)
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                # everyone left — stop paying for the upstream stream; unregister
+                # first so a caller arriving now starts a fresh fanout
+                self.closed = True
+                self._on_done()
+                self._task.cancel()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, StreamFanout] = {}
+        self.stats = {"calls": 0, "coalesced": 0, "streams": 0, "stream_joins": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        """Run fn() once per key at a time; concurrent callers share the result."""
+        task = self._calls.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["calls"] += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._calls.pop(key, None) if self._calls.get(key) is t else None)
+        # shield: one caller disconnecting must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, factory: Callable[[], AsyncGenerator[str, None]]) -> AsyncGenerator[str, None]:
+        """Subscribe to the in-flight stream for key, starting it if needed."""
+        fanout = self._streams.get(key)
+        if fanout is not None and not fanout.done and not fanout.closed:
+            self.stats["stream_joins"] += 1
+        else:
+            self.stats["streams"] += 1
+            fanout = StreamFanout(
+                factory(),
+                on_done=lambda: self._streams.pop(key, None) if self._streams.get(key) is fanout else None,
+            )
+            self._streams[key] = fanout
+        # aclosing: a caller that leaves unsubscribes now, not when the generator is collected
+        async with aclosing(fanout.subscribe()) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "in_flight_calls": len(self._calls),
+            "in_flight_streams": len(self._streams),
+            "stream_subscribers": sum(f.subscribers for f in self._streams.values()),
+        }
@@ -0,0 +1,128 @@
+"""
+SSE Service — one streaming layer for every AI generation endpoint.
+stream_llm() turns a prompt into a Server-Sent Events response fed by
+stream_chat_completion, so the user sees the first token instead of a spinner.
+Event format (same as /api/personal-chat/stream):
+  data: {"token": "..."}                   — one per chunk
+  data: {"done": true, "model": ..., ...}  — final event; served model + on_complete's extras
+  data: {"error": "..."}                   — the stream failed
+  : keep-alive                             — comment sent while no token arrives
+stream_events() does the same for producers of whole JSON items (e.g. one
+event per agent of a multi-agent discussion).
+"""
+import asyncio
+import inspect
+import json
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
+
+from fastapi.responses import StreamingResponse
+
+from backend.config import SSE_HEARTBEAT_SECONDS
+from backend.services.openrouter_service import stream_chat_completion
+from backend.services.model_router import served_model
+
+OnComplete = Callable[[str], Union[Optional[dict], Awaitable[Optional[dict]]]]
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+    "Access-Control-Allow-Origin": "*",
+}
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _with_heartbeat(tokens: AsyncIterator[str], heartbeat: float) -> AsyncIterator[Optional[str]]:
+    """Yield tokens as they come and None whenever `heartbeat` seconds pass without one."""
+    it = tokens.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(it.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=heartbeat)
+            if not done:
+                yield None
+                continue
+            task, pending = pending, None
+            try:
+                token = task.result()
+            except StopAsyncIteration:
+                return
+            yield token
+    finally:
+        if pending is not None:   # client went away mid-token
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        if hasattr(it, "aclose"):
+            await it.aclose()
+
+
+def stream_sse(
+    tokens: AsyncIterator[str],
+    on_complete: Optional[OnComplete] = None,
+    meta: Optional[dict] = None,
+    heartbeat: float = SSE_HEARTBEAT_SECONDS,
+) -> StreamingResponse:
+    """
+    Wrap a token iterator into an SSE response.
+    on_complete(full_text) runs after the last token (persist the answer there);
+    a dict it returns is merged, with meta, into the final "done" event.
+    """
+    async def generator():
+        chunks: List[str] = []
+        try:
+            async for token in _with_heartbeat(tokens, heartbeat):
+                if token is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                chunks.append(token)
+                yield sse_event({"token": token})
+            extra = on_complete("".join(chunks)) if on_complete else None
+            if inspect.isawaitable(extra):
+                extra = await extra
+            served = {"model": served_model()} if served_model() else {}
+            yield sse_event({"done": True, **served, **(meta or {}), **(extra or {})})
+        except Exception as e:
+            yield sse_event({"error": str(e) or type(e).__name__})
+
+    return StreamingResponse(generator(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def stream_events(
+    items: AsyncIterator[dict],
+    on_complete: Optional[Callable[[List[dict]], Optional[dict]]] = None,
+    heartbeat: float = SSE_HEARTBEAT_SECONDS,
+) -> StreamingResponse:
+    """
+    SSE response with one `data:` event per item as it is produced;
+    on_complete(all_items) may add extras to the final "done" event.
+    """
+    async def generator():
+        received: List[dict] = []
+        try:
+            async for item in _with_heartbeat(items, heartbeat):
+                if item is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                received.append(item)
+                yield sse_event(item)
+            extra = on_complete(received) if on_complete else None
+            yield sse_event({"done": True, **(extra or {})})
+        except Exception as e:
+            yield sse_event({"error": str(e) or type(e).__name__})
+
+    return StreamingResponse(generator(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def stream_llm(
+    messages: List[Dict[str, str]],
+    on_complete: Optional[OnComplete] = None,
+    meta: Optional[dict] = None,
+    **kwargs,
+) -> StreamingResponse:
+    """SSE twin of `await chat_completion(messages, **kwargs)` (model, max_tokens, cache, priority…)."""
+    return stream_sse(stream_chat_completion(messages, **kwargs), on_complete, meta)
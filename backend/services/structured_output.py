@@ -0,0 +1,236 @@
+"""
+Structured Output — JSON answers that are validated instead of silently dropped.
+chat_completion_json() asks for a JSON schema (or a pydantic model) — in the
+prompt, and as `response_format` for JSON_SCHEMA_MODELS — parses the reply tolerantly
+(markdown fences, <think> blocks, trailing commas, single quotes…) and only
+when that truly fails asks FAST_MODEL once to repair the output.
+Parse outcomes are counted per call site (GET /api/admin/llm/structured, /metrics).
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel, ValidationError
+
+from backend.config import DEFAULT_MODEL, FAST_MODEL
+from backend.services.llm_metrics import register_counter
+from backend.services.openrouter_service import chat_completion
+
+Schema = Union[Dict[str, Any], Type[BaseModel]]
+
+LLM_STRUCTURED = register_counter(
+    "llm_structured_output_total", "Structured-output parse outcomes per call site",
+    ("call_site", "outcome"))
+
+OUTCOMES = ("parsed", "repaired", "retried", "failed")
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+class StructuredOutputError(ValueError):
+    """The model's answer could not be turned into the requested structure."""
+
+
+def _record(call_site: str, outcome: str):
+    site = _stats.setdefault(call_site, {o: 0 for o in OUTCOMES})
+    site[outcome] += 1
+    LLM_STRUCTURED.inc(call_site=call_site, outcome=outcome)
+
+
+def structured_stats() -> Dict[str, Dict]:
+    result = {}
+    for site, counts in sorted(_stats.items()):
+        total = sum(counts.values())
+        result[site] = {
+            **counts,
+            "calls": total,
+            "first_try_rate": round((counts["parsed"] + counts["repaired"]) / total, 3) if total else None,
+            "success_rate": round((total - counts["failed"]) / total, 3) if total else None,
+        }
+    return result
+
+
+# ── Schemas ───────────────────────────────────────────────────────────────────
+
+def json_schema_of(schema: Schema) -> Dict[str, Any]:
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return schema.model_json_schema()
+    return schema
+
+
+def response_format_for(schema: Schema, name: str = "result") -> Dict[str, Any]:
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": re.sub(r"[^a-zA-Z0-9_-]", "_", name)[:64], "strict": False,
+                        "schema": json_schema_of(schema)},
+    }
+
+
+_TYPES = {
+    "object": dict, "array": list, "string": str, "boolean": bool,
+    "integer": int, "number": (int, float), "null": type(None),
+}
+
+
+def _check(data: Any, schema: Dict[str, Any], path: str = "$"):
+    """Minimal JSON-schema check: type, required, properties, items, enum, min/max."""
+    expected = schema.get("type")
+    if expected:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(isinstance(data, _TYPES[t]) and not (t in ("integer", "number") and isinstance(data, bool))
+                   for t in types if t in _TYPES):
+            raise StructuredOutputError(f"{path}: expected {expected}, got {type(data).__name__}")
+    if "enum" in schema and data not in schema["enum"]:
+        raise StructuredOutputError(f"{path}: {data!r} not in {schema['enum']}")
+    if isinstance(data, (int, float)) and not isinstance(data, bool):
+        if "minimum" in schema and data < schema["minimum"]:
+            raise StructuredOutputError(f"{path}: {data} < {schema['minimum']}")
+        if "maximum" in schema and data > schema["maximum"]:
+            raise StructuredOutputError(f"{path}: {data} > {schema['maximum']}")
+    if isinstance(data, dict):
+        for key in schema.get("required", []):
+            if key not in data:
+                raise StructuredOutputError(f"{path}: missing '{key}'")
+        for key, sub in schema.get("properties", {}).items():
+            if key in data:
+                _check(data[key], sub, f"{path}.{key}")
+    if isinstance(data, list) and isinstance(schema.get("items"), dict):
+        for i, item in enumerate(data):
+            _check(item, schema["items"], f"{path}[{i}]")
+
+
+def validate(data: Any, schema: Schema):
+    """Return data as the schema's type (pydantic instance or checked JSON)."""
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        try:
+            return schema.model_validate(data)
+        except ValidationError as e:
+            raise StructuredOutputError(str(e)) from e
+    _check(data, schema)
+    return data
+
+
+# ── Tolerant parsing ──────────────────────────────────────────────────────────
+
+_THINK = re.compile(r"<think>.*?</think>", re.DOTALL | re.IGNORECASE)
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"', "«": '"', "»": '"', "‘": "'", "’": "'"})
+
+
+def _balanced_json(text: str) -> Optional[str]:
+    """First complete {...} or [...] in text (string-aware)."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    stack, in_str, escaped = [], False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack.pop() != ch:
+                return None
+            if not stack:
+                return text[start:i + 1]
+    # truncated (max_tokens hit): close what is still open
+    if in_str:
+        text += '"'
+    return text[start:] + "".join(reversed(stack))
+
+
+def _repairs(candidate: str):
+    yield candidate
+    fixed = _TRAILING_COMMA.sub(r"\1", candidate.translate(_SMART_QUOTES))
+    yield fixed
+    fixed = re.sub(r"\bTrue\b", "true", re.sub(r"\bFalse\b", "false", re.sub(r"\bNone\b", "null", fixed)))
+    yield fixed
+    if '"' not in fixed:
+        yield fixed.replace("'", '"')
+    yield re.sub(r"([{,]\s*)([A-Za-z_][A-Za-z0-9_]*)(\s*:)", r'\1"\2"\3', fixed)  # unquoted keys
+
+
+def parse_json(text: str) -> tuple:
+    """
+    Parse JSON out of an LLM reply. Returns (data, repaired) where repaired
+    says whether anything beyond json.loads was needed; raises StructuredOutputError.
+    """
+    try:
+        return json.loads(text), False
+    except (json.JSONDecodeError, TypeError):
+        pass
+    text = _THINK.sub("", text or "").strip()
+    fence = _FENCE.search(text)
+    candidates = [fence.group(1).strip()] if fence else []
+    balanced = _balanced_json(fence.group(1) if fence else text)
+    if balanced:
+        candidates.append(balanced)
+    for candidate in candidates:
+        for attempt in _repairs(candidate):
+            try:
+                return json.loads(attempt), True
+            except json.JSONDecodeError:
+                continue
+    raise StructuredOutputError("no parseable JSON in the model reply")
+
+
+# ── Entry point ───────────────────────────────────────────────────────────────
+
+def _with_schema_hint(messages: List[Dict[str, str]], schema: Schema) -> List[Dict[str, str]]:
+    hint = ("Reply with JSON only — no markdown, no explanations — matching this JSON schema:\n"
+            + json.dumps(json_schema_of(schema), ensure_ascii=False))
+    if messages and messages[0].get("role") == "system":
+        return [{**messages[0], "content": messages[0]["content"] + "\n\n" + hint}] + messages[1:]
+    return [{"role": "system", "content": hint}] + messages
+
+
+async def chat_completion_json(
+    messages: List[Dict[str, str]],
+    schema: Schema,
+    call_site: str,
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.2,
+    max_tokens: int = 512,
+    **kwargs,
+):
+    """
+    chat_completion that returns validated structured data.
+    schema is a JSON schema dict or a pydantic model class (then an instance is returned).
+    One cheap repair call on FAST_MODEL is made only if the reply can't be parsed;
+    raises StructuredOutputError if that fails too.
+    """
+    prompt = _with_schema_hint(messages, schema)
+    raw = await chat_completion(prompt, model=model, temperature=temperature, max_tokens=max_tokens,
+                                response_format=response_format_for(schema, call_site), **kwargs)
+    try:
+        data, repaired = parse_json(raw)
+        result = validate(data, schema)
+        _record(call_site, "repaired" if repaired else "parsed")
+        return result
+    except StructuredOutputError as e:
+        error = e
+
+    repair_prompt = [
+        {"role": "system", "content": "You fix malformed JSON. Output only the corrected JSON."},
+        {"role": "user", "content": f"Schema:\n{json.dumps(json_schema_of(schema), ensure_ascii=False)}\n\n"
+                                    f"Error: {error}\n\nBroken output:\n{raw[:4000]}"},
+    ]
+    try:
+        fixed = await chat_completion(repair_prompt, model=FAST_MODEL, temperature=0.0, max_tokens=max_tokens,
+                                      response_format=response_format_for(schema, call_site),
+                                      priority=kwargs.get("priority", "background"), tenant=kwargs.get("tenant"))
+        result = validate(parse_json(fixed)[0], schema)
+    except Exception:
+        _record(call_site, "failed")
+        raise
+    _record(call_site, "retried")
+    return result
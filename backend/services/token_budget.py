@@ -0,0 +1,156 @@
+"""
+Token Budget — estimate prompt size and trim it to fit a model.
+Chat endpoints append raw history plus the build_user_context block without
+knowing how big the prompt is; here every fallback model gets its context
+window and output reservation, and prompts are trimmed by priority
+(oldest history first, then low-priority system sections) before sending.
+Uses tiktoken when installed, otherwise a chars-per-token approximation
+calibrated separately for Cyrillic and Latin text.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # not installed, or no cached encoding offline
+    _ENCODING = None
+
+# Context windows of the models in FREE_MODELS_FALLBACK (tokens)
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "z-ai/glm-4.5-air:free": 131_072,
+    "deepseek/deepseek-r1-0528:free": 163_840,
+    "nvidia/nemotron-3-nano-30b-a3b:free": 256_000,
+    "openai/gpt-oss-120b:free": 131_072,
+    "upstage/solar-pro-3:free": 128_000,
+    "arcee-ai/trinity-mini:free": 131_072,
+    "nvidia/nemotron-nano-12b-2-vl:free": 128_000,
+    "meta-llama/llama-3.3-70b-instruct:free": 128_000,
+    "openai/gpt-oss-20b:free": 131_072,
+    "google/gemma-3-27b-it:free": 131_072,
+    "mistralai/mistral-small-3.1-24b-instruct:free": 128_000,
+    "google/gemma-3-12b-it:free": 32_768,
+}
+DEFAULT_CONTEXT_WINDOW = 32_768
+SAFETY_MARGIN = 256           # estimator error + provider-side template tokens
+MESSAGE_OVERHEAD = 4          # role / separators per chat message
+CHARS_PER_TOKEN_LATIN = 4.0   # calibrated on cl100k for English / code
+CHARS_PER_TOKEN_CYRILLIC = 2.3  # Russian / Kazakh split into many more tokens
+TRIM_MARKER = "\n…[сокращено]…\n"
+COUNT_CACHE_SIZE = 4096       # token counts of recent long texts, keyed by digest (the texts aren't kept)
+COUNT_CACHE_MIN_CHARS = 512   # shorter texts are cheaper to encode than to hash
+
+_counts: "OrderedDict[bytes, int]" = OrderedDict()
+_counts_lock = threading.Lock()
+
+
+def _count(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    cyrillic = sum(1 for ch in text if "Ѐ" <= ch <= "ӿ")
+    return int(cyrillic / CHARS_PER_TOKEN_CYRILLIC + (len(text) - cyrillic) / CHARS_PER_TOKEN_LATIN) + 1
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count of text (exact with tiktoken, ±10% otherwise)."""
+    if not text:
+        return 0
+    if len(text) < COUNT_CACHE_MIN_CHARS:
+        return _count(text)
+    key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    with _counts_lock:
+        n = _counts.get(key)
+        if n is not None:
+            _counts.move_to_end(key)
+            return n
+    n = _count(text)
+    with _counts_lock:
+        _counts[key] = n
+        if len(_counts) > COUNT_CACHE_SIZE:
+            _counts.popitem(last=False)
+    return n
+
+
+def message_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD for m in messages) + 2
+
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def prompt_budget(model: str, max_tokens: int, cap: Optional[int] = None) -> int:
+    """Tokens left for the prompt once the answer (max_tokens) is reserved."""
+    budget = context_window(model) - max_tokens - SAFETY_MARGIN
+    return min(budget, cap) if cap else budget
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Keep the head and tail of text within max_tokens (the middle goes)."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    ratio = max_tokens / estimate_tokens(text)
+    keep = max(int(len(text) * ratio) - len(TRIM_MARKER), 0)
+    head = keep * 2 // 3
+    return text[:head] + TRIM_MARKER + text[len(text) - (keep - head):] if keep else ""
+
+
+def join_sections(sections: List[Tuple[int, str]], budget: int, sep: str = "\n\n") -> str:
+    """
+    Join prompt sections (priority, text) in their given order, fitting budget.
+    Lower priority number = more important; the least important sections are
+    shortened first, then dropped.
+    """
+    kept = {i: text for i, (_, text) in enumerate(sections) if text}
+    by_importance = sorted(kept, key=lambda i: sections[i][0], reverse=True)
+    for i in by_importance:
+        total = sum(estimate_tokens(t) for t in kept.values())
+        if total <= budget:
+            break
+        room = budget - (total - estimate_tokens(kept[i]))
+        if room < 32:
+            kept.pop(i)
+        else:
+            kept[i] = truncate_text(kept[i], room)
+    return sep.join(kept[i] for i in sorted(kept))
+
+
+def fit_messages(
+    messages: List[Dict[str, str]],
+    model: str,
+    max_tokens: int,
+    cap: Optional[int] = None,
+) -> List[Dict[str, str]]:
+    """
+    Trim a chat prompt to the model's budget: drop the oldest history turns
+    first, then shorten the longest remaining turns, then the system prompt.
+    The system prompt and the last message are always kept.
+    Returns the original list when it already fits.
+    """
+    budget = prompt_budget(model, max_tokens, cap)
+    if message_tokens(messages) <= budget:
+        return messages
+
+    head = [m for m in messages[:1] if m.get("role") == "system"]
+    last = messages[-1:] if len(messages) > len(head) else []   # a lone system message is head, not also last
+    history = list(messages[len(head):-1]) if len(messages) > len(head) else []
+    while history and message_tokens(head + history + last) > budget:
+        history.pop(0)
+    result = head + history + last
+    if message_tokens(result) <= budget:
+        return result
+
+    # Still too big: a few huge turns (pasted code, long system context)
+    result = [dict(m) for m in result]
+    while message_tokens(result) > budget:
+        overflow = message_tokens(result) - budget
+        longest = max(range(len(result)), key=lambda i: estimate_tokens(result[i]["content"] or ""))
+        size = estimate_tokens(result[longest]["content"] or "")
+        if size <= 32:
+            break
+        result[longest]["content"] = truncate_text(result[longest]["content"], max(size - overflow - 8, size // 2))
+    return result
@@ -3,13 +3,116 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
+# The database check runs on a throwaway SQLite file, or with --postgres on a throwaway
+# local PostgreSQL (needs `pip install pgserver`); set DATABASE_URL to check your own server
+if not os.getenv("DATABASE_URL"):
+    import tempfile
+    _tmp = tempfile.mkdtemp(prefix="akyl-check-")
+    if "--postgres" in sys.argv:
+        import pgserver
+        _pg = pgserver.get_server(_tmp, cleanup_mode="delete")
+        os.environ["DATABASE_URL"] = _pg.get_uri()
+    else:
+        os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/check.db"
+
+
+def check_database():
+    """Migrate the schema to head and round-trip a row through the sync and the async session."""
+    import asyncio
+    from sqlalchemy import select
+    from backend.models.database import SessionLocal, AsyncSessionLocal, engine, User
+    from backend.models.migrations import migrate, current_version, HEAD
+
+    migrate()
+    assert current_version(engine) == HEAD and migrate()["applied"] == []
+    db = SessionLocal()
+    try:
+        db.add(User(username="__import_check__", email="check@local", hashed_password="x", skills=["Python"]))
+        db.flush()
+        assert db.query(User).filter(User.username == "__import_check__").one().skills == ["Python"]
+    finally:
+        db.rollback()
+        db.close()
+
+    async def async_check():
+        async with AsyncSessionLocal() as adb:
+            adb.add(User(username="__import_check__", email="check@local", hashed_password="x", skills=["Go"]))
+            await adb.flush()
+            user = (await adb.scalars(select(User).where(User.username == "__import_check__"))).one()
+            assert user.skills == ["Go"]
+            await adb.rollback()
+
+    asyncio.run(async_check())
+    return engine.dialect.name
+
+
+def hot_queries():
+    """The hot queries, built by the same functions the routes call, by name."""
+    from datetime import datetime
+    from backend.models import queries
+    return {
+        "chat history": queries.chat_history(1, 50),
+        "chat pins": queries.chat_pins(1),
+        "chat count": queries.chat_count(1),
+        "channel history": queries.channel_history(1, 50),
+        "kanban board": queries.kanban_tasks(team_id=1),
+        "kanban column": queries.kanban_tasks(team_id=1, status="todo"),
+        "kanban user context": queries.recent_user_tasks(1, 8),
+        "xp log": queries.recent_xp(1, 10),
+        "personal chat history": queries.personal_history(1, 50),
+        "personal chat memory": queries.personal_history(1, 30, mode="general"),
+        "vote upsert": queries.user_vote(1, 1, "overall"),
+        "votes of project": queries.project_votes(1),
+        "vote count": queries.project_vote_count(1),
+        "leaderboard": queries.leaderboard(20),
+        "online users": queries.online_users(datetime(2024, 1, 1)),
+    }
+
+
+def check_query_plans():
+    """EXPLAIN QUERY PLAN every hot query (SQLite) and fail on a full table scan."""
+    from backend.models.database import engine
+    if engine.dialect.name != "sqlite":
+        return "skipped: SQLite only"
+    scans = []
+    queries = hot_queries()
+    with engine.connect() as conn:
+        for name, stmt in queries.items():
+            compiled = stmt.compile(dialect=engine.dialect)
+            params = tuple(compiled.params[key] for key in compiled.positiontup)
+            plan = [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params)]
+            scans += [f"{name}: {step}" for step in plan if step.startswith("SCAN ")]
+    assert not scans, "full table scans:\n  " + "\n  ".join(scans)
+    return f"{len(queries)} queries, no full scans"
+
+
+def check_admin_routes(app):
+    """Every /api/admin/llm endpoint (e.g. DELETE /cache, which wipes both cache tiers) rejects anonymous calls."""
+    import re
+    from fastapi.testclient import TestClient
+    client = TestClient(app)   # no startup: the auth dependency answers before any handler runs
+    open_routes = []
+    checked = 0
+    for route in app.routes:
+        if not getattr(route, "path", "").startswith("/api/admin/llm"):
+            continue
+        path = re.sub(r"\{[^}]+\}", "x", route.path)
+        for method in route.methods:
+            checked += 1
+            status = client.request(method, path).status_code
+            if status != 401:
+                open_routes.append(f"{method} {route.path} -> {status}")
+    assert not open_routes, "admin endpoints open to anonymous clients:\n  " + "\n  ".join(open_routes)
+    return f"{checked} endpoints need a token"
+
+
 try:
     print("Testing imports...")
     from backend.config import DEFAULT_MODEL, FAST_MODEL, SMART_MODEL
     print(f"  Config OK - models: {DEFAULT_MODEL[:30]}, {FAST_MODEL[:30]}")
     
-    from backend.models.database import create_tables, engine
-    print("  Database OK")
+    print(f"  Database OK ({check_database()})")
+    print(f"  Query plans OK ({check_query_plans()})")
     
     from backend.services.openrouter_service import chat_completion, FAST_MODEL
     print("  OpenRouter service OK")
@@ -28,6 +131,7 @@ try:
     
     from backend.main import app
     print("  Main app OK!")
+    print(f"  Admin auth OK ({check_admin_routes(app)})")
     print("\n✅ ALL IMPORTS SUCCESSFUL - Server can start!")
     
 except Exception as e: